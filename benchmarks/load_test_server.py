@@ -0,0 +1,91 @@
+'''
+Local load test for bmi_server.
+
+Starts the server in-process on a free port (history in a temporary file) and
+hammers it from several keep-alive client connections:
+    python benchmarks/load_test_server.py --clients 8 --requests 2000
+'''
+
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+import data_utils  # noqa: E402
+import bmi_server  # noqa: E402
+
+SINGLE = json.dumps({"weight": 70, "height": 175, "age": 30, "sex": "male",
+                     "weight_unit": "kg", "height_unit": "cm"})
+BATCH_ITEMS = 100
+BATCH = json.dumps({"items": [json.loads(SINGLE)] * BATCH_ITEMS})
+
+
+def client(port, path, body, count, latencies, errors):
+    """One keep-alive connection sending `count` requests."""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request("POST", path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+
+def run(port, path, body, clients, requests):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(port, path, body, requests, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test bmi_server locally.")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per connection")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_utils.PROFILE_FILE = os.path.join(tmp, "user_profiles.json")
+        server = bmi_server.create_server("127.0.0.1", 0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            results = [
+                run(port, "/bmi", SINGLE, args.clients, args.requests),
+                run(port, "/bmi/batch", BATCH, args.clients, max(1, args.requests // BATCH_ITEMS)),
+            ]
+        finally:
+            server.shutdown()
+            server.server_close()
+    results[1]["reports_per_second"] = round(results[1]["requests_per_second"] * BATCH_ITEMS, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+'''
+Microbenchmarks for the bmi_core and data_utils hot paths (JSON and block stores),
+batch scoring and name search.
+
+Run from the project root:
+    python benchmarks/run_benchmarks.py                      # compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1000 1000000 # include a 1e6-record history
+    python benchmarks/run_benchmarks.py --save-baseline      # record a new baseline
+
+Results are written as JSON (seconds per operation). A benchmark counts as a
+regression when it is slower than the baseline by more than --tolerance.
+'''
+
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+import bmi_core  # noqa: E402
+import data_utils  # noqa: E402
+import units  # noqa: E402
+from name_index import NameIndex  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_SIZES = [1000, 10000, 100000]
+CATEGORIES = ["Underweight", "Normal weight", "Overweight", "Obesity class I", "Obesity class II", "Obesity class III"]
+
+
+def synthetic_profiles(count, seed=42):
+    """Build `count` profile records shaped like the ones save_profile writes."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    profiles = []
+    for i in range(count):
+        weight = round(rng.uniform(40, 140), 1)
+        height = round(rng.uniform(1.45, 2.05), 2)
+        profiles.append({
+            "name": f"user{rng.randrange(count // 10 + 1)}",
+            "age": rng.randint(18, 90),
+            "sex": rng.choice(("male", "female")),
+            "weight": weight,
+            "height": height,
+            "bmi": round(weight / height ** 2, 2),
+            "category": rng.choice(CATEGORIES),
+            "bmr": round(rng.uniform(1100, 2400), 2),
+            "saved_at": (start + timedelta(seconds=i * 37)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+        })
+    return profiles
+
+
+def time_per_call(stmt, number, repeat):
+    """Best-of-`repeat` seconds per call of `stmt`."""
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def bench_core(repeat):
+    """Pure calculation benchmarks (no I/O)."""
+    number = 20000
+    return {
+        "to_si[lb,ft_in]": time_per_call(lambda: units.to_si(165.0, (5, 10), "lb", "ft_in"), number, repeat),
+        "calculate_bmi": time_per_call(lambda: bmi_core.calculate_bmi(70.0, 1.75), number, repeat),
+        "bmi_category": time_per_call(lambda: bmi_core.bmi_category(27.3), number, repeat),
+        "bmi_report[kg,m]": time_per_call(
+            lambda: bmi_core.bmi_report(70.0, 1.75, 25, "male", "kg", "m"), number, repeat),
+        "bmi_report[lb,ft_in]": time_per_call(
+            lambda: bmi_core.bmi_report(165.0, (5, 10), 25, "female", "lb", "ft_in"), number, repeat),
+        "bmi_report[kg,m,tables]": time_per_call(
+            lambda: bmi_core.bmi_report(70.0, 1.75, 25, "male", "kg", "m", use_tables=True), number, repeat),
+    }
+
+
+def mixed_unit_columns(count, seed=42):
+    """Request-shaped columns (weights, heights, ages, sexes, weight units, height units) in mixed units."""
+    rng = random.Random(seed)
+    heights_by_unit = {"m": lambda: round(rng.uniform(1.45, 2.05), 2), "cm": lambda: round(rng.uniform(145, 205)),
+                       "in": lambda: round(rng.uniform(57, 81)), "ft_in": lambda: (rng.randint(4, 6), rng.randint(0, 11))}
+    weight_units = [rng.choice(("kg", "lb")) for _ in range(count)]
+    height_units = [rng.choice(tuple(heights_by_unit)) for _ in range(count)]
+    weights = [round(rng.uniform(40, 140) * (2.2 if u == "lb" else 1), 1) for u in weight_units]
+    heights = [heights_by_unit[u]() for u in height_units]
+    ages = [rng.randint(18, 90) for _ in range(count)]
+    sexes = [rng.choice(("male", "female")) for _ in range(count)]
+    return weights, heights, ages, sexes, weight_units, height_units
+
+
+def bench_batch(repeat, count=1000):
+    """Whole-batch scoring, as /bmi/batch does it: unit conversion per column, then the reports."""
+    columns = mixed_unit_columns(count)
+    weights, heights, ages, sexes, weight_units, height_units = columns
+    packed = units.pack_heights(heights, height_units)
+    return {
+        f"to_si_arrays[mixed,{count}]": time_per_call(
+            lambda: units.to_si_arrays(weights, weight_units, packed, height_units), 20, repeat),
+        f"bmi_reports[mixed,{count}]": time_per_call(lambda: bmi_core.bmi_reports(*columns), 5, repeat),
+        f"bmi_report_loop[mixed,{count}]": time_per_call(
+            lambda: [bmi_core.bmi_report(*row) for row in zip(*columns)], 5, repeat),
+    }
+
+
+def bench_storage(sizes, repeat):
+    """load_profiles / save_profile against synthetic histories of each size."""
+    results = {}
+    original_file = data_utils.PROFILE_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        data_utils.PROFILE_FILE = os.path.join(tmp, "user_profiles.json")
+        try:
+            for size in sizes:
+                with open(data_utils.PROFILE_FILE, "w") as f:
+                    json.dump(synthetic_profiles(size), f, indent=4)
+                # Large histories take seconds per op, so scale the repeats down
+                runs = repeat if size <= 100000 else 1
+                results[f"load_profiles[{size}]"] = time_per_call(data_utils.load_profiles, 1, runs)
+                new_record = synthetic_profiles(1, seed=size)[0]
+                # dedupe_window=0: every call appends, as a save of a new person would
+                results[f"save_profile[{size}]"] = time_per_call(
+                    lambda: data_utils.save_profile(dict(new_record), dedupe_window=0), 1, runs)
+
+                # Same history in the compressed block store
+                block_path = os.path.join(tmp, f"user_profiles_{size}.blk")
+                data_utils.write_profiles(data_utils.iter_profiles(), block_path)
+                results[f"load_profiles[blk,{size}]"] = time_per_call(
+                    lambda: data_utils.load_profiles(block_path), 1, runs)
+                results[f"recent_profiles[blk,{size}]"] = time_per_call(
+                    lambda: data_utils.recent_profiles(20, block_path), 1, runs)
+                results[f"save_profile[blk,{size}]"] = time_per_call(
+                    lambda: data_utils.save_profile(dict(new_record), block_path, dedupe_window=0), 1, runs)
+
+                # Name search through the in-memory index
+                index = NameIndex.from_profiles(data_utils.iter_profiles())
+                name = new_record["name"]
+                results[f"name_search[prefix,{size}]"] = time_per_call(
+                    lambda: index.search(name[:-1], fuzzy=False), 200, runs)
+                typo = name + "x"  # one extra keystroke
+                results[f"name_search[fuzzy,{size}]"] = time_per_call(lambda: index.fuzzy(typo), 200, runs)
+        finally:
+            data_utils.PROFILE_FILE = original_file
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table and return the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'Benchmark':<32} {'Baseline':>12} {'Current':>12} {'Ratio':>8}")
+    print("-" * 68)
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<32} {'-':>12} {seconds * 1e6:>10.2f}us {'new':>8}")
+            continue
+        ratio = seconds / base
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        print(f"{name:<32} {base * 1e6:>10.2f}us {seconds * 1e6:>10.2f}us {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run BMI microbenchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="history sizes for the storage benchmarks (default: 1e3 1e4 1e5)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repeats; the best run is kept")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout only)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a benchmark counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with these results")
+    args = parser.parse_args(argv)
+
+    bmi_core.LOG_CALCULATIONS = False
+    results = bench_core(args.repeat)
+    results.update(bench_batch(args.repeat))
+    results.update(bench_storage(args.sizes, args.repeat))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}.")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+'''
+This module keeps pre-generated AI suggestions so most requests are answered locally.
+
+generate_bmi_suggestions() only depends on BMI, category, age and gender, so requests are
+grouped into buckets: category x BMI band x age decade x sex. The BMI bands are aligned
+with the WHO (and WHO Asian) category boundaries, so every band has one category per scheme.
+ai_warmup.py fills the store for every bucket off-hours; live calls are then only needed
+for buckets that are still missing, and their results are stored as well.
+
+The store is a JSON Lines file (one {"key", "advice", "model", "generated_at"} object per
+line, later lines win). It is read into a dict once and afterwards only the lines appended
+since (a stat per lookup), so a lookup is a dict access plus a copy, and writes are appends.
+'''
+
+
+import copy
+import json
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime
+
+import metrics
+
+ADVICE_FILE = os.environ.get("BMI_ADVICE_STORE") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "ai_advice.jsonl")
+
+# Band edges include the WHO (18.5, 25, 30, 35, 40) and WHO Asian (23, 27.5, 32.5, 37.5)
+# boundaries, and 17 / 35 where the suggestions add a caution
+BMI_BAND_EDGES = (16.0, 17.0, 18.5, 20.5, 23.0, 25.0, 27.5, 30.0, 32.5, 35.0, 37.5, 40.0, 45.0, 50.0)
+AGE_DECADES = (10, 20, 30, 40, 50, 60, 70, 80)  # 80 covers 80 and over
+SEXES = ("male", "female")
+ANY = "any"
+
+ADVICE_LOOKUPS = metrics.counter("ai_advice_lookups_total", "Advice store lookups, by outcome.", ["outcome"])
+_ADVICE_HITS = ADVICE_LOOKUPS.labels(outcome="hit")
+_ADVICE_MISSES = ADVICE_LOOKUPS.labels(outcome="miss")
+
+
+def bmi_band(bmi):
+    """Label of the band holding bmi, e.g. '25-27.5', '<16' or '50+'."""
+    index = bisect_right(BMI_BAND_EDGES, bmi)
+    if index == 0:
+        return f"<{BMI_BAND_EDGES[0]:g}"
+    if index == len(BMI_BAND_EDGES):
+        return f"{BMI_BAND_EDGES[-1]:g}+"
+    return f"{BMI_BAND_EDGES[index - 1]:g}-{BMI_BAND_EDGES[index]:g}"
+
+
+def age_decade(age):
+    if age is None or age == "":
+        return ANY
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return ANY
+    return str(min(max(age // 10 * 10, AGE_DECADES[0]), AGE_DECADES[-1]))
+
+
+def normalize_sex(sex):
+    sex = str(sex or "").strip().lower()
+    if sex in ("m", "male"):
+        return "male"
+    if sex in ("f", "female"):
+        return "female"
+    return ANY
+
+
+def bucket_key(bmi, category, age=None, gender=None):
+    """The store key of a suggestions request: 'category|band|decade|sex'."""
+    return f"{category}|{bmi_band(bmi)}|{age_decade(age)}|{normalize_sex(gender)}"
+
+
+class AdviceStore:
+    """
+    Pre-generated suggestions by bucket key, backed by an append-only JSON Lines file.
+    Lines appended by other processes (e.g. a warm-up run) are picked up on the next lookup.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or ADVICE_FILE
+        self._entries = {}
+        self._offset = 0  # bytes of the file already read
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        # Caller holds self._lock; a stat per lookup, and a read only when the file grew
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            size = 0
+        if size == self._offset:
+            return
+        if size < self._offset:
+            # Rewritten (compacted): read it again from the start
+            self._entries = {}
+            self._offset = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # leave a half-written last line for the next refresh
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                self._entries[entry["key"]] = entry
+            except (ValueError, KeyError, TypeError):
+                continue
+        self._offset += end
+
+    def get(self, key):
+        """The stored advice for key (a copy the caller may change), or None."""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(key)
+        if entry is None:
+            _ADVICE_MISSES.inc()
+            return None
+        _ADVICE_HITS.inc()
+        return copy.deepcopy(entry["advice"])
+
+    def entry(self, key):
+        """The full stored entry (advice, model, generated_at) for key, or None."""
+        with self._lock:
+            self._refresh()
+            return self._entries.get(key)
+
+    def put(self, key, advice, model=None):
+        entry = {
+            "key": key,
+            "advice": advice,
+            "model": model,
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._refresh()
+            with open(self.path, "ab") as f:
+                f.write(line)
+                end = f.tell()
+            self._entries[key] = entry
+            if end == self._offset + len(line):
+                self._offset = end  # otherwise another writer appended too; re-read on refresh
+
+    def compact(self):
+        """Rewrite the file with one line per key (drops replaced entries)."""
+        with self._lock:
+            self._refresh()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for entry in self._entries.values():
+                    f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            os.replace(tmp_path, self.path)
+            self._offset = os.path.getsize(self.path)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._refresh()
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._entries)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_advice_store(path=None):
+    """Return the shared AdviceStore for a file (ADVICE_FILE by default)."""
+    path = path or ADVICE_FILE
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = AdviceStore(path)
+        return store
+
+
+# Example usage:
+if __name__ == "__main__":
+    print(bucket_key(27.3, "Overweight", 34, "Male"))
+    print(f"{len(get_advice_store())} bucket(s) in {ADVICE_FILE}")
@@ -0,0 +1,161 @@
+'''
+This module pre-generates AI suggestions for every advice bucket (see advice_store), so
+suggestion requests from the GUI and CLI are answered from the store instead of the API.
+
+Each bucket (BMI band x age decade x sex; the category follows from the band) is sent
+to the model once, with the band's middle BMI and the decade's middle age, through the
+same circuit breaker as live calls. At most --concurrency calls are in flight, and
+--max-per-minute paces them to stay inside an API quota.
+
+Buckets already in the store are skipped (unless --refresh or older than --max-age-days),
+so a run that was stopped resumes where it left off. Meant for off-hours, e.g. from cron:
+    0 1 * * *  cd /path/to/src && python ai_warmup.py --stop-at 05:00
+'''
+
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+import chatbot_ai
+import metrics
+from advice_store import get_advice_store, bucket_key, BMI_BAND_EDGES, AGE_DECADES, SEXES
+from bmi_classifier import get_classifier
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MODEL = "gemini-2.5-flash-lite"
+
+WARMUP_CALLS = metrics.counter("ai_warmup_calls_total", "Warm-up model calls, by outcome.", ["outcome"])
+
+
+def _band_bmi(index):
+    """The BMI sent to the model for band index (its middle; open-ended bands use a nearby value)."""
+    if index == 0:
+        return BMI_BAND_EDGES[0] - 1.0
+    if index == len(BMI_BAND_EDGES):
+        return BMI_BAND_EDGES[-1] + 2.5
+    return round((BMI_BAND_EDGES[index - 1] + BMI_BAND_EDGES[index]) / 2, 2)
+
+
+def bucket_grid(scheme="who"):
+    """Yield (key, request) for every bucket; request holds the arguments for the model call."""
+    classifier = get_classifier(scheme)
+    for index in range(len(BMI_BAND_EDGES) + 1):
+        bmi = _band_bmi(index)
+        category = classifier.classify(bmi)[0]
+        for decade in AGE_DECADES:
+            age = decade + 5
+            for sex in SEXES:
+                request = {"bmi_value": bmi, "category": category, "age": age, "gender": sex}
+                yield bucket_key(bmi, category, age, sex), request
+
+
+def pending_buckets(store, scheme="who", refresh=False, max_age_days=None, now=None):
+    """The (key, request) pairs that still need generating."""
+    cutoff = None
+    if max_age_days is not None:
+        cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    pending = []
+    for key, request in bucket_grid(scheme):
+        entry = None if refresh else store.entry(key)
+        if entry is None or (cutoff is not None and entry.get("generated_at", "") < cutoff):
+            pending.append((key, request))
+    return pending
+
+
+def _generate(request, model):
+    return chatbot_ai.generate_bmi_suggestions(**request, model=model, use_store=False)
+
+
+def warm_up(store=None, scheme="who", concurrency=DEFAULT_CONCURRENCY, refresh=False, max_age_days=None,
+            stop_at=None, max_per_minute=None, limit=None, model=DEFAULT_MODEL):
+    """
+    Generate the missing buckets. Stops submitting new calls at stop_at (a datetime) or
+    when the AI becomes unavailable (no key, or the circuit breaker opened).
+    Returns {"generated": n, "failed": n, "skipped": n, "remaining": n}.
+    """
+    if store is None:
+        store = get_advice_store()
+    grid_size = sum(1 for _ in bucket_grid(scheme))
+    todo = pending_buckets(store, scheme, refresh, max_age_days)
+    result = {"generated": 0, "failed": 0, "skipped": grid_size - len(todo), "remaining": len(todo)}
+    if limit is not None:
+        todo = todo[:limit]
+    if not todo:
+        return result
+    if not chatbot_ai.is_ai_available():
+        print("[!] AI is not available (missing GEMINI_API_KEY or repeated failures); nothing generated.")
+        return result
+
+    interval = 60.0 / max_per_minute if max_per_minute else 0.0
+    next_start = time.monotonic()
+    queue = iter(todo)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ai-warmup") as pool:
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                if (stop_at is not None and datetime.now() >= stop_at) or not chatbot_ai.is_ai_available():
+                    exhausted = True
+                    break
+                item = next(queue, None)
+                if item is None:
+                    exhausted = True
+                    break
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_start = max(next_start, time.monotonic()) + interval
+                in_flight[pool.submit(_generate, item[1], model)] = item
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, _ = in_flight.pop(future)
+                advice = future.result()
+                if "error" in advice:
+                    result["failed"] += 1
+                    WARMUP_CALLS.labels(outcome="error").inc()
+                    print(f"[!] {key}: {advice['error']}")
+                    continue
+                store.put(key, advice, model)
+                result["generated"] += 1
+                result["remaining"] -= 1
+                WARMUP_CALLS.labels(outcome="ok").inc()
+                print(f"[{result['generated'] + result['failed']}/{len(todo)}] {key}")
+    return result
+
+
+def _parse_stop_at(text):
+    """'HH:MM' -> the next datetime at that time of day."""
+    stop = datetime.combine(datetime.now().date(), datetime.strptime(text, "%H:%M").time())
+    return stop if stop > datetime.now() else stop + timedelta(days=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate AI suggestions for every advice bucket.")
+    parser.add_argument("--store", help="advice store file (default: advice_store.ADVICE_FILE)")
+    parser.add_argument("--scheme", default="who", help="BMI classification scheme (default: who)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="model calls in flight")
+    parser.add_argument("--max-per-minute", type=float, help="pace calls to stay inside an API quota")
+    parser.add_argument("--stop-at", type=_parse_stop_at, help="HH:MM; start no new calls after this time")
+    parser.add_argument("--refresh", action="store_true", help="regenerate buckets that are already stored")
+    parser.add_argument("--max-age-days", type=int, help="regenerate buckets older than this many days")
+    parser.add_argument("--limit", type=int, help="generate at most this many buckets")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--compact", action="store_true", help="rewrite the store with one line per bucket")
+    args = parser.parse_args(argv)
+
+    store = get_advice_store(args.store)
+    result = warm_up(store, args.scheme, args.concurrency, args.refresh, args.max_age_days, args.stop_at,
+                     args.max_per_minute, args.limit, args.model)
+    if args.compact:
+        store.compact()
+    print(f"Generated {result['generated']}, failed {result['failed']}, already stored {result['skipped']}, "
+          f"still missing {result['remaining']} bucket(s).")
+
+
+# Example usage:
+if __name__ == "__main__":
+    main()
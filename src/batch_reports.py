@@ -0,0 +1,503 @@
+'''
+This module writes a printable report for every user in the profile store (or a chosen
+cohort): the bmi_report numbers, the static suggestions and the visualize charts.
+
+Pipeline:
+    1. one streamed pass over the store collects each user's latest record and BMI history
+    2. users are sent in chunks to a process pool, which runs bmi_report and
+       generate_suggestions and renders the charts (matplotlib, no pyplot) and the report
+    3. finished reports are written by a thread pool while the processes keep rendering
+
+HTML reports are filled in from a template that is parsed once (CompiledTemplate) and
+embed their charts as base64 PNGs. PDF reports are drawn with matplotlib's PDF backend:
+a summary page followed by one page per chart.
+
+Run:  python batch_reports.py reports/ --format html --workers 8
+'''
+
+
+import argparse
+import base64
+import html
+import io
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from string import Template
+
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+import bmi_core
+import metrics
+from bmi_core import bmi_report
+from data_utils import iter_profiles, canonicalize_profile
+from name_index import normalize_name
+from suggestions import generate_suggestions
+from visualize import (
+    build_bmi_comparison, build_bmi_distribution, build_weight_vs_ideal, build_bmi_range,
+    build_bmi_history, render_chart, history_points, downsample
+)
+
+FORMATS = ("html", "pdf")
+CHARTS = ("bmi_range", "weight_vs_ideal", "bmi_comparison", "bmi_distribution", "bmi_history")
+DEFAULT_CHARTS = ("bmi_range", "weight_vs_ideal", "bmi_history")
+DEFAULT_CHUNK_SIZE = 25
+DEFAULT_WRITER_THREADS = 4
+
+CHART_DPI = 80
+CHART_SIZES = {  # inches; charts are printed about half a page wide
+    "bmi_range": (7, 2),
+    "weight_vs_ideal": (6, 3.5),
+    "bmi_comparison": (6, 3.5),
+    "bmi_distribution": (4.5, 4.5),
+    "bmi_history": (7, 3),
+}
+HISTORY_POINTS = CHART_SIZES["bmi_history"][0] * CHART_DPI  # one point per pixel
+CHART_CACHE_SIZE = 4096  # rendered PNGs kept per worker process
+
+REPORTS_WRITTEN = metrics.counter("batch_reports_written_total", "Reports written by batch_reports, by format.",
+                                  ["format"])
+REPORTS_FAILED = metrics.counter("batch_reports_failed_total", "Users whose report could not be built.")
+BATCH_SECONDS = metrics.histogram("batch_reports_seconds", "Time taken by a batch report run.")
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>BMI Report - $name</title>
+<style>
+body { font-family: Arial, Helvetica, sans-serif; margin: 2em; color: #222; }
+h1 { margin-bottom: 0; }
+.meta { color: #666; margin-top: 0.2em; }
+table { border-collapse: collapse; margin: 1em 0; }
+td { padding: 0.3em 1em 0.3em 0; }
+td:first-child { font-weight: bold; }
+img { max-width: 100%; display: block; margin: 0.5em 0 1.5em; }
+.warning { color: #a00; }
+@media print { section { page-break-inside: avoid; } }
+</style>
+</head>
+<body>
+<h1>BMI Report - $name</h1>
+<p class="meta">Age $age, $sex. Last measured $measured_at.</p>
+<section>
+<table>
+<tr><td>BMI</td><td>$bmi ($category)</td></tr>
+<tr><td>Assessment</td><td>$description</td></tr>
+<tr><td>BMR</td><td>$bmr kcal/day</td></tr>
+<tr><td>Water</td><td>$water liters/day</td></tr>
+<tr><td>Healthy weight</td><td>$healthy_min - $healthy_max kg</td></tr>
+<tr><td>Goal</td><td>$goal</td></tr>
+</table>
+</section>
+$charts
+<section>
+<h2>Health Facts</h2>
+<ul>$health_facts</ul>
+<h2>Exercise Plan</h2>
+<ul>$exercise_plan</ul>
+<h2>Diet Suggestions</h2>
+<ul>$diet</ul>
+$warnings
+</section>
+</body>
+</html>
+"""
+
+
+class CompiledTemplate:
+    """
+    A string.Template ($name placeholders) parsed once into literal text and field names,
+    so filling it in is a single join however many reports are rendered.
+    """
+
+    def __init__(self, text, known_fields=None):
+        self.parts = []  # (literal text, field name or None)
+        literal = []
+        pos = 0
+        for match in Template.pattern.finditer(text):
+            literal.append(text[pos:match.start()])
+            pos = match.end()
+            if match.group("escaped") is not None:
+                literal.append("$")
+                continue
+            field = match.group("named") or match.group("braced")
+            if field is None:
+                raise ValueError(f"Invalid placeholder in report template at offset {match.start()}")
+            self.parts.append(("".join(literal), field))
+            literal = []
+        literal.append(text[pos:])
+        self.parts.append(("".join(literal), None))
+        self.fields = {field for _, field in self.parts if field}
+        if known_fields is not None:
+            unknown = self.fields - set(known_fields)
+            if unknown:
+                raise ValueError(f"Unknown field(s) in report template: {', '.join(sorted(unknown))} "
+                                 f"(known: {', '.join(known_fields)})")
+
+    @classmethod
+    def from_file(cls, path, known_fields=None):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), known_fields)
+
+    def render(self, values):
+        """Fill in the fields; values must already be HTML-safe."""
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(values[field])
+        return "".join(out)
+
+
+# The $fields render_html() fills in
+TEMPLATE_FIELDS = ("name", "age", "sex", "measured_at", "bmi", "category", "description", "bmr", "water",
+                   "healthy_min", "healthy_max", "goal", "charts", "health_facts", "exercise_plan", "diet",
+                   "warnings")
+
+_DEFAULT_TEMPLATE = CompiledTemplate(REPORT_TEMPLATE, TEMPLATE_FIELDS)
+
+
+def collect_cohort(path=None, names=None):
+    """
+    One pass over the store: {normalized name: {"record": latest record, "points": history,
+    "error": None or why the user's report cannot be built}}.
+    names limits the cohort to those users (matched like the name index does).
+    """
+    wanted = {normalize_name(n) for n in names} if names else None
+    cohort = {}
+    for record in iter_profiles(path):
+        key = normalize_name(record.get("name"))
+        if not key or (wanted is not None and key not in wanted):
+            continue
+        entry = cohort.get(key)
+        if entry is None:
+            entry = cohort[key] = {"record": record, "points": [], "error": None}
+        try:
+            points = history_points(record)
+            if (record.get("saved_at") or "") >= (entry["record"].get("saved_at") or ""):
+                entry["record"] = record
+        except (TypeError, ValueError) as e:
+            # e.g. a malformed saved_at; only this user's report fails
+            if entry["error"] is None:
+                entry["error"] = f"unusable record saved at {record.get('saved_at')!r}: {e}"
+            continue
+        entry["points"].extend(points)
+    return cohort
+
+
+def report_filename(record, fmt):
+    """A file name that is readable and unique per user: <slug>-<crc32 of the name>.<fmt>."""
+    key = normalize_name(record.get("name"))
+    slug = re.sub(r"[^a-z0-9]+", "-", key).strip("-")[:40] or "user"
+    return f"{slug}-{zlib.crc32(key.encode('utf-8')):08x}.{fmt}"
+
+
+def _build_job(entry):
+    """The picklable inputs a worker needs for one report."""
+    record = dict(entry["record"])
+    if "weight_kg" not in record or "height_m" not in record:
+        canonicalize_profile(record)
+    points = sorted(entry["points"])
+    return {
+        "record": record,
+        "points": downsample(points, HISTORY_POINTS),
+        "total": len(points),
+    }
+
+
+def _report_values(job):
+    """bmi_report and suggestions for one job, or a str error like bmi_report's."""
+    record = job["record"]
+    if "weight_kg" not in record or "height_m" not in record:
+        return "no usable weight and height on the latest record"
+    report = bmi_report(record["weight_kg"], record["height_m"], record.get("age"), record.get("sex"))
+    if isinstance(report, str):
+        return report
+    bmi, category, description, bmr, healthy_range, water, gain, lose = report
+    if gain > 0:
+        goal = f"Gain about {gain} kg"
+    elif lose > 0:
+        goal = f"Lose about {lose} kg"
+    else:
+        goal = "Maintain your current weight"
+    return {
+        "name": record.get("name", "User"),
+        "age": record.get("age", ""),
+        "sex": record.get("sex", ""),
+        "measured_at": (record.get("last_saved_at") or record.get("saved_at") or "")[:16],
+        "bmi": bmi,
+        "category": category,
+        "description": description,
+        "bmr": bmr,
+        "water": water,
+        "healthy_min": healthy_range[0],
+        "healthy_max": healthy_range[1],
+        "goal": goal,
+        "suggestions": generate_suggestions(bmi, category),
+    }
+
+
+_BUILDERS = {
+    "bmi_range": build_bmi_range,
+    "weight_vs_ideal": build_weight_vs_ideal,
+    "bmi_comparison": build_bmi_comparison,
+    "bmi_distribution": build_bmi_distribution,
+    "bmi_history": build_bmi_history,
+}
+
+
+def _chart_args(chart, job, values):
+    """Builder arguments for a chart; BMI is rounded to the one decimal the charts print."""
+    record = job["record"]
+    if chart in ("bmi_range", "bmi_comparison"):
+        return (round(values["bmi"], 1),)
+    if chart == "weight_vs_ideal":
+        return (record["weight_kg"], record["height_m"])
+    if chart == "bmi_distribution":
+        return ()
+    if chart == "bmi_history":
+        return (values["name"], job["points"], job["total"])
+    raise ValueError(f"Unknown chart: {chart}")
+
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _cached_png(chart, args):
+    # Charts that only depend on a rounded BMI repeat across a cohort, so each is drawn once
+    return render_chart(_BUILDERS[chart], *args, figsize=CHART_SIZES[chart], dpi=CHART_DPI)
+
+
+def _chart_png(chart, job, values):
+    args = _chart_args(chart, job, values)
+    if chart in ("bmi_range", "bmi_comparison", "bmi_distribution"):
+        return _cached_png(chart, args)
+    return render_chart(_BUILDERS[chart], *args, figsize=CHART_SIZES[chart], dpi=CHART_DPI)
+
+
+def _html_list(items, css_class=None):
+    attr = f' class="{css_class}"' if css_class else ""
+    return "".join(f"<li{attr}>{html.escape(str(item))}</li>" for item in items)
+
+
+def render_html(job, values, charts, template=None):
+    """One HTML report as UTF-8 bytes, charts embedded as base64 PNGs."""
+    template = template or _DEFAULT_TEMPLATE
+    fields = {key: html.escape(str(value)) for key, value in values.items() if key != "suggestions"}
+    images = []
+    for chart in charts:
+        if chart == "bmi_history" and job["total"] < 2:
+            continue  # a single measurement is not a trend
+        png = _chart_png(chart, job, values)
+        images.append(f'<section><img alt="{chart}" src="data:image/png;base64,'
+                      f'{base64.b64encode(png).decode("ascii")}"></section>')
+    fields["charts"] = "\n".join(images)
+    suggestions = values["suggestions"]
+    fields["health_facts"] = _html_list(suggestions["health_facts"])
+    fields["exercise_plan"] = _html_list(suggestions["exercise_plan"])
+    fields["diet"] = _html_list(suggestions["diet"])
+    fields["warnings"] = ("<h2>Warnings</h2><ul>" + _html_list(suggestions["warnings"], "warning") + "</ul>"
+                          if suggestions["warnings"] else "")
+    return template.render(fields).encode("utf-8")
+
+
+def render_pdf(job, values, charts):
+    """One PDF report as bytes: a summary page, then one page per chart."""
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        page = Figure(figsize=(8.27, 11.69))  # A4 portrait
+        lines = [
+            (f"BMI Report - {values['name']}", 16, "bold"),
+            (f"Age {values['age']}, {values['sex']}. Last measured {values['measured_at']}.", 10, "normal"),
+            ("", 10, "normal"),
+            (f"BMI: {values['bmi']} ({values['category']})", 11, "normal"),
+            (f"Assessment: {values['description']}", 11, "normal"),
+            (f"BMR: {values['bmr']} kcal/day    Water: {values['water']} liters/day", 11, "normal"),
+            (f"Healthy weight: {values['healthy_min']} - {values['healthy_max']} kg    Goal: {values['goal']}",
+             11, "normal"),
+        ]
+        titles = (("health_facts", "Health Facts"), ("exercise_plan", "Exercise Plan"),
+                  ("diet", "Diet Suggestions"), ("warnings", "Warnings"))
+        for key, title in titles:
+            items = values["suggestions"][key]
+            if items:
+                lines.append(("", 10, "normal"))
+                lines.append((title, 12, "bold"))
+                lines.extend((f"- {item}", 9, "normal") for item in items)
+        y = 0.95
+        for text, size, weight in lines:
+            page.text(0.07, y, text, fontsize=size, fontweight=weight, va="top", wrap=True)
+            y -= 0.022 if size < 12 else 0.03
+        pdf.savefig(page)
+        for chart in charts:
+            if chart == "bmi_history" and job["total"] < 2:
+                continue
+            figure = Figure(figsize=CHART_SIZES[chart])
+            _BUILDERS[chart](figure, *_chart_args(chart, job, values))
+            pdf.savefig(figure)
+    return buffer.getvalue()
+
+
+def _init_worker():
+    bmi_core.LOG_CALCULATIONS = False  # thousands of reports would flood the console
+
+
+def render_chunk(jobs, fmt="html", charts=DEFAULT_CHARTS, template=None):
+    """
+    Worker-process entry point: render a chunk of reports.
+    Returns a list of (filename, bytes or None, error or None).
+    """
+    results = []
+    for job in jobs:
+        filename = report_filename(job["record"], fmt)
+        try:
+            values = _report_values(job)
+            if isinstance(values, str):
+                results.append((filename, None, values))
+                continue
+            if fmt == "pdf":
+                data = render_pdf(job, values, charts)
+            else:
+                data = render_html(job, values, charts, template)
+            results.append((filename, data, None))
+        except Exception as e:
+            results.append((filename, None, str(e)))
+    return results
+
+
+def _write_file(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Progress:
+    """
+    Prints 'done/total, reports per second, ETA' on one line, at most every interval seconds.
+    advance() may be called from several threads.
+    """
+
+    def __init__(self, total, stream=sys.stderr, interval=0.5, enabled=True):
+        self.total = total
+        self.done = 0
+        self.stream = stream
+        self.interval = interval
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+            now = time.perf_counter()
+            if self.enabled and (now - self._last >= self.interval or self.done >= self.total):
+                self._last = now
+                rate = self.rate()
+                eta = (self.total - self.done) / rate if rate else 0
+                self.stream.write(f"\r{self.done}/{self.total} reports  {rate:.1f}/s  ETA {eta:.0f}s   ")
+                self.stream.flush()
+
+    def finish(self):
+        if self.enabled:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def generate_reports(out_dir, path=None, names=None, fmt="html", charts=DEFAULT_CHARTS, workers=None,
+                     writer_threads=DEFAULT_WRITER_THREADS, chunk_size=DEFAULT_CHUNK_SIZE,
+                     template_path=None, show_progress=True):
+    """
+    Write one report per user to out_dir.
+    Returns {"written": n, "failed": n, "seconds": s, "errors": {filename: message}}.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of: {', '.join(FORMATS)}")
+    unknown = set(charts) - set(CHARTS)
+    if unknown:
+        raise ValueError(f"Unknown chart(s): {', '.join(sorted(unknown))}")
+    template = CompiledTemplate.from_file(template_path, TEMPLATE_FIELDS) if template_path else None
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    cohort = collect_cohort(path, names)
+    progress = Progress(len(cohort), enabled=show_progress)
+    result = {"written": 0, "failed": 0, "seconds": 0.0, "errors": {}}
+    jobs = []
+    for entry in cohort.values():
+        try:
+            if entry["error"] is not None:
+                raise ValueError(entry["error"])
+            jobs.append(_build_job(entry))
+        except Exception as e:
+            result["failed"] += 1
+            result["errors"][report_filename(entry["record"], fmt)] = str(e)
+            progress.advance()
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as renderers, \
+            ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="report-writer") as writers:
+        rendering = [renderers.submit(render_chunk, chunk, fmt, tuple(charts), template) for chunk in chunks]
+        writing = []
+        for future in as_completed(rendering):
+            for filename, data, error in future.result():
+                if error is not None:
+                    result["failed"] += 1
+                    result["errors"][filename] = error
+                    progress.advance()
+                    continue
+                write = writers.submit(_write_file, os.path.join(out_dir, filename), data)
+                write.add_done_callback(lambda f: progress.advance())
+                writing.append(write)
+        for write in writing:
+            write.result()  # re-raise write errors
+            result["written"] += 1
+    progress.finish()
+
+    result["seconds"] = time.perf_counter() - start
+    REPORTS_WRITTEN.labels(format=fmt).inc(result["written"])
+    REPORTS_FAILED.inc(result["failed"])
+    BATCH_SECONDS.observe(result["seconds"])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a BMI report for every user in the profile store.")
+    parser.add_argument("out_dir", help="directory for the reports")
+    parser.add_argument("--store", help="profile store (default: data_utils.PROFILE_FILE)")
+    parser.add_argument("--format", choices=FORMATS, default="html")
+    parser.add_argument("--names", nargs="+", help="only these users")
+    parser.add_argument("--charts", nargs="+", choices=CHARTS, default=list(DEFAULT_CHARTS))
+    parser.add_argument("--template", help="HTML template with $field placeholders (default: built in)")
+    parser.add_argument("--workers", type=int, help="chart rendering processes (default: CPU count)")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITER_THREADS, help="file writing threads")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="users per worker task")
+    parser.add_argument("--quiet", action="store_true", help="no progress line")
+    args = parser.parse_args(argv)
+
+    try:
+        result = generate_reports(args.out_dir, args.store, args.names, args.format, args.charts, args.workers,
+                                  args.writers, args.chunk_size, args.template, not args.quiet)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    rate = result["written"] / result["seconds"] if result["seconds"] else 0.0
+    print(f"Wrote {result['written']} report(s) in {result['seconds']:.1f}s ({rate:.1f}/s).")
+    if result["failed"]:
+        print(f"[!] {result['failed']} report(s) could not be built:")
+        for filename, error in list(result["errors"].items())[:10]:
+            print(f"    {filename}: {error}")
+
+
+# Example usage:
+if __name__ == "__main__":
+    main()
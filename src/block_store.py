@@ -0,0 +1,489 @@
+'''
+This module stores profile history in independently compressed blocks.
+
+A block store is two files:
+    <name>.blk        a file header, then sealed blocks; each block has a fixed-size header
+                      (codec, record count, first/last saved_at, payload length, CRC32)
+                      followed by the compressed JSON-lines payload
+    <name>.blk.tail   the newest records (up to block_size) as plain JSON lines; when it
+                      fills up it is compressed into a new block
+
+The block headers form the block index: it is built by reading the headers only
+(no decompression) and extended incrementally as the file grows. "Last N" and
+date-range reads use it to decompress only the blocks they need.
+
+data_utils uses a block store whenever the profile path ends in ".blk".
+'''
+
+
+import json
+import lzma
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+BLOCK_SUFFIX = ".blk"
+TAIL_SUFFIX = ".tail"
+NEW_SUFFIX = ".new"
+DEFAULT_BLOCK_SIZE = 512
+DEFAULT_CODEC = "zlib"
+
+FILE_MAGIC = b"BMIBLK1\n"
+FILE_HEADER_SIZE = len(FILE_MAGIC) + 16  # magic + generation id
+BLOCK_MAGIC = b"BK"
+# magic, codec id, record count, first ts, last ts, payload length, payload crc32
+BLOCK_HEADER = struct.Struct("<2sBIddII")
+
+CODECS = {
+    "zlib": (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (2, lzma.compress, lzma.decompress),
+}
+_DECOMPRESSORS = {codec_id: decompress for codec_id, _, decompress in CODECS.values()}
+
+BlockInfo = namedtuple("BlockInfo", "offset codec count first_ts last_ts length crc")
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class CorruptBlockError(ValueError):
+    """Raised when a block's header or checksum does not match its contents."""
+
+
+def is_block_store(path):
+    return str(path).endswith(BLOCK_SUFFIX)
+
+
+def record_timestamp(record):
+    """Return a record's saved_at as a POSIX timestamp (0.0 if missing or unparsable)."""
+    saved_at = record.get("saved_at")
+    if not saved_at:
+        return 0.0
+    try:
+        return datetime.strptime(saved_at, TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        try:
+            return datetime.fromisoformat(saved_at).timestamp()
+        except ValueError:
+            return 0.0
+
+
+def _to_timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _fsync_dir(path):
+    """Make a rename in path's directory durable (no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _encode_lines(records):
+    return "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode("utf-8")
+
+
+class BlockStore:
+    """A profile history in compressed blocks plus an uncompressed tail."""
+
+    def __init__(self, path, codec=DEFAULT_CODEC, block_size=DEFAULT_BLOCK_SIZE):
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of: {', '.join(CODECS)}")
+        self.path = path
+        self.tail_path = path + TAIL_SUFFIX
+        self.codec = codec
+        self.block_size = block_size
+        self.blocks = []
+        self.generation = None
+        self._indexed_to = 0
+        self._file_id = None
+        self._tail = []
+        self._tail_signature = None
+        self._tail_clean = True
+        self._lock = threading.RLock()
+
+    # ---- index ----
+
+    def refresh(self):
+        """Bring the block index and tail up to date with the files on disk."""
+        with self._lock:
+            self._refresh_index()
+            self._refresh_tail()
+
+    def _refresh_index(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.blocks, self.generation, self._indexed_to, self._file_id = [], None, 0, None
+            return
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id or st.st_size < self._indexed_to:
+            # A different (rewritten) file: index it from scratch
+            self.blocks, self._indexed_to, self._file_id = [], 0, file_id
+        if st.st_size == self._indexed_to:
+            return
+        with open(self.path, "rb") as f:
+            if self._indexed_to == 0:
+                header = f.read(FILE_HEADER_SIZE)
+                if len(header) < FILE_HEADER_SIZE or not header.startswith(FILE_MAGIC):
+                    raise CorruptBlockError(f"{self.path} is not a block store.")
+                self.generation = header[len(FILE_MAGIC):].hex()
+                self._indexed_to = FILE_HEADER_SIZE
+            f.seek(self._indexed_to)
+            while True:
+                raw = f.read(BLOCK_HEADER.size)
+                if len(raw) < BLOCK_HEADER.size:
+                    break  # end of file (or a torn header, which is ignored)
+                magic, codec_id, count, first_ts, last_ts, length, crc = BLOCK_HEADER.unpack(raw)
+                offset = f.tell()
+                if magic != BLOCK_MAGIC or codec_id not in _DECOMPRESSORS or offset + length > st.st_size:
+                    break  # torn or garbage trailing block; later appends overwrite it
+                self.blocks.append(BlockInfo(offset, codec_id, count, first_ts, last_ts, length, crc))
+                f.seek(length, os.SEEK_CUR)
+                self._indexed_to = offset + length
+
+    def _tail_file_signature(self):
+        try:
+            st = os.stat(self.tail_path)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _refresh_tail(self):
+        signature = self._tail_file_signature()
+        if signature == self._tail_signature:
+            return
+        self._tail_clean = True
+        tail = self._read_tail() if signature else None
+        if tail is None and self._adopt_new_tail():
+            signature = self._tail_file_signature()
+            tail = self._read_tail() if signature else None
+        self._tail_signature = signature
+        self._tail = tail or []
+
+    def _adopt_new_tail(self):
+        """
+        Finish a rewrite that stopped after swapping in the main file but before its tail:
+        if <tail>.new belongs to the current generation, move it into place.
+        """
+        new_path = self.tail_path + NEW_SUFFIX
+        try:
+            with open(new_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if self.generation is None or header.get("generation") != self.generation:
+            return False  # from a rewrite that never swapped in its main file
+        try:
+            os.replace(new_path, self.tail_path)
+            _fsync_dir(self.tail_path)
+        except FileNotFoundError:
+            pass  # another process (or the rewrite itself) moved it first
+        return True
+
+    def _read_tail(self):
+        """The tail's unsealed records, or None if it belongs to another generation."""
+        sealed = self.sealed_count()
+        with open(self.tail_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        try:
+            header = json.loads(lines[0])
+        except (json.JSONDecodeError, IndexError):
+            return []
+        if header.get("generation") != self.generation:
+            return None  # the main file was rewritten; see _adopt_new_tail
+        records = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                self._tail_clean = False  # torn last line; the next write rewrites the tail
+                break
+        # Records sealed into a block before the tail was reset are skipped
+        return records[max(0, sealed - header.get("base_count", 0)):]
+
+    def sealed_count(self):
+        return sum(block.count for block in self.blocks)
+
+    def __len__(self):
+        with self._lock:
+            self.refresh()
+            return self.sealed_count() + len(self._tail)
+
+    # ---- reads ----
+
+    def read_block(self, block, f=None):
+        """Decompress one block and return its records."""
+        if f is None:
+            with open(self.path, "rb") as f:
+                return self.read_block(block, f)
+        f.seek(block.offset)
+        payload = f.read(block.length)
+        if zlib.crc32(payload) != block.crc:
+            raise CorruptBlockError(f"Block at offset {block.offset} of {self.path} failed its checksum.")
+        lines = _DECOMPRESSORS[block.codec](payload).decode("utf-8").rstrip("\n")
+        # One JSON record per line and no raw newlines inside records: parse the block as one array
+        return json.loads("[" + lines.replace("\n", ",") + "]")
+
+    def _snapshot(self):
+        """
+        Return (blocks, tail, data_file) as of now. The data file is opened under the lock,
+        so a concurrent rewrite (which swaps in a new file) cannot invalidate the offsets.
+        """
+        with self._lock:
+            self.refresh()
+            data_file = open(self.path, "rb") if self.blocks else None
+            return list(self.blocks), list(self._tail), data_file
+
+    def iter_records(self):
+        """Yield every record, oldest first, from a consistent snapshot."""
+        blocks, tail, data_file = self._snapshot()
+        if data_file:
+            with data_file:
+                for block in blocks:
+                    yield from self.read_block(block, data_file)
+        yield from tail
+
+    def last(self, n):
+        """Return the newest n records (oldest first), decompressing only the blocks needed."""
+        if n <= 0:
+            return []
+        blocks, tail, data_file = self._snapshot()
+        records = tail[-n:]
+        needed = n - len(records)
+        chunks = []
+        if data_file:
+            with data_file:
+                for block in reversed(blocks):
+                    if needed <= 0:
+                        break
+                    block_records = self.read_block(block, data_file)
+                    chunks.append(block_records[-needed:])
+                    needed -= len(chunks[-1])
+        result = []
+        for chunk in reversed(chunks):
+            result.extend(chunk)
+        result.extend(records)
+        return result
+
+    def between(self, start=None, end=None):
+        """
+        Yield records with start <= saved_at <= end (datetimes, ISO strings or timestamps).
+        Blocks whose time range lies outside the window are not decompressed.
+        """
+        start_ts, end_ts = _to_timestamp(start), _to_timestamp(end)
+        blocks, tail, data_file = self._snapshot()
+
+        def in_range(ts):
+            return (start_ts is None or ts >= start_ts) and (end_ts is None or ts <= end_ts)
+
+        if data_file:
+            with data_file:
+                for block in blocks:
+                    if (start_ts is not None and block.last_ts < start_ts) or \
+                            (end_ts is not None and block.first_ts > end_ts):
+                        continue
+                    for record in self.read_block(block, data_file):
+                        if in_range(record_timestamp(record)):
+                            yield record
+        for record in tail:
+            if in_range(record_timestamp(record)):
+                yield record
+
+    # ---- writes ----
+
+    def append(self, record):
+        """Append one record to the tail, sealing a block when the tail is full."""
+        self.extend([record])
+
+    def extend(self, records):
+        """Append many records; full blocks are compressed as they fill up."""
+        with self._lock:
+            self.refresh()
+            if not os.path.exists(self.path):
+                self._create()
+            pending = list(self._tail)
+            appended = []
+            for record in records:
+                pending.append(record)
+                appended.append(record)
+                if len(pending) >= self.block_size:
+                    self._seal(pending)
+                    pending, appended = [], []
+            if len(pending) == len(appended) or not self._tail_clean:
+                # Tail was reset by a seal, is new, or ends in a torn line: write it out afresh
+                self._write_tail(pending)
+            elif appended:
+                with open(self.tail_path, "a", encoding="utf-8") as f:
+                    f.write(_encode_lines(appended).decode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._tail = pending
+            self._tail_signature = None
+
+    def update_tail(self, update):
+        """
+        Call update(records) with the records still in the uncompressed tail, oldest first.
+        If it returns true, the (modified) list is written back atomically. Sealed blocks
+        are never changed. Returns whether the tail was rewritten.
+        """
+        with self._lock:
+            self.refresh()
+            records = list(self._tail)
+            if not update(records):
+                return False
+            self._write_tail(records)
+            self._tail = records
+            self._tail_signature = None
+            return True
+
+    def _create(self):
+        self.generation = uuid.uuid4().hex
+        with open(self.path, "wb") as f:
+            f.write(FILE_MAGIC + bytes.fromhex(self.generation))
+            f.flush()
+            os.fsync(f.fileno())  # the tail's header refers to this generation
+        _fsync_dir(self.path)
+        self._file_id = None
+        self._refresh_index()
+
+    def _seal(self, records):
+        """Compress records into a block appended to the main file, then reset the tail."""
+        with open(self.path, "r+b") as f:
+            f.seek(self._indexed_to)  # overwrite any torn trailing block
+            f.write(self._encode_block(records))
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh_index()
+        self._write_tail([])
+
+    def _encode_block(self, records):
+        codec_id, compress, _ = CODECS[self.codec]
+        payload = compress(_encode_lines(records))
+        timestamps = [record_timestamp(r) for r in records]
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, codec_id, len(records), min(timestamps), max(timestamps),
+                                   len(payload), zlib.crc32(payload))
+        return header + payload
+
+    def _write_tail(self, records, path=None, generation=None, base_count=None):
+        # Durable when this returns: save_profile empties its write-ahead log right after
+        path = path or self.tail_path
+        header = {
+            "generation": generation or self.generation,
+            "base_count": self.sealed_count() if base_count is None else base_count,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.write(_encode_lines(records).decode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(path)
+
+    def rewrite(self, records):
+        """
+        Replace the whole store with records, atomically: readers see either the old
+        or the new contents. Returns the number of records written.
+        """
+        with self._lock:
+            generation = uuid.uuid4().hex
+            tmp_path = f"{self.path}.tmp"
+            count = sealed = 0
+            block = []
+            with open(tmp_path, "wb") as f:
+                f.write(FILE_MAGIC + bytes.fromhex(generation))
+                for record in records:
+                    block.append(record)
+                    count += 1
+                    if len(block) >= self.block_size:
+                        f.write(self._encode_block(block))
+                        sealed += len(block)
+                        block = []
+                f.flush()
+                os.fsync(f.fileno())
+            # <tail>.new is fsynced (file and directory) before the main file is swapped in, so
+            # the new generation is never on disk without its tail
+            self._write_tail(block, self.tail_path + NEW_SUFFIX, generation, sealed)
+            # A crash between these two leaves the new main file with <tail>.new, which the
+            # next refresh (in any process) adopts because its generation matches
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            self._file_id = None
+            self._refresh_index()
+            self._adopt_new_tail()
+            self._tail_signature = None
+            self.refresh()
+            return count
+
+    def stats(self):
+        """Return sizes and counts for reporting."""
+        with self._lock:
+            self.refresh()
+            data_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            tail_bytes = os.path.getsize(self.tail_path) if os.path.exists(self.tail_path) else 0
+            return {
+                "blocks": len(self.blocks),
+                "sealed_records": self.sealed_count(),
+                "tail_records": len(self._tail),
+                "data_bytes": data_bytes,
+                "tail_bytes": tail_bytes,
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_block_store(path, codec=DEFAULT_CODEC, block_size=DEFAULT_BLOCK_SIZE):
+    """Return the shared BlockStore for a path, so its index is built only once per process."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = BlockStore(path, codec, block_size)
+            _stores[path] = store
+        return store
+
+
+# Example usage:
+if __name__ == "__main__":
+    import argparse
+    import data_utils
+
+    parser = argparse.ArgumentParser(description="Convert a profile history to or from a block store.")
+    parser.add_argument("source", help="existing store (.json or .blk)")
+    parser.add_argument("dest", help="new store (.blk or .json)")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=DEFAULT_CODEC)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    if is_block_store(args.dest):
+        store = get_block_store(args.dest, args.codec, args.block_size)
+        count = store.rewrite(data_utils.iter_profiles(args.source))
+        stats = store.stats()
+    else:
+        count = data_utils.write_profiles(data_utils.iter_profiles(args.source), args.dest)
+        stats = {}
+    source_bytes = os.path.getsize(args.source)
+    dest_bytes = os.path.getsize(args.dest) + (stats.get("tail_bytes") or 0)
+    print(f"Wrote {count} record(s): {source_bytes} -> {dest_bytes} bytes")
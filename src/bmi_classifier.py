@@ -0,0 +1,117 @@
+'''
+This module provides threshold-table classifiers for BMI categories.
+Boundaries are sorted once; single values are resolved with bisect and
+arrays with numpy.searchsorted, so batch scoring is one vectorized call.
+'''
+
+
+import csv
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; classify_many falls back to bisect
+    np = None
+
+
+UNKNOWN = ("Unknown", "No description available.")
+
+
+class BMIClassifier:
+    """
+    Classify values against a table of (upper_bound, category, description) rows.
+    upper_bound is exclusive, so a value equal to a boundary falls in the next category.
+    """
+
+    def __init__(self, name: str, thresholds):
+        rows = sorted(thresholds, key=lambda row: row[0])
+        if not rows:
+            raise ValueError("A classifier needs at least one threshold.")
+        self.name = name
+        self.boundaries = tuple(float(row[0]) for row in rows)
+        self.categories = tuple(row[1] for row in rows)
+        self.descriptions = tuple(row[2] for row in rows)
+        if np is not None:
+            self._boundary_array = np.asarray(self.boundaries, dtype=float)
+            # Index len(boundaries) (value above every bound, or NaN) maps to "Unknown"
+            self._category_array = np.asarray(self.categories + (UNKNOWN[0],), dtype=object)
+
+    def classify(self, value: float) -> tuple[str, str]:
+        """Return (category, description) for a single value."""
+        index = bisect_right(self.boundaries, value)
+        if index == len(self.boundaries):
+            return UNKNOWN
+        return self.categories[index], self.descriptions[index]
+
+    def category_indices(self, values):
+        """Return the category index of every value (len(boundaries) means unknown)."""
+        if np is None:
+            return [bisect_right(self.boundaries, v) for v in values]
+        return np.searchsorted(self._boundary_array, np.asarray(values, dtype=float), side="right")
+
+    def classify_many(self, values):
+        """
+        Return the category name of every value.
+        A numpy array when numpy is installed, otherwise a list.
+        """
+        indices = self.category_indices(values)
+        if np is None:
+            labels = self.categories + (UNKNOWN[0],)
+            return [labels[i] for i in indices]
+        return self._category_array[indices]
+
+    @classmethod
+    def from_csv(cls, path: str, name: str = None):
+        """
+        Load a custom table from a CSV with columns upper_bound, category, description.
+        Use 'inf' as the upper bound of the last row.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [(float(row["upper_bound"]), row["category"], row["description"])
+                    for row in csv.DictReader(f)]
+        return cls(name or path, rows)
+
+
+# Standard WHO adult ranges.
+WHO = BMIClassifier("who", [
+    (18.5, "Underweight", "Below healthy range; consider nutritional guidance."),
+    (25.0, "Normal weight", "Healthy range"),
+    (30.0, "Overweight", "Above healthy range; lifestyle adjustments may help."),
+    (35.0, "Obesity class I", "Moderately high; medical advice is recommended."),
+    (40.0, "Obesity class II", "High; increased health risks."),
+    (float("inf"), "Obesity class III", "Very high; medical guidance is important."),
+])
+
+# WHO expert consultation cut-offs for Asian populations (action points 23, 27.5, 32.5, 37.5).
+WHO_ASIAN = BMIClassifier("who_asian", [
+    (18.5, "Underweight", "Below healthy range; consider nutritional guidance."),
+    (23.0, "Normal weight", "Healthy range"),
+    (27.5, "Overweight", "Increased risk for Asian populations; lifestyle adjustments may help."),
+    (32.5, "Obesity class I", "High risk; medical advice is recommended."),
+    (37.5, "Obesity class II", "Very high risk; increased health risks."),
+    (float("inf"), "Obesity class III", "Very high; medical guidance is important."),
+])
+
+# Children and teens: classifies a BMI-for-age percentile (0-100), not a raw BMI.
+PEDIATRIC_PERCENTILE = BMIClassifier("pediatric_percentile", [
+    (5.0, "Underweight", "Below the 5th percentile for age and sex."),
+    (85.0, "Normal weight", "Between the 5th and 85th percentile for age and sex."),
+    (95.0, "Overweight", "Between the 85th and 95th percentile for age and sex."),
+    (float("inf"), "Obesity", "At or above the 95th percentile for age and sex."),
+])
+
+CLASSIFIERS = {c.name: c for c in (WHO, WHO_ASIAN, PEDIATRIC_PERCENTILE)}
+
+
+def register_classifier(classifier: BMIClassifier):
+    """Make a custom classifier (e.g. a clinic table) available by name."""
+    CLASSIFIERS[classifier.name] = classifier
+    return classifier
+
+
+def get_classifier(name: str = "who") -> BMIClassifier:
+    """Return a registered classifier. Raises ValueError for unknown names."""
+    try:
+        return CLASSIFIERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown BMI classification scheme: {name}") from None
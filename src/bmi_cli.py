@@ -1,14 +1,17 @@
 import sys
 
+import profiling
 # Import functions from your existing modules
-from bmi_core import input_values, bmi_report, save_profile, cms_to_meters, inches_to_meters, feet_inches_to_meters, lb_to_kg
-from data_utils import load_profiles
-from visualize import plot_bmi_comparison, plot_weight_vs_ideal, plot_bmi_range, plot_bmi_distribution
+from bmi_core import input_values, bmi_report, save_profile
+from units import to_si
+from data_utils import load_profiles, recover
+from name_index import get_name_index
+from visualize import plot_bmi_comparison, plot_weight_vs_ideal, plot_bmi_range, plot_bmi_distribution, plot_bmi_history
 
 # Import suggestions
 from suggestions import generate_suggestions as get_static_suggestions, health_facts_of_the_day as get_static_fact
 # Import AI functions
-from chatbot_ai import generate_bmi_suggestions, generate_bmi_faq_answer, generate_health_fact_of_the_day, is_ai_available, get_premade_faq_list, get_premade_faq_answer
+from chatbot_ai import generate_bmi_suggestions, cached_bmi_suggestions, generate_bmi_faq_answer, generate_health_fact_of_the_day, is_ai_available, get_premade_faq_list, get_premade_faq_answer
 
 def print_separator():
     print("\n" + "-" * 50 + "\n")
@@ -25,13 +28,42 @@ def view_history():
     print("-" * 60)
     for p in profiles[-10:]:  # Show last 10 entries
         date_str = p.get('saved_at', 'N/A')[:19] 
-        print(f"{p.get('name', 'User'):<15} {date_str:<20} {p['bmi']:<10} {p['category']}")
+        repeats = f" (x{p['repeat_count']})" if p.get('repeat_count', 1) > 1 else ""
+        print(f"{p.get('name', 'User'):<15} {date_str:<20} {p['bmi']:<10} {p['category']}{repeats}")
+    print("-" * 60)
+
+
+def search_history():
+    """Finds saved profiles by name (prefix match, or fuzzy when nothing starts with the text)."""
+    query = input("Name to search for: ").strip()
+    if not query:
+        return
+    name_index = get_name_index()
+    names = name_index.search(query, limit=10)
+    if not names:
+        print(f"\n[!] No saved names match '{query}'.")
+        return
+
+    print(f"\n{'Name':<20} {'Records'}")
+    print("-" * 30)
+    for name in names:
+        print(f"{name_index.index.display[name]:<20} {len(name_index.index.positions[name])}")
+
+    # Last 10 records of the matching names, from the rows kept in the index
+    print(f"\n{'Name':<15} {'Date':<20} {'BMI':<10} {'Category'}")
+    print("-" * 60)
+    for row in name_index.recent_rows(names, 10):
+        date_str = (row['saved_at'] or 'N/A')[:19]
+        repeats = f" (x{row['repeat_count']})" if row['repeat_count'] > 1 else ""
+        bmi = row['bmi'] if row['bmi'] is not None else 'N/A'
+        print(f"{row['name']:<15} {date_str:<20} {bmi:<10} {row['category'] or 'N/A'}{repeats}")
     print("-" * 60)
 
 
 def display_static_suggestions(bmi, category):
     """Helper function to print static suggestions (used for standard choice AND fallback)."""
-    data = get_static_suggestions(bmi, category)
+    with profiling.span("suggest"):
+        data = get_static_suggestions(bmi, category)
     print_separator()
     print(f"*** HEALTH FACTS FOR {category.upper()} (Standard) ***")
     for fact in data['health_facts']:
@@ -63,10 +95,15 @@ def handle_suggestions(bmi, category, age, sex):
         display_static_suggestions(bmi, category)
 
     elif choice == '2':
-        print("\n... Contacting AI (this may take a moment) ...")
+        # Pre-generated advice (ai_warmup) needs no API call
+        ai_result = cached_bmi_suggestions(bmi, category, age, sex)
+        if ai_result is None:
+            print("\n... Contacting AI (this may take a moment) ...")
         try:
             # Attempt AI generation
-            ai_result = generate_bmi_suggestions(bmi, category, age, sex)
+            if ai_result is None:
+                with profiling.span("suggest"):
+                    ai_result = generate_bmi_suggestions(bmi, category, age, sex)
             
             # Check if API returned an error key instead of data
             if "error" in ai_result:
@@ -194,6 +231,7 @@ def main():
     print("\n==========================================")
     print("       BMI HEALTH ANALYZER (CLI)          ")
     print("==========================================")
+    recover()
 
     # --- START UP: Health Fact of the Day ---
     print("\nLoading Health Fact of the Day...")
@@ -247,7 +285,10 @@ def main():
         h_unit_str = height_units_map[height_unit_choice]
 
         # --- STEP 2: REPORT GENERATION ---
-        report = bmi_report(weight, height, age, sex, w_unit_str, h_unit_str)
+        # Convert to kg / m once; the report and the graphs both use these values
+        with profiling.span("calculate"):
+            weight_kg, height_m = to_si(weight, height, w_unit_str, h_unit_str)
+            report = bmi_report(weight_kg, height_m, age, sex)
 
         if isinstance(report, str):
             print(f"\nError calculating BMI: {report}")
@@ -272,10 +313,12 @@ def main():
         profile_data = {
             "name": name, "age": age, "sex": sex,
             "weight": weight, "height": height,
+            "weight_unit": w_unit_str, "height_unit": h_unit_str,
             "bmi": bmi, "category": category,
             "bmr": bmr
         }
-        save_profile(profile_data)
+        with profiling.span("save"):
+            save_profile(profile_data)
         print("\n(Result saved to history)")
         print_separator()
 
@@ -285,8 +328,9 @@ def main():
             print("2. Ask AI FAQ")
             print("3. Show Graphs")
             print("4. View History")
-            print("5. Recalculate (New User)")
-            print("6. Exit App")
+            print("5. Search History by Name")
+            print("6. Recalculate (New User)")
+            print("7. Exit App")
 
             menu_choice = input("Select Option: ").strip()
 
@@ -302,24 +346,19 @@ def main():
                 print("b. Weight vs Healthy Range")
                 print("c. BMI Position")
                 print("d. Global BMI Distribution")
-                g_choice = input("Choose graph (a/b/c/d): ").strip().lower()
+                print("e. Your BMI History")
+                g_choice = input("Choose graph (a/b/c/d/e): ").strip().lower()
                 try:
                     if g_choice == 'a':
                         plot_bmi_comparison(bmi)
                     elif g_choice == 'b':
-                        # Convert to Metric for Visualize functions
-                        h_m = 0
-                        if h_unit_str == 'm': h_m = height
-                        elif h_unit_str == 'cm': h_m = cms_to_meters(height)
-                        elif h_unit_str == 'in': h_m = inches_to_meters(height)
-                        elif h_unit_str == 'ft_in': h_m = feet_inches_to_meters(height[0], height[1])
-                        
-                        w_kg = weight if w_unit_str == 'kg' else lb_to_kg(weight)
-                        plot_weight_vs_ideal(w_kg, h_m)
+                        plot_weight_vs_ideal(weight_kg, height_m)
                     elif g_choice == 'c':
                         plot_bmi_range(bmi)
                     elif g_choice == 'd':
                         plot_bmi_distribution()
+                    elif g_choice == 'e':
+                        plot_bmi_history(name)
                     else:
                         print("Invalid graph choice.")
                 except Exception as e:
@@ -329,10 +368,13 @@ def main():
                 view_history()
 
             elif menu_choice == '5':
+                search_history()
+
+            elif menu_choice == '6':
                 print("\nRestarting Calculator...")
                 break 
 
-            elif menu_choice == '6':
+            elif menu_choice == '7':
                 print("Goodbye! Stay Healthy.")
                 sys.exit()
             
@@ -341,6 +383,7 @@ def main():
 
 
 if __name__ == "__main__":
+    profiling.start_from_argv(description="BMI Health Analyzer (CLI)")
     try:
         main()
     except KeyboardInterrupt:
@@ -1,11 +1,30 @@
 from data_utils import save_profile
-VALID_WEIGHT_UNITS = {'kg', 'lb'}
-VALID_HEIGHT_UNITS = {'m', 'cm', 'in', 'ft_in'}
+from bmi_classifier import UNKNOWN, get_classifier
+from units import (VALID_WEIGHT_UNITS, VALID_HEIGHT_UNITS, KG_PER_LB, M_PER_INCH, UnitError,
+                   pack_feet_inches, pack_heights, to_si, to_si_arrays)
+import metrics
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; bmi_reports then classifies with bisect
+    np = None
+
+# Set to False to silence the [LOG] output (benchmarks, batch jobs)
+LOG_CALCULATIONS = True
+
+REPORTS = metrics.counter("bmi_reports_total", "BMI reports built, by outcome and lookup path.", ["outcome", "path"])
+# Bound once so the hot path is a single locked increment
+_REPORTS_FORMULA = REPORTS.labels(outcome="ok", path="formula")
+_REPORTS_TABLES = REPORTS.labels(outcome="ok", path="tables")
+_REPORTS_INVALID_UNIT = REPORTS.labels(outcome="invalid_unit", path="none")
+_REPORTS_INVALID_VALUE = REPORTS.labels(outcome="invalid_value", path="none")
 
 
 def log_execution(func):
     """Decorator that prints messages before and after function execution."""
     def wrapper(*args, **kwargs):
+        if not LOG_CALCULATIONS:
+            return func(*args, **kwargs)
         print(f"\n[LOG] Starting calculation: {func.__name__}...")
         print(f"[LOG] Input values: {args}")
         result = func(*args, **kwargs)
@@ -91,34 +110,28 @@ def lb_to_kg(pounds):
     """
     Convert pounds to kilograms.
     """
-    kg = pounds * 0.45359237
-    return kg
+    return pounds * KG_PER_LB
 
 
 def inches_to_meters(inches):
     """
     Convert inches to meters.
     """
-    meters = inches * 0.0254
-    return meters
+    return inches * M_PER_INCH
 
 
 def feet_inches_to_meters(feet, inches):
     """
     Convert feet and inches to meters.
     """
-    total_inches = (feet * 12) + inches
-    meters = total_inches * 0.0254
-    return meters
+    return pack_feet_inches(feet, inches) * M_PER_INCH
 
 
 def cms_to_meters(cms):
     """
     Convert centimeters to meters.
     """
-
-    meters = cms / 100
-    return meters
+    return cms / 100
 
 
 @log_execution
@@ -178,67 +191,83 @@ def kg_diff_to_reach_healthy(weight_kg: float, min_w: float, max_w: float):
     return gain, lose
 
 
-def bmi_category(bmi: float) -> tuple[str, str]:
+def bmi_category(bmi: float, scheme: str = "who") -> tuple[str, str]:
     """
     Return (category, description).
-    Uses standard WHO ranges.
+    Uses standard WHO ranges by default; see bmi_classifier for other schemes.
     """
-    # thresholds: (upper_bound, category, description)
-    # upper_bound is exclusive except the last one.
-    thresholds = [
-        (18.5, "Underweight", "Below healthy range; consider nutritional guidance."),
-        (25.0, "Normal weight", "Healthy range"),
-        (30.0, "Overweight", "Above healthy range; lifestyle adjustments may help."),
-        (35.0, "Obesity class I", "Moderately high; medical advice is recommended."),
-        (40.0, "Obesity class II", "High; increased health risks."),
-        (float("inf"), "Obesity class III", "Very high; medical guidance is important.")
-    ]
-    for boundary, category, description in thresholds:
-        if bmi < boundary:
-            return category, description
-    # fallback (shouldn't happen)
-    return "Unknown", "No description available."
-
-
-def bmi_report(weight, height, age, sex, weight_unit='kg', height_unit='m'):
-    # Validate units using sets
-    if weight_unit not in VALID_WEIGHT_UNITS:
-        return "Unsupported weight unit."
-    if height_unit not in VALID_HEIGHT_UNITS:
-        return "Unsupported height unit."
-    
-    # Convert weight
-    if weight_unit == 'lb':
-        weight_kg = lb_to_kg(weight)
-    else:  # kg
-        weight_kg = float(weight)
-
-    # Convert height
-    if height_unit == 'm':
-        height_m = float(height)
-    elif height_unit == 'cm':
-        height_m = cms_to_meters(float(height))
-    elif height_unit == 'in':
-        height_m = inches_to_meters(float(height))
-    elif height_unit == 'ft_in':
-        if isinstance(height, tuple) and len(height) == 2:
-            feet, inches = height
-            height_m = feet_inches_to_meters(float(feet), float(inches))
-        else:
-            return "Height must be a tuple (feet, inches) for 'ft_in' unit."
+    return get_classifier(scheme).classify(bmi)
+
+
+def bmi_report(weight, height, age, sex, weight_unit='kg', height_unit='m', use_tables=False):
+    """
+    Build the full report tuple.
+    use_tables=True looks up the healthy weight range in the precomputed bmi_tables
+    instead of evaluating the formula: heights are quantized to 1 cm, so each bound can
+    differ from the formula by up to bmi_tables.HEALTHY_RANGE_TOLERANCE_KG (0.64 kg, at
+    2.5 m; about 0.45 kg at 1.8 m), and kg_to_gain/kg_to_lose follow it.
+    BMR is always computed exactly.
+    """
+    # Normalize to kg / m (validates the units as well)
+    try:
+        weight_kg, height_m = to_si(weight, height, weight_unit, height_unit)
+    except UnitError as e:
+        _REPORTS_INVALID_UNIT.inc()
+        return str(e)
+    return _report_si(weight_kg, height_m, age, sex, use_tables)
+
+
+def bmi_reports(weights, heights, ages, sexes, weight_units='kg', height_units='m', use_tables=False):
+    """
+    Build report tuples for whole columns, one per row (an error string for a row that fails).
+    Units may be one string per column or one per row. Weights and heights must already be
+    numbers, with 'ft_in' heights as (feet, inches) pairs; they are converted to kg / m once
+    for the whole batch (units.to_si_arrays) and classified as one column
+    (BMIClassifier.category_indices) instead of row by row.
+    Raises UnitError if any unit is unsupported.
+    """
+    try:
+        weights_kg, heights_m = to_si_arrays(weights, weight_units, pack_heights(heights, height_units), height_units)
+    except UnitError:
+        _REPORTS_INVALID_UNIT.inc(len(weights))
+        raise
+
+    # Classify the whole BMI column in one call; rows calculate_bmi rejects are never looked up
+    if np is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bmi_values = weights_kg / heights_m ** 2
     else:
-        return "Unsupported height unit."
+        bmi_values = [w / h ** 2 if h > 0 else 0.0 for w, h in zip(weights_kg, heights_m)]
+    classifier = get_classifier()
+    categories = classifier.categories + (UNKNOWN[0],)
+    descriptions = classifier.descriptions + (UNKNOWN[1],)
+    return [
+        _report_si(float(weight_kg), float(height_m), age, sex, use_tables, (categories[i], descriptions[i]))
+        for weight_kg, height_m, age, sex, i in zip(weights_kg, heights_m, ages, sexes,
+                                                     classifier.category_indices(bmi_values))
+    ]
 
+
+def _report_si(weight_kg, height_m, age, sex, use_tables, category=None):
+    """The rest of bmi_report, once the measurement is in kg / m (category if already classified)."""
     try:
         bmi_value = calculate_bmi(weight_kg, height_m)
     except ValueError as e:
+        _REPORTS_INVALID_VALUE.inc()
         return str(e)
 
     # round for display only
     bmi_value_rounded = round(bmi_value, 2)
-    category, description = bmi_category(bmi_value)
+    category, description = category or bmi_category(bmi_value)
+    if use_tables:
+        # Imported here because bmi_tables builds on this module's formulas
+        from bmi_tables import get_lookup_tables
+        healthy_weight_values = get_lookup_tables().healthy_weight_range(height_m)
+        _REPORTS_TABLES.inc()
+    else:
+        healthy_weight_values = healthy_weight_range_for_height(height_m)
+        _REPORTS_FORMULA.inc()
     bmr_value = calculate_bmr_mifflin(weight_kg, height_m * 100, age, sex)
-    healthy_weight_values = healthy_weight_range_for_height(height_m)
     water_intake = recommended_water_liters_per_day(weight_kg)
     kg_to_gain, kg_to_lose = kg_diff_to_reach_healthy(weight_kg, healthy_weight_values[0], healthy_weight_values[1])
 
@@ -278,6 +307,8 @@ def main():
         "sex": sex,
         "weight": weight,
         "height": height,
+        "weight_unit": weight_units[weight_unit_choice],
+        "height_unit": height_units[height_unit_choice],
         "bmi": bmi,
         "category": category,
         "bmr": bmr_value,
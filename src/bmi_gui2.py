@@ -1,19 +1,27 @@
 import wx
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
 
 # Import functions from existing modules
-from bmi_core import (
-    bmi_report, save_profile, cms_to_meters, 
-    inches_to_meters, feet_inches_to_meters, lb_to_kg
+from bmi_core import bmi_report, save_profile
+from units import to_si
+from data_utils import load_profiles, recover, subscribe, unsubscribe, ProfileWatcher, PROFILE_FILE, record_id
+from name_index import NameIndex
+from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg
+from matplotlib.figure import Figure
+from visualize import (
+    plot_bmi_comparison, plot_weight_vs_ideal, plot_bmi_range, plot_bmi_distribution,
+    load_bmi_history, build_bmi_history, HISTORY_DPI
 )
-from data_utils import load_profiles
-from visualize import plot_bmi_comparison, plot_weight_vs_ideal, plot_bmi_range, plot_bmi_distribution
 from suggestions import (
     generate_suggestions as get_static_suggestions,
     health_facts_of_the_day as get_static_fact
 )
 from chatbot_ai import (
     generate_bmi_suggestions, 
+    cached_bmi_suggestions,
     generate_bmi_faq_answer, 
     generate_health_fact_of_the_day,
     is_ai_available,
@@ -22,6 +30,71 @@ from chatbot_ai import (
 )
 
 
+class TaskRunner:
+    """
+    Shared, bounded thread pool for blocking GUI work (file I/O and AI calls).
+    Every task has a key: submitting a new task under the same key cancels the previous
+    one, and results of cancelled or superseded tasks are never delivered.
+    Callbacks always run on the GUI thread through wx.CallAfter.
+    Note: a task that has already started keeps running; only its result is dropped.
+    """
+    
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bmi-gui")
+        self._current = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, key, func, *args, on_success=None, on_error=None):
+        """Run func(*args) in the pool and deliver its result (or exception) to the callbacks."""
+        with self._lock:
+            previous = self._current.get(key)
+            future = self.executor.submit(func, *args)
+            self._current[key] = future
+        if previous is not None:
+            previous.cancel()
+        future.add_done_callback(lambda f: self._on_done(key, f, on_success, on_error))
+        return future
+    
+    def cancel(self, key):
+        """Cancel the pending task for key, if any. Returns True if there was one."""
+        with self._lock:
+            future = self._current.pop(key, None)
+        if future is None:
+            return False
+        future.cancel()
+        return True
+    
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._current
+    
+    def shutdown(self):
+        """Drop queued tasks and stop accepting new ones."""
+        with self._lock:
+            self._current.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _on_done(self, key, future, on_success, on_error):
+        # Runs on the worker thread
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                wx.CallAfter(self._deliver, key, future, on_error, error)
+        else:
+            wx.CallAfter(self._deliver, key, future, on_success, future.result())
+    
+    def _deliver(self, key, future, callback, value):
+        # Runs on the GUI thread; re-check in case the task was cancelled while queued
+        with self._lock:
+            if self._current.get(key) is not future:
+                return
+            del self._current[key]
+        if callback:
+            callback(value)
+
+
 class BMICalculatorApp(wx.Frame):
     """Main application window for BMI Health Analyzer."""
     
@@ -32,6 +105,10 @@ class BMICalculatorApp(wx.Frame):
         self.current_result = None
         self.current_input = None
         
+        # One bounded pool for all background work in the window
+        self.tasks = TaskRunner()
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        
         # Create main panel with simple background color
         self.panel = wx.Panel(self)
         self.panel.SetBackgroundColour(wx.Colour(230, 240, 250))
@@ -61,6 +138,7 @@ class BMICalculatorApp(wx.Frame):
         self.notebook.AddPage(self.faq_tab, "AI FAQ")
         self.notebook.AddPage(self.history_tab, "History")
         self.notebook.AddPage(self.graphs_tab, "Graphs")
+        self.notebook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGING, self.on_page_changing)
         
         # Layout
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -90,13 +168,23 @@ class BMICalculatorApp(wx.Frame):
         """Load health fact of the day (try AI first, fallback to static)."""
         def fetch_fact():
             try:
-                fact = generate_health_fact_of_the_day()
+                return generate_health_fact_of_the_day()
             except Exception:
-                fact = get_static_fact()
-            wx.CallAfter(self.fact_text.SetLabel, f"★ {fact}")
+                return get_static_fact()
         
-        thread = threading.Thread(target=fetch_fact, daemon=True)
-        thread.start()
+        self.tasks.submit("health_fact", fetch_fact,
+                          on_success=lambda fact: self.fact_text.SetLabel(f"★ {fact}"))
+    
+    def on_page_changing(self, event):
+        """Cancel pending work that belongs to the tab being left."""
+        page = self.notebook.GetPage(event.GetOldSelection()) if event.GetOldSelection() != wx.NOT_FOUND else None
+        if hasattr(page, "cancel_pending"):
+            page.cancel_pending()
+        event.Skip()
+    
+    def on_close(self, event):
+        self.tasks.shutdown()
+        event.Skip()
     
     def set_result(self, result, user_input):
         """Store calculation result and enable other tabs."""
@@ -234,56 +322,90 @@ class CalculatorTab(wx.Panel):
             else:
                 height = float(self.height_input.GetValue())
                 h_unit = h_unit_str
+        except ValueError as e:
+            wx.MessageBox(f"Invalid input: {e}", "Input Error", wx.OK | wx.ICON_ERROR)
+            return
+        
+        user_input = {
+            "name": name, "weight": weight, "height": height,
+            "age": age, "sex": sex, "w_unit": w_unit, "h_unit": h_unit
+        }
+        
+        # Report and file save run in the worker pool; the button stays disabled until done
+        self.calc_btn.Disable()
+        self.main_frame.tasks.submit(
+            "calculate", self.calculate_and_save, user_input,
+            on_success=self.show_result, on_error=self.show_error
+        )
+    
+    @staticmethod
+    def calculate_and_save(user_input):
+        """Worker-thread part of a calculation: report plus profile save."""
+        # Convert to kg / m once; the report and the graphs both use these values
+        with profiling.span("calculate"):
+            weight_kg, height_m = to_si(user_input["weight"], user_input["height"], user_input["w_unit"], user_input["h_unit"])
+            user_input["weight_kg"] = weight_kg
+            user_input["height_m"] = height_m
             
             # Calculate BMI
-            report = bmi_report(weight, height, age, sex, w_unit, h_unit)
-            
-            if isinstance(report, str):
-                wx.MessageBox(f"Error: {report}", "Calculation Error", wx.OK | wx.ICON_ERROR)
-                return
-            
-            # Unpack results
-            bmi, category, desc, bmr, healthy_rng, water, gain, lose = report
-            
-            # Display results
-            result = f"RESULTS FOR: {name}\n"
-            result += "=" * 40 + "\n\n"
-            result += f"BMI:           {bmi}\n"
-            result += f"Category:      {category}\n"
-            result += f"Description:   {desc}\n\n"
-            result += f"BMR:           {bmr} kcal/day\n"
-            result += f"Water Intake:  {water} Liters/day\n"
-            result += f"Healthy Range: {healthy_rng[0]} - {healthy_rng[1]} kg\n\n"
-            
-            if gain > 0:
-                result += f"To Reach Healthy: Gain ~{gain} kg\n"
-            if lose > 0:
-                result += f"To Reach Healthy: Lose ~{lose} kg\n"
-            
-            result += "\n(Result saved to history)"
-            
-            self.result_text.SetValue(result)
-            
-            # Save profile
-            profile_data = {
-                "name": name, "age": age, "sex": sex,
-                "weight": weight, "height": height,
-                "bmi": bmi, "category": category, "bmr": bmr
-            }
+            report = bmi_report(weight_kg, height_m, user_input["age"], user_input["sex"])
+        if isinstance(report, str):
+            return report, user_input
+        
+        bmi, category, desc, bmr, *_ = report
+        
+        # Save profile
+        profile_data = {
+            "name": user_input["name"], "age": user_input["age"], "sex": user_input["sex"],
+            "weight": user_input["weight"], "height": user_input["height"],
+            "weight_unit": user_input["w_unit"], "height_unit": user_input["h_unit"],
+            "bmi": bmi, "category": category, "bmr": bmr
+        }
+        with profiling.span("save"):
             save_profile(profile_data)
-            
-            # Store result in main frame
-            user_input = {
-                "name": name, "weight": weight, "height": height,
-                "age": age, "sex": sex, "w_unit": w_unit, "h_unit": h_unit
-            }
-            self.main_frame.set_result(report, user_input)
-            
-            # Refresh history tab
-            self.main_frame.history_tab.refresh_history()
-            
-        except ValueError as e:
-            wx.MessageBox(f"Invalid input: {e}", "Input Error", wx.OK | wx.ICON_ERROR)
+        return report, user_input
+    
+    def show_result(self, outcome):
+        """Display a finished calculation (GUI thread)."""
+        self.calc_btn.Enable()
+        report, user_input = outcome
+        
+        if isinstance(report, str):
+            wx.MessageBox(f"Error: {report}", "Calculation Error", wx.OK | wx.ICON_ERROR)
+            return
+        
+        # Unpack results
+        bmi, category, desc, bmr, healthy_rng, water, gain, lose = report
+        
+        # Display results
+        result = f"RESULTS FOR: {user_input['name']}\n"
+        result += "=" * 40 + "\n\n"
+        result += f"BMI:           {bmi}\n"
+        result += f"Category:      {category}\n"
+        result += f"Description:   {desc}\n\n"
+        result += f"BMR:           {bmr} kcal/day\n"
+        result += f"Water Intake:  {water} Liters/day\n"
+        result += f"Healthy Range: {healthy_rng[0]} - {healthy_rng[1]} kg\n\n"
+        
+        if gain > 0:
+            result += f"To Reach Healthy: Gain ~{gain} kg\n"
+        if lose > 0:
+            result += f"To Reach Healthy: Lose ~{lose} kg\n"
+        
+        result += "\n(Result saved to history)"
+        
+        self.result_text.SetValue(result)
+        
+        # Store result in main frame
+        self.main_frame.set_result(report, user_input)
+    
+    def show_error(self, error):
+        """Report a failed calculation (GUI thread)."""
+        self.calc_btn.Enable()
+        if isinstance(error, ValueError):
+            wx.MessageBox(f"Invalid input: {error}", "Input Error", wx.OK | wx.ICON_ERROR)
+        else:
+            wx.MessageBox(f"Could not calculate or save: {error}", "Calculation Error", wx.OK | wx.ICON_ERROR)
 
 
 class SuggestionsTab(wx.Panel):
@@ -343,8 +465,12 @@ class SuggestionsTab(wx.Panel):
         if not self.main_frame.current_result:
             return
         
+        # A pending AI request must not overwrite these
+        self.main_frame.tasks.cancel("suggestions")
+        
         bmi, category, *_ = self.main_frame.current_result
-        data = get_static_suggestions(bmi, category)
+        with profiling.span("suggest"):
+            data = get_static_suggestions(bmi, category)
         
         text = f"=== STANDARD SUGGESTIONS FOR {category.upper()} ===\n\n"
         
@@ -376,52 +502,66 @@ class SuggestionsTab(wx.Panel):
         age = self.main_frame.current_input['age']
         sex = self.main_frame.current_input['sex']
         
+        # Pre-generated advice (ai_warmup) is shown at once, without the worker pool
+        cached = cached_bmi_suggestions(bmi, category, age, sex)
+        if cached is not None:
+            self.main_frame.tasks.cancel("suggestions")
+            self.suggestions_text.SetValue(self.format_ai_suggestions(cached))
+            return
+        
         self.suggestions_text.SetValue("Contacting AI... Please wait...")
-        self.ai_btn.Disable()
         
         def fetch_ai():
-            try:
+            with profiling.span("suggest"):
                 ai_result = generate_bmi_suggestions(bmi, category, age, sex)
-                
-                if "error" in ai_result:
-                    raise ValueError(ai_result["error"])
-                
-                text = "=== AI-POWERED SUGGESTIONS ===\n\n"
-                text += "--- SUMMARY ---\n"
-                text += ai_result.get("summary", "No summary provided.") + "\n\n"
-                
-                recs = ai_result.get("recommendations", {})
-                
-                text += "--- EXERCISES ---\n"
-                for ex in recs.get("exercises", []):
-                    text += f"• {ex}\n"
-                
-                text += "\n--- NUTRITION ---\n"
-                for nut in recs.get("nutrition", []):
-                    text += f"• {nut}\n"
-                
-                text += "\n--- LIFESTYLE ---\n"
-                for life in recs.get("lifestyle", []):
-                    text += f"• {life}\n"
-                
-                if ai_result.get("caution"):
-                    text += f"\n⚠ CAUTION: {ai_result['caution']}\n"
-                
-                wx.CallAfter(self.suggestions_text.SetValue, text)
-                
-            except Exception as e:
-                # Fallback to standard
-                wx.CallAfter(self.show_fallback, str(e))
             
-            wx.CallAfter(self.ai_btn.Enable)
+            if "error" in ai_result:
+                raise ValueError(ai_result["error"])
+            return self.format_ai_suggestions(ai_result)
+        
+        # Clicking again replaces (cancels) a request that is still pending
+        self.main_frame.tasks.submit(
+            "suggestions", fetch_ai,
+            on_success=self.suggestions_text.SetValue,
+            # Fallback to standard
+            on_error=lambda e: self.show_fallback(str(e))
+        )
+    
+    @staticmethod
+    def format_ai_suggestions(ai_result):
+        """Text shown for an AI suggestions result."""
+        text = "=== AI-POWERED SUGGESTIONS ===\n\n"
+        text += "--- SUMMARY ---\n"
+        text += ai_result.get("summary", "No summary provided.") + "\n\n"
+        
+        recs = ai_result.get("recommendations", {})
+        
+        text += "--- EXERCISES ---\n"
+        for ex in recs.get("exercises", []):
+            text += f"• {ex}\n"
+        
+        text += "\n--- NUTRITION ---\n"
+        for nut in recs.get("nutrition", []):
+            text += f"• {nut}\n"
         
-        thread = threading.Thread(target=fetch_ai, daemon=True)
-        thread.start()
+        text += "\n--- LIFESTYLE ---\n"
+        for life in recs.get("lifestyle", []):
+            text += f"• {life}\n"
+        
+        if ai_result.get("caution"):
+            text += f"\n⚠ CAUTION: {ai_result['caution']}\n"
+        return text
+    
+    def cancel_pending(self):
+        """Drop a pending AI request (called when leaving the tab)."""
+        if self.main_frame.tasks.cancel("suggestions"):
+            self.suggestions_text.SetValue("AI request cancelled. Click a button to get suggestions.")
     
     def show_fallback(self, error):
         """Show standard suggestions as fallback when AI fails."""
         bmi, category, *_ = self.main_frame.current_result
-        data = get_static_suggestions(bmi, category)
+        with profiling.span("suggest"):
+            data = get_static_suggestions(bmi, category)
         
         text = f"⚠ AI Connection Failed: {error}\n"
         text += "Showing Standard Suggestions instead...\n\n"
@@ -532,26 +672,31 @@ class FAQTab(wx.Panel):
         self.ask_btn.Disable()
         
         def fetch_answer():
-            try:
-                result = generate_bmi_faq_answer(question)
-                if isinstance(result, dict):
-                    if result.get("ai_available"):
-                        answer = result.get("answer", "No answer received.")
-                    else:
-                        # AI unavailable - show message with premade FAQ hint
-                        answer = "⚠️ AI is unavailable. Please use the premade questions dropdown below, or check your API key."
-                else:
-                    answer = str(result)
-                wx.CallAfter(self.chat_history.AppendText, f"\nAI: {answer}\n")
-                wx.CallAfter(self.chat_history.AppendText, "-" * 50 + "\n")
-            except Exception as e:
-                wx.CallAfter(self.chat_history.AppendText, f"\n⚠️ AI Error: {e}\nPlease use the premade questions dropdown below.\n")
-                wx.CallAfter(self.chat_history.AppendText, "-" * 50 + "\n")
-            
-            wx.CallAfter(self.ask_btn.Enable)
-        
-        thread = threading.Thread(target=fetch_answer, daemon=True)
-        thread.start()
+            result = generate_bmi_faq_answer(question)
+            if isinstance(result, dict):
+                if result.get("ai_available"):
+                    return result.get("answer", "No answer received.")
+                # AI unavailable - show message with premade FAQ hint
+                return "⚠️ AI is unavailable. Please use the premade questions dropdown below, or check your API key."
+            return str(result)
+        
+        self.main_frame.tasks.submit("faq", fetch_answer, on_success=self.show_answer, on_error=self.show_answer_error)
+    
+    def show_answer(self, answer):
+        self.chat_history.AppendText(f"\nAI: {answer}\n")
+        self.chat_history.AppendText("-" * 50 + "\n")
+        self.ask_btn.Enable()
+    
+    def show_answer_error(self, error):
+        self.chat_history.AppendText(f"\n⚠️ AI Error: {error}\nPlease use the premade questions dropdown below.\n")
+        self.chat_history.AppendText("-" * 50 + "\n")
+        self.ask_btn.Enable()
+    
+    def cancel_pending(self):
+        """Drop a pending AI answer (called when leaving the tab)."""
+        if self.main_frame.tasks.cancel("faq"):
+            self.chat_history.AppendText("\n(AI request cancelled)\n" + "-" * 50 + "\n")
+            self.ask_btn.Enable()
     
     def on_premade_faq(self, event):
         """Handle premade FAQ selection."""
@@ -571,14 +716,194 @@ class FAQTab(wx.Panel):
             self.chat_history.AppendText("\nCould not retrieve answer.\n")
 
 
+class HistoryDataSource:
+    """
+    In-memory view of the profile store behind the virtual history list.
+    The store is read once per reload; sorting and filtering only reorder a list of
+    record indices, and row text is formatted on demand one page at a time.
+    Name searches go through a NameIndex (prefix, then fuzzy) kept alongside the records.
+    """
+    
+    # (header, profile key, column width)
+    COLUMNS = [
+        ("Name", "name", 100),
+        ("Date", "saved_at", 150),
+        ("BMI", "bmi", 80),
+        ("Category", "category", 150),
+        ("Age", "age", 50),
+        ("Sex", "sex", 70),
+    ]
+    PAGE_SIZE = 100
+    NAME_MATCH_LIMIT = 50  # distinct names a name search may match
+    
+    def __init__(self):
+        self.records = []
+        self.name_index = NameIndex()
+        self.name_query = ""
+        self._name_positions = None
+        self.view = []
+        self.sort_column = 1  # Date
+        self.sort_descending = True  # most recent first
+        self.filter_text = ""
+        self._pages = {}
+    
+    def __len__(self):
+        return len(self.view)
+    
+    def reload(self):
+        """Read the whole profile store again."""
+        self.set_records(*self.load())
+    
+    @staticmethod
+    def load():
+        """Read the store and index its names. Blocking; safe to run on a worker thread."""
+        records = load_profiles()
+        return records, NameIndex.from_profiles(records)
+    
+    def set_records(self, records, name_index):
+        """Swap in records (and their name index) read by load()."""
+        self.records = records
+        self.name_index = name_index
+        self._search_names()
+        self._rebuild_view()
+    
+    def append(self, record):
+        """Add one newly saved record without re-reading the store."""
+        self.records.append(record)
+        index = self.name_index.add(record)
+        if self.name_query:
+            # The new record may change which names match best
+            self._search_names()
+            self._rebuild_view()
+            return
+        if self.filter_text and not self._matches(record):
+            return
+        if self.sort_column == 1 and self.sort_descending:
+            # Default order (newest first): the new record simply goes on top
+            self.view.insert(0, index)
+            self._pages.clear()
+        else:
+            self._rebuild_view()
+    
+    def replace(self, record):
+        """Swap in a new version of a loaded record (same record id); returns whether it was loaded."""
+        rid = record_id(record)
+        for index in range(len(self.records) - 1, -1, -1):
+            if record_id(self.records[index]) == rid:
+                self.records[index] = record
+                self._pages.clear()
+                return True
+        return False
+    
+    def set_name_query(self, text):
+        """Show only records of names matching text by prefix or, failing that, fuzzily."""
+        self.name_query = text.strip()
+        self._search_names()
+        self._rebuild_view()
+    
+    def _search_names(self):
+        if self.name_query:
+            names = self.name_index.search(self.name_query, self.NAME_MATCH_LIMIT)
+            self._name_positions = self.name_index.records_for(names)
+        else:
+            self._name_positions = None
+    
+    def set_filter(self, text):
+        """Keep only records whose name or category contains text (case-insensitive)."""
+        self.filter_text = text.strip().lower()
+        self._rebuild_view()
+    
+    def sort_by(self, column):
+        """Sort by a column; clicking the same column again reverses the order."""
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self._rebuild_view()
+    
+    def cell_text(self, row, column):
+        """Text for one cell of the current view."""
+        page_number = row // self.PAGE_SIZE
+        page = self._pages.get(page_number)
+        if page is None:
+            start = page_number * self.PAGE_SIZE
+            page = [self._format_row(self.records[i]) for i in self.view[start:start + self.PAGE_SIZE]]
+            self._pages[page_number] = page
+        return page[row % self.PAGE_SIZE][column]
+    
+    def _matches(self, record):
+        text = self.filter_text
+        return text in str(record.get('name', '')).lower() or text in str(record.get('category', '')).lower()
+    
+    def _sort_key(self, index):
+        value = self.records[index].get(self.COLUMNS[self.sort_column][1])
+        # Numbers sort before text so mixed or missing values never compare across types
+        if isinstance(value, (int, float)):
+            return (0, value, "")
+        return (1, 0, str(value) if value is not None else "")
+    
+    def _rebuild_view(self):
+        indices = range(len(self.records)) if self._name_positions is None else self._name_positions
+        if self.filter_text:
+            indices = [i for i in indices if self._matches(self.records[i])]
+        self.view = sorted(indices, key=self._sort_key, reverse=self.sort_descending)
+        self._pages.clear()
+    
+    @staticmethod
+    def _format_row(p):
+        name = p.get('name', 'User')
+        if p.get('repeat_count', 1) > 1:
+            name = f"{name} (x{p['repeat_count']})"
+        return (
+            name,
+            p.get('saved_at', 'N/A')[:19],
+            str(p.get('bmi', 'N/A')),
+            p.get('category', 'N/A'),
+            str(p.get('age', 'N/A')),
+            p.get('sex', 'N/A'),
+        )
+
+
+class HistoryListCtrl(wx.ListCtrl):
+    """Virtual list control: rows are requested from the data source only when visible."""
+    
+    def __init__(self, parent, source):
+        super().__init__(parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.source = source
+        for col, (header, _, width) in enumerate(HistoryDataSource.COLUMNS):
+            self.InsertColumn(col, header, width=width)
+    
+    def OnGetItemText(self, item, column):
+        return self.source.cell_text(item, column)
+    
+    def update(self):
+        """Resize the list to the current view and repaint the visible rows."""
+        self.SetItemCount(len(self.source))
+        self.Refresh()
+
+
 class HistoryTab(wx.Panel):
     """Tab for viewing saved BMI history."""
     
+    POLL_INTERVAL_MS = 2000
+    
     def __init__(self, parent, main_frame):
         super().__init__(parent)
         self.main_frame = main_frame
+        self.source = HistoryDataSource()
+        # None while a reload is in flight; polling waits for it
+        self.watcher = None
+        self._poll_again = False
         self.setup_ui()
         self.refresh_history()
+        
+        # New rows arrive from saves in this process (event) and from other processes (polling)
+        subscribe(self.on_profile_saved)
+        self.poll_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_poll_timer, self.poll_timer)
+        self.poll_timer.Start(self.POLL_INTERVAL_MS)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
     
     def setup_ui(self):
         main_sizer = wx.BoxSizer(wx.VERTICAL)
@@ -588,41 +913,137 @@ class HistoryTab(wx.Panel):
         title.SetFont(wx.Font(16, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD))
         main_sizer.Add(title, 0, wx.ALL | wx.ALIGN_CENTER, 10)
         
-        # Refresh button
+        # Refresh button and filter box
+        toolbar_sizer = wx.BoxSizer(wx.HORIZONTAL)
         self.refresh_btn = wx.Button(self, label="Refresh")
         self.refresh_btn.Bind(wx.EVT_BUTTON, lambda e: self.refresh_history())
-        main_sizer.Add(self.refresh_btn, 0, wx.ALL, 5)
-        
-        # History list
-        self.history_list = wx.ListCtrl(
-            self,
-            style=wx.LC_REPORT | wx.LC_SINGLE_SEL
-        )
-        self.history_list.InsertColumn(0, "Name", width=100)
-        self.history_list.InsertColumn(1, "Date", width=150)
-        self.history_list.InsertColumn(2, "BMI", width=80)
-        self.history_list.InsertColumn(3, "Category", width=150)
-        self.history_list.InsertColumn(4, "Age", width=50)
-        self.history_list.InsertColumn(5, "Sex", width=70)
+        self.filter_input = wx.TextCtrl(self)
+        self.filter_input.SetHint("Filter by name or category")
+        self.filter_input.Bind(wx.EVT_TEXT, self.on_filter)
+        self.search_input = wx.SearchCtrl(self)
+        self.search_input.SetDescriptiveText("Search names (typos OK)")
+        self.search_input.ShowCancelButton(True)
+        self.search_input.Bind(wx.EVT_TEXT, self.on_name_search)
+        self.search_input.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, lambda e: self.search_input.SetValue(""))
+        self.count_label = wx.StaticText(self, label="")
+        toolbar_sizer.Add(self.refresh_btn, 0, wx.RIGHT, 10)
+        toolbar_sizer.Add(self.search_input, 1, wx.EXPAND | wx.RIGHT, 10)
+        toolbar_sizer.Add(self.filter_input, 1, wx.EXPAND | wx.RIGHT, 10)
+        toolbar_sizer.Add(self.count_label, 0, wx.ALIGN_CENTER_VERTICAL)
+        main_sizer.Add(toolbar_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        
+        # History list (virtual, so the full history stays fast)
+        self.history_list = HistoryListCtrl(self, self.source)
+        self.history_list.Bind(wx.EVT_LIST_COL_CLICK, self.on_column_click)
         
         main_sizer.Add(self.history_list, 1, wx.EXPAND | wx.ALL, 10)
         
         self.SetSizer(main_sizer)
     
     def refresh_history(self):
-        """Reload and display history from file."""
-        self.history_list.DeleteAllItems()
-        profiles = load_profiles()
-        
-        # Show last 20 entries (most recent first)
-        for p in reversed(profiles[-20:]):
-            index = self.history_list.InsertItem(self.history_list.GetItemCount(), p.get('name', 'User'))
-            date_str = p.get('saved_at', 'N/A')[:19]
-            self.history_list.SetItem(index, 1, date_str)
-            self.history_list.SetItem(index, 2, str(p.get('bmi', 'N/A')))
-            self.history_list.SetItem(index, 3, p.get('category', 'N/A'))
-            self.history_list.SetItem(index, 4, str(p.get('age', 'N/A')))
-            self.history_list.SetItem(index, 5, p.get('sex', 'N/A'))
+        """Reload history from file in the background and display it."""
+        self.main_frame.tasks.cancel("history_poll")
+        self.watcher = None
+        self.count_label.SetLabel("Loading history...")
+        self.main_frame.tasks.submit("history_reload", self._load_history,
+                                     on_success=self._show_history,
+                                     on_error=self._history_failed)
+    
+    @staticmethod
+    def _load_history():
+        # Worker thread. The watcher takes its snapshot before the read, so a save landing
+        # during the read is picked up by the next poll (records it already has are skipped)
+        watcher = ProfileWatcher()
+        records, name_index = HistoryDataSource.load()
+        watcher.known_count = len(records)
+        return records, name_index, watcher
+    
+    def _show_history(self, result):
+        if not self:
+            return
+        records, name_index, watcher = result
+        self.source.set_records(records, name_index)
+        self.watcher = watcher
+        self.update_list()
+        if self._poll_again:
+            self.poll_store()
+    
+    def _history_failed(self, error):
+        if self:
+            self.count_label.SetLabel(f"[!] Could not load history: {error}")
+    
+    def on_profile_saved(self, profile, path, replaced=False):
+        """Save event from data_utils; may be called from a worker thread."""
+        if path == PROFILE_FILE and replaced:
+            # A repeat folded into an earlier record: update that row in place
+            wx.CallAfter(self.replace_record, profile)
+        elif path == PROFILE_FILE:
+            # Polled rather than appended, so records stay in store order and a record
+            # the timer already picked up is not added twice
+            wx.CallAfter(self.poll_store)
+    
+    def replace_record(self, profile):
+        if self.source.replace(profile):
+            self.history_list.Refresh()
+    
+    def on_poll_timer(self, event):
+        self.poll_store()
+    
+    def poll_store(self):
+        """Add records saved since the last poll (by this or other processes) without reloading."""
+        tasks = self.main_frame.tasks
+        if self.watcher is None or tasks.is_pending("history_poll"):
+            # A reload or poll is already running; check again once it is done so a save
+            # that landed after its snapshot is not missed
+            self._poll_again = True
+            return
+        self._poll_again = False
+        watcher = self.watcher
+        tasks.submit("history_poll", watcher.poll,
+                     on_success=lambda new_records: self._apply_poll(watcher, new_records),
+                     on_error=lambda error: None)
+    
+    def _apply_poll(self, watcher, new_records):
+        if not self or watcher is not self.watcher:
+            # The window is gone, or a reload replaced the watcher and already has these rows
+            return
+        if new_records is None:
+            # The file was rewritten (fewer records than before), so start over
+            self.refresh_history()
+            return
+        for profile in new_records:
+            self.source.append(profile)
+        if new_records:
+            self.update_list()
+        if self._poll_again:
+            self.poll_store()
+    
+    def on_destroy(self, event):
+        if event.GetEventObject() is self:
+            self.poll_timer.Stop()
+            unsubscribe(self.on_profile_saved)
+        event.Skip()
+    
+    def update_list(self):
+        """Redraw the list from the data source without reloading the file."""
+        self.history_list.update()
+        self.count_label.SetLabel(f"{len(self.source)} of {len(self.source.records)} records")
+        self.Layout()
+    
+    def on_name_search(self, event):
+        """Search names through the index as the user types."""
+        self.source.set_name_query(self.search_input.GetValue())
+        self.update_list()
+    
+    def on_filter(self, event):
+        """Filter the loaded history as the user types."""
+        self.source.set_filter(self.filter_input.GetValue())
+        self.update_list()
+    
+    def on_column_click(self, event):
+        """Sort by the clicked column."""
+        self.source.sort_by(event.GetColumn())
+        self.update_list()
 
 
 class GraphsTab(wx.Panel):
@@ -664,7 +1085,17 @@ class GraphsTab(wx.Panel):
         self.distribution_btn.Bind(wx.EVT_BUTTON, self.on_bmi_distribution)
         btn_sizer.Add(self.distribution_btn, 0, wx.ALL | wx.ALIGN_CENTER, 10)
         
-        main_sizer.Add(btn_sizer, 1, wx.ALIGN_CENTER)
+        self.history_btn = wx.Button(self, label="Your BMI History", size=(250, 40))
+        self.history_btn.Bind(wx.EVT_BUTTON, self.on_bmi_history)
+        btn_sizer.Add(self.history_btn, 0, wx.ALL | wx.ALIGN_CENTER, 10)
+        
+        main_sizer.Add(btn_sizer, 0, wx.ALIGN_CENTER)
+        
+        # History chart, drawn inside the tab rather than in a separate window
+        self.history_figure = Figure(figsize=(7, 3), dpi=HISTORY_DPI)
+        self.history_canvas = FigureCanvasWxAgg(self, wx.ID_ANY, self.history_figure)
+        self.history_canvas.Hide()
+        main_sizer.Add(self.history_canvas, 1, wx.EXPAND | wx.ALL, 10)
         
         self.SetSizer(main_sizer)
         self.enable_controls(False)
@@ -675,6 +1106,7 @@ class GraphsTab(wx.Panel):
         self.weight_btn.Enable(enabled)
         self.position_btn.Enable(enabled)
         self.distribution_btn.Enable(enabled)
+        self.history_btn.Enable(enabled)
         if enabled:
             self.info_label.SetLabel("Click a button to view the graph.")
         else:
@@ -693,27 +1125,8 @@ class GraphsTab(wx.Panel):
         """Show weight vs healthy range graph."""
         if self.main_frame.current_result and self.main_frame.current_input:
             inp = self.main_frame.current_input
-            height = inp['height']
-            h_unit = inp['h_unit']
-            weight = inp['weight']
-            w_unit = inp['w_unit']
-            
-            # Convert to metric
-            if h_unit == 'm':
-                h_m = height
-            elif h_unit == 'cm':
-                h_m = cms_to_meters(height)
-            elif h_unit == 'in':
-                h_m = inches_to_meters(height)
-            elif h_unit == 'ft_in':
-                h_m = feet_inches_to_meters(height[0], height[1])
-            else:
-                h_m = height
-            
-            w_kg = weight if w_unit == 'kg' else lb_to_kg(weight)
-            
             try:
-                plot_weight_vs_ideal(w_kg, h_m)
+                plot_weight_vs_ideal(inp['weight_kg'], inp['height_m'])
             except Exception as e:
                 wx.MessageBox(f"Graph error: {e}", "Error", wx.OK | wx.ICON_ERROR)
     
@@ -734,14 +1147,44 @@ class GraphsTab(wx.Panel):
                 plot_bmi_distribution()
             except Exception as e:
                 wx.MessageBox(f"Graph error: {e}", "Error", wx.OK | wx.ICON_ERROR)
+    
+    def on_bmi_history(self, event):
+        """Load the current user's history in the worker pool and chart it in the tab."""
+        if self.main_frame.current_input:
+            name = self.main_frame.current_input['name']
+            # One point per horizontal pixel of the chart
+            width_px = max(self.history_canvas.GetSize().width, self.GetClientSize().width - 20, 200)
+            self.history_btn.Disable()
+            self.info_label.SetLabel(f"Loading BMI history for {name}...")
+            self.main_frame.tasks.submit(
+                "history_chart", load_bmi_history, name, None, width_px,
+                on_success=lambda result: self.show_history(name, result),
+                on_error=self.show_history_error
+            )
+    
+    def show_history(self, name, result):
+        points, total = result
+        build_bmi_history(self.history_figure, name, points, total)
+        self.history_canvas.Show()
+        self.history_canvas.draw()
+        self.Layout()
+        self.history_btn.Enable()
+        self.info_label.SetLabel(f"{total} saved result(s) for {name}.")
+    
+    def show_history_error(self, error):
+        self.history_btn.Enable()
+        self.info_label.SetLabel("Click a button to view the graph.")
+        wx.MessageBox(f"Graph error: {error}", "Error", wx.OK | wx.ICON_ERROR)
 
 
 def main():
     """Main entry point for the GUI application."""
+    recover()
     app = wx.App()
     frame = BMICalculatorApp()
     app.MainLoop()
 
 
 if __name__ == "__main__":
+    profiling.start_from_argv(description="BMI Health Analyzer (GUI)")
     main()
\ No newline at end of file
@@ -0,0 +1,377 @@
+'''
+This module serves BMI reports over HTTP/JSON for other internal apps.
+
+Endpoints:
+    POST /bmi          one report     {"weight": 70, "height": 1.75, "age": 25, "sex": "male",
+                                       "weight_unit": "kg", "height_unit": "m", "save": false}
+    POST /bmi/batch    many reports   {"items": [<same objects as /bmi>, ...]}
+    GET  /history      saved records  ?limit=20&name=Alice
+    POST /history      save a record  (a profile dict, as the CLI/GUI save it)
+    GET  /metrics      all process metrics (Prometheus text format, see metrics.py)
+    GET  /sync/changes records changed after a cursor   ?since=<time>&after=<id>&limit=500
+    POST /sync/apply   merge records from another store {"records": [...]}
+                       (both used by profile_sync.HTTPRemote; bodies may be gzip-encoded)
+
+Run:  python bmi_server.py --port 8080
+Uses HTTP/1.1 keep-alive and one thread per connection (ThreadingHTTPServer).
+'''
+
+
+import argparse
+import gzip
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import bmi_core
+import metrics
+import profile_sync
+from bmi_core import bmi_report
+from compaction import CompactionJob, RetentionPolicy
+from data_utils import append_profiles, load_profiles, recover, save_profile, subscribe, record_id, ProfileWatcher, PROFILE_FILE
+from units import VALID_WEIGHT_UNITS, VALID_HEIGHT_UNITS
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_BATCH_ITEMS = 10000
+MAX_SYNC_BATCH = 5000
+GZIP_MIN_BYTES = 1024  # smaller responses are sent uncompressed
+
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests handled, by endpoint and status.",
+                                ["endpoint", "status"])
+HTTP_SECONDS = metrics.histogram("http_request_seconds", "HTTP request handling time.", ["endpoint"])
+BATCH_ITEMS = metrics.histogram("http_batch_items", "Items per /bmi/batch request.",
+                                buckets=(1, 10, 100, 1000, 10000))
+
+
+class RequestError(Exception):
+    """A client error that becomes a 4xx JSON response."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def report_to_dict(report):
+    """Turn the bmi_report tuple into a JSON-friendly dict."""
+    bmi, category, description, bmr, healthy_range, water, gain, lose = report
+    return {
+        "bmi": bmi,
+        "category": category,
+        "description": description,
+        "bmr": bmr,
+        "healthy_weight_range": list(healthy_range),
+        "water_liters": water,
+        "kg_to_gain": gain,
+        "kg_to_lose": lose,
+    }
+
+
+def parse_item(item):
+    """
+    Validate one request object.
+    Returns (weight, height, age, sex, weight_unit, height_unit) with numbers as floats and
+    'ft_in' heights as (feet, inches) tuples.
+    """
+    if not isinstance(item, dict):
+        raise RequestError("Each request must be a JSON object.")
+    try:
+        weight, height = item["weight"], item["height"]
+        age, sex = int(item["age"]), str(item["sex"]).lower()
+    except (KeyError, TypeError, ValueError):
+        raise RequestError("weight, height, age and sex are required.")
+    weight_unit = item.get("weight_unit", "kg")
+    height_unit = item.get("height_unit", "m")
+    if weight_unit not in VALID_WEIGHT_UNITS:
+        raise RequestError("Unsupported weight unit.")
+    if height_unit not in VALID_HEIGHT_UNITS:
+        raise RequestError("Unsupported height unit.")
+    if sex not in ("male", "female"):
+        raise RequestError("sex must be 'male' or 'female'.")
+    if height_unit == "ft_in" and not (isinstance(height, (list, tuple)) and len(height) == 2):
+        raise RequestError("Height must be a tuple (feet, inches) for 'ft_in' unit.")
+    try:
+        weight = float(weight)
+        height = tuple(float(h) for h in height) if height_unit == "ft_in" else float(height)
+    except (TypeError, ValueError):
+        raise RequestError("weight and height must be numbers.")
+    return weight, height, age, sex, weight_unit, height_unit
+
+
+def score(item):
+    """Compute (and optionally save) one report from a request object."""
+    weight, height, age, sex, weight_unit, height_unit = parse_item(item)
+    report = bmi_report(weight, height, age, sex, weight_unit, height_unit)
+    if isinstance(report, str):
+        raise RequestError(report)
+
+    result = report_to_dict(report)
+    if item.get("save"):
+        save_profile(profile_for(item, (weight, height, age, sex, weight_unit, height_unit), result))
+    return result
+
+
+def profile_for(item, row, result):
+    """The profile record saved for a request with "save": true (row as from parse_item)."""
+    weight, height, age, sex, weight_unit, height_unit = row
+    return {
+        "name": item.get("name", "User"), "age": age, "sex": sex,
+        "weight": weight, "height": height,
+        "weight_unit": weight_unit, "height_unit": height_unit,
+        "bmi": result["bmi"], "category": result["category"], "bmr": result["bmr"],
+    }
+
+
+def score_batch(items):
+    """
+    score() for a list of request objects; a failing item gets {"error": ...} in its place.
+    Valid items are converted to kg / m as whole columns (bmi_core.bmi_reports), and the
+    ones with "save": true are written together (data_utils.append_profiles).
+    """
+    results = [None] * len(items)
+    positions, rows = [], []
+    for position, item in enumerate(items):
+        try:
+            rows.append(parse_item(item))
+            positions.append(position)
+        except RequestError as e:
+            results[position] = {"error": str(e)}
+    if not rows:
+        return results
+
+    weights, heights, ages, sexes, weight_units, height_units = zip(*rows)
+    reports = bmi_core.bmi_reports(weights, heights, ages, sexes, weight_units, height_units)
+    to_save = []
+    for position, row, report in zip(positions, rows, reports):
+        if isinstance(report, str):
+            results[position] = {"error": report}
+            continue
+        results[position] = result = report_to_dict(report)
+        if items[position].get("save"):
+            to_save.append(profile_for(items[position], row, result))
+    if to_save:
+        # One store write for the whole batch instead of one save_profile per item
+        append_profiles(to_save)
+    return results
+
+
+class HistoryCache:
+    """Keeps the saved history in memory and only re-reads it when the file changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = load_profiles()
+        self.watcher = ProfileWatcher(known_count=len(self.records))
+        subscribe(self._on_saved)
+
+    def _on_saved(self, profile, path, replaced):
+        # Appends are picked up by the watcher; a folded repeat replaces its record in place
+        if replaced and path == PROFILE_FILE:
+            rid = record_id(profile)
+            with self._lock:
+                for index in range(len(self.records) - 1, -1, -1):
+                    if record_id(self.records[index]) == rid:
+                        self.records[index] = profile
+                        break
+
+    def recent(self, limit, name=None):
+        with self._lock:
+            new_records = self.watcher.poll()
+            if new_records is None:
+                self.records = load_profiles()
+                self.watcher = ProfileWatcher(known_count=len(self.records))
+            else:
+                self.records.extend(new_records)
+            records = self.records
+            if name:
+                records = [p for p in records if p.get("name") == name]
+            return records[-limit:][::-1] if limit > 0 else []
+
+
+class BMIRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the scoring, history and metrics handlers."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response stalls ~40 ms on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+    server_version = "BMIServer/1.0"
+    verbose = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/history":
+            self._handle("/history", lambda: self._get_history(parse_qs(url.query)))
+        elif url.path == "/sync/changes":
+            self._handle("/sync/changes", lambda: self._get_changes(parse_qs(url.query)))
+        elif url.path == "/metrics":
+            self._send(200, metrics.render_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/bmi":
+            self._handle(path, lambda: score(self._read_json()))
+        elif path == "/bmi/batch":
+            self._handle(path, self._post_batch)
+        elif path == "/history":
+            self._handle(path, self._post_history)
+        elif path == "/sync/apply":
+            self._handle(path, self._post_sync_apply)
+        else:
+            try:
+                self._read_body()  # drain so the connection can be reused
+            except RequestError:
+                self.close_connection = True
+            self._send_json(404, {"error": "Not found."})
+
+    def _handle(self, endpoint, action):
+        start = time.perf_counter()
+        status = 200
+        try:
+            self._send_json(200, action())
+        except RequestError as e:
+            status = e.status
+            self._send_json(status, {"error": str(e)})
+        except Exception as e:
+            status = 500
+            self._send_json(status, {"error": f"Internal error: {e}"})
+        HTTP_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(endpoint=endpoint, status=status).inc()
+
+    def _post_batch(self):
+        body = self._read_json()
+        items = body.get("items") if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise RequestError('Expected {"items": [...]} or a JSON array.')
+        if len(items) > MAX_BATCH_ITEMS:
+            raise RequestError(f"At most {MAX_BATCH_ITEMS} items per batch.", 413)
+        BATCH_ITEMS.observe(len(items))
+        return {"results": score_batch(items)}
+
+    def _get_history(self, query):
+        try:
+            limit = int(query.get("limit", ["20"])[0])
+        except ValueError:
+            raise RequestError("limit must be an integer.")
+        name = query.get("name", [None])[0]
+        return {"profiles": self.server.history.recent(limit, name)}
+
+    def _post_history(self):
+        profile = self._read_json()
+        if not isinstance(profile, dict) or "name" not in profile:
+            raise RequestError("Expected a profile object with at least a name.")
+        return save_profile(profile)
+
+    def _get_changes(self, query):
+        try:
+            limit = min(int(query.get("limit", [str(profile_sync.DEFAULT_BATCH_SIZE)])[0]), MAX_SYNC_BATCH)
+        except ValueError:
+            raise RequestError("limit must be an integer.")
+        if limit <= 0:
+            raise RequestError("limit must be positive.")
+        cursor = None
+        if "since" in query:
+            cursor = [query["since"][0], query.get("after", [""])[0]]
+        records, next_cursor, more = profile_sync.changes_since(cursor, limit)
+        return {"records": records, "next": next_cursor, "more": more}
+
+    def _post_sync_apply(self):
+        body = self._read_json()
+        records = body.get("records") if isinstance(body, dict) else None
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise RequestError('Expected {"records": [<profile objects>]}.')
+        if len(records) > MAX_SYNC_BATCH:
+            raise RequestError(f"At most {MAX_SYNC_BATCH} records per batch.", 413)
+        return profile_sync.merge_records(records)
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            # The body is left unread, and would otherwise be parsed as the next request
+            self.close_connection = True
+            if length < 0:
+                raise RequestError("Content-Length must be a non-negative integer.")
+            raise RequestError("Request body too large.", 413)
+        body = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding") == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(body, MAX_BODY_BYTES + 1)
+            except zlib.error:
+                raise RequestError("Body is not valid gzip.")
+            if len(body) > MAX_BODY_BYTES:
+                raise RequestError("Request body too large.", 413)
+        return body
+
+    def _read_json(self):
+        try:
+            return json.loads(self._read_body())
+        except json.JSONDecodeError:
+            raise RequestError("Body must be valid JSON.")
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, separators=(",", ":")).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type):
+        compress = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request logging to stderr is the main cost at high request rates
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(host="127.0.0.1", port=8080):
+    """Build (but do not start) the HTTP server."""
+    # Per-call [LOG] prints would dominate the response time
+    bmi_core.LOG_CALCULATIONS = False
+    server = ThreadingHTTPServer((host, port), BMIRequestHandler)
+    server.daemon_threads = True
+    server.history = HistoryCache()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve BMI reports over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--compact-every", type=float, metavar="HOURS",
+                        help="roll up old history records every HOURS (see compaction.py)")
+    parser.add_argument("--raw-days", type=int, default=90, help="days of history kept unrolled when compacting")
+    args = parser.parse_args()
+
+    BMIRequestHandler.verbose = args.verbose
+    recover()
+    server = create_server(args.host, args.port)
+    if args.compact_every:
+        CompactionJob(policy=RetentionPolicy(args.raw_days), interval_seconds=args.compact_every * 3600).start()
+    print(f"BMI server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,14 @@ from google import genai
 from google.genai import types
 import json
 import os
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
 
+import metrics
+from advice_store import get_advice_store, bucket_key
+
 # 1. Load the .env file
 load_dotenv()
 
@@ -19,9 +25,169 @@ if API_KEY:
         client = None
 
 
+AI_REQUESTS = metrics.counter("ai_requests_total", "Model calls attempted, by outcome.", ["model", "outcome"])
+AI_LATENCY = metrics.histogram("ai_generate_seconds", "generate_content latency, successful or not.", ["model"])
+AI_FALLBACKS = metrics.counter("ai_fallbacks_total", "Times a caller fell back to static content, by reason.",
+                               ["function", "reason"])
+BREAKER_STATE = metrics.gauge("ai_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.")
+BREAKER_TRANSITIONS = metrics.counter("ai_breaker_transitions_total", "Circuit breaker state changes.", ["state"])
+_BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class AIUnavailableError(RuntimeError):
+    """Raised when an AI call is skipped because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks recent Gemini failures and latency so an outage does not cost every user a full timeout.
+
+    States:
+        'closed'    - calls go through normally
+        'open'      - calls are rejected immediately until the cooldown has passed
+        'half_open' - after the cooldown, a single trial call is let through;
+                      success closes the breaker, failure opens it again
+    """
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=30.0, latency_window=50,
+                 min_timeout=5.0, max_timeout=30.0, timeout_factor=1.5):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.latencies = deque(maxlen=latency_window)
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """True while calls are being rejected (open and still cooling down)."""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.cooldown_seconds
+
+    def allow_request(self):
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                    return False
+                self._set_state("half_open")
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                # Only one trial call at a time while half-open
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency_seconds):
+        """Record a successful call and its latency, closing the breaker."""
+        with self._lock:
+            self.latencies.append(latency_seconds)
+            self.consecutive_failures = 0
+            self._set_state("closed")
+            self._trial_in_flight = False
+
+    def record_failure(self, trip=False):
+        """
+        Record a failed call.
+        trip=True opens the breaker immediately (e.g. invalid API key).
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if trip or self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self._set_state("open")
+                self.opened_at = time.monotonic()
+
+    def _set_state(self, state):
+        # Caller holds self._lock
+        if state != self.state:
+            self.state = state
+            BREAKER_STATE.set(_BREAKER_STATE_VALUES[state])
+            BREAKER_TRANSITIONS.labels(state=state).inc()
+
+    def p95_latency(self):
+        """Return the 95th percentile of recent call latencies, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def timeout_seconds(self):
+        """Per-call deadline adapted to observed p95 latency, clamped to [min_timeout, max_timeout]."""
+        p95 = self.p95_latency()
+        if p95 is None:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, p95 * self.timeout_factor))
+
+
+breaker = CircuitBreaker()
+
+
 def is_ai_available():
-    """Check if AI features are available."""
-    return client is not None and API_KEY is not None
+    """Check if AI features are available (key configured and circuit breaker not open)."""
+    return client is not None and API_KEY is not None and not breaker.is_open()
+
+
+def _unavailable_message():
+    """Return why AI is unavailable, or None if it can be used."""
+    if client is None or API_KEY is None:
+        return "API Key not found. Please set GEMINI_API_KEY in your .env file."
+    if breaker.is_open():
+        return "AI is temporarily unavailable after repeated failures. Please try again later."
+    return None
+
+
+def _fallback(function, reason):
+    """Count a fallback to static content."""
+    AI_FALLBACKS.labels(function=function, reason=reason).inc()
+
+
+def _unavailable_reason():
+    return "no_api_key" if client is None or API_KEY is None else "breaker_open"
+
+
+def _is_invalid_key_error(error):
+    error_str = str(error)
+    return "API_KEY_INVALID" in error_str or "API key not valid" in error_str
+
+
+def _generate(model, system_instruction, contents):
+    """
+    Call the model through the circuit breaker with an adaptive deadline.
+    Raises AIUnavailableError without touching the network while the breaker is open.
+    """
+    if not breaker.allow_request():
+        AI_REQUESTS.labels(model=model, outcome="rejected").inc()
+        raise AIUnavailableError("AI is temporarily unavailable after repeated failures. Please try again later.")
+
+    start = time.monotonic()
+    latency = AI_LATENCY.labels(model=model)
+    try:
+        response = client.models.generate_content(
+            model=model,
+            config=types.GenerateContentConfig(
+                system_instruction=system_instruction,
+                # HttpOptions.timeout is in milliseconds
+                http_options=types.HttpOptions(timeout=int(breaker.timeout_seconds() * 1000)),
+            ),
+            contents=contents
+        )
+    except Exception as e:
+        latency.observe(time.monotonic() - start)
+        AI_REQUESTS.labels(model=model, outcome="error").inc()
+        breaker.record_failure(trip=_is_invalid_key_error(e))
+        raise
+    elapsed = time.monotonic() - start
+    latency.observe(elapsed)
+    AI_REQUESTS.labels(model=model, outcome="success").inc()
+    breaker.record_success(elapsed)
+    return response
 
 
 PREMADE_FAQS = [
@@ -197,9 +363,28 @@ Aim for reliability and clarity.
 """
 
 
-def generate_bmi_suggestions(bmi_value, category, age=None, gender=None, model="gemini-2.5-flash-lite"):
-    if not is_ai_available():
-        return {"error": "API Key not found. Please set GEMINI_API_KEY in your .env file."}    
+def cached_bmi_suggestions(bmi_value, category, age=None, gender=None):
+    """Pre-generated suggestions for this request's bucket (see advice_store), or None."""
+    return get_advice_store().get(bucket_key(bmi_value, category, age, gender))
+
+
+def generate_bmi_suggestions(bmi_value, category, age=None, gender=None, model="gemini-2.5-flash-lite",
+                             use_store=True):
+    """
+    Suggestions from the advice store when its bucket has been generated (no API call),
+    otherwise from the model; a successful live answer is stored for the bucket.
+    use_store=False always calls the model and stores nothing (used by ai_warmup).
+    """
+    if use_store:
+        cached = cached_bmi_suggestions(bmi_value, category, age, gender)
+        if cached is not None:
+            return cached
+
+    unavailable = _unavailable_message()
+    if unavailable:
+        _fallback("suggestions", _unavailable_reason())
+        return {"error": unavailable}
+
     # Build the input payload that the model will read
     payload = {
         "bmi_value": bmi_value,
@@ -213,13 +398,7 @@ def generate_bmi_suggestions(bmi_value, category, age=None, gender=None, model="
 
     try:
         # call the model
-        response = client.models.generate_content(
-            model=f"models/{model}",
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_INSTRUCTION,
-            ),
-            contents=contents_str
-        )
+        response = _generate(f"models/{model}", SYSTEM_INSTRUCTION, contents_str)
 
         text = response.text.strip()
 
@@ -236,21 +415,33 @@ def generate_bmi_suggestions(bmi_value, category, age=None, gender=None, model="
             try:
                 result = json.loads(cleaned)
             except Exception as e:
+                _fallback("suggestions", "bad_response")
                 return {"error": f"AI processing failed: {str(e)}"}
 
         # Basic validation of required structure
         if "error" in result:
+            _fallback("suggestions", "model_error")
             return result
         expected_keys = {"summary", "recommendations", "caution"}
         if not expected_keys.issubset(result.keys()):
+            _fallback("suggestions", "bad_response")
             return {"error": "AI returned incomplete response."}
 
+        if use_store:
+            try:
+                get_advice_store().put(bucket_key(bmi_value, category, age, gender), result, model)
+            except OSError as e:
+                print(f"[!] Could not save AI suggestions to the advice store: {e}")
         return result
     
+    except AIUnavailableError as e:
+        _fallback("suggestions", "breaker_open")
+        return {"error": str(e)}
     except Exception as e:
-        error_str = str(e)
-        if "API_KEY_INVALID" in error_str or "API key not valid" in error_str:
+        if _is_invalid_key_error(e):
+            _fallback("suggestions", "invalid_api_key")
             return {"error": "Invalid API Key. Please check your GEMINI_API_KEY in the .env file."}
+        _fallback("suggestions", "request_failed")
         return {"error": "AI request failed. Please try again later."}
 
 
@@ -297,30 +488,38 @@ Rules:
 
 
 def generate_bmi_faq_answer(question, model="models/gemini-2.5-flash-lite"):
-    if not is_ai_available():
+    if client is None or API_KEY is None:
         # Return info about premade FAQs
+        _fallback("faq", "no_api_key")
         return {
             "ai_available": False,
             "message": "AI features are unavailable. Your API key may be missing, invalid, or not set.\nTo enable AI-powered answers, please add a valid GEMINI_API_KEY to your .env file.\n\nFor now, please choose from the available questions below:",
             "faq_list": get_premade_faq_list()
         }
+    if breaker.is_open():
+        # Serve premade FAQs immediately instead of waiting on a failing API
+        _fallback("faq", "breaker_open")
+        return {
+            "ai_available": False,
+            "message": "AI features are temporarily unavailable after repeated failures.\n\nFor now, please choose from the available questions below:",
+            "faq_list": get_premade_faq_list()
+        }
     
     try:
-        response = client.models.generate_content(
-            model=model,
-            config=types.GenerateContentConfig(
-                system_instruction=FAQ_SYSTEM_INSTRUCTION,
-            ),
-            contents=question
-        )
+        response = _generate(model, FAQ_SYSTEM_INSTRUCTION, question)
         return {"ai_available": True, "answer": response.text.strip()}
     except Exception as e:
         error_str = str(e)
         # On any API error (invalid key, network, etc.), fall back to premade FAQs
-        if "API_KEY_INVALID" in error_str or "API key not valid" in error_str:
+        if _is_invalid_key_error(e):
             error_msg = "Invalid API Key. Please check your GEMINI_API_KEY in the .env file."
+            _fallback("faq", "invalid_api_key")
+        elif isinstance(e, AIUnavailableError):
+            error_msg = error_str
+            _fallback("faq", "breaker_open")
         else:
             error_msg = f"AI request failed: {error_str}"
+            _fallback("faq", "request_failed")
         
         return {
             "ai_available": False,
@@ -330,16 +529,21 @@ def generate_bmi_faq_answer(question, model="models/gemini-2.5-flash-lite"):
 
 
 def generate_health_fact_of_the_day(model="models/gemini-2.5-flash-lite"):
-    if not is_ai_available():
-        raise ValueError("API Key not found. Please set GEMINI_API_KEY in your .env file.")
+    unavailable = _unavailable_message()
+    if unavailable:
+        _fallback("health_fact", _unavailable_reason())
+        raise ValueError(unavailable)
     prompt = "Provide a concise and interesting and useful health fact related to Diet, Health, fitness, weight management, or general wellness, use a bit of humour(not too much, just a bit of pun/joke/troll)."
-    response = client.models.generate_content(
-        model=model,
-        config=types.GenerateContentConfig(
-            system_instruction="You are a helpful assistant that provides concise health facts. Use a bit of humour(not too much, just a bit of pun/joke/troll). Not too long replies. Let it be 1 to 2 sentences at max(or maybe 3)",
-        ),
-        contents=prompt
-    )
+    try:
+        response = _generate(
+            model,
+            "You are a helpful assistant that provides concise health facts. Use a bit of humour(not too much, just a bit of pun/joke/troll). Not too long replies. Let it be 1 to 2 sentences at max(or maybe 3)",
+            prompt
+        )
+    except Exception as e:
+        # Callers show a static fact instead
+        _fallback("health_fact", "breaker_open" if isinstance(e, AIUnavailableError) else "request_failed")
+        raise
     return response.text.strip()
 
 
@@ -0,0 +1,267 @@
+'''
+This module applies retention policies to the profile store.
+
+Recent records are kept as they are; older ones are replaced by one roll-up record per
+user and period (e.g. month) holding the count, mean/min/max BMI and mean weight/height.
+Roll-ups keep the fields the history views show (name, saved_at, bmi, category, age, sex)
+and are marked with "record_type": "rollup".
+
+Compaction streams the store twice (aggregate, then write) and swaps the result in
+atomically via data_utils.write_profiles while holding data_utils.store_lock, so saves in
+this process wait for it and readers keep reading their snapshot.
+
+Run once:        python compaction.py --raw-days 90
+In background:   CompactionJob(interval_seconds=24 * 3600).start()
+'''
+
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+
+import metrics
+from bmi_classifier import get_classifier
+from data_utils import PROFILE_FILE, SCHEMA_VERSION, iter_profiles, write_profiles, store_lock
+from profile_sync import SyncState, change_key
+
+ROLLUP = "rollup"
+PERIOD_LENGTHS = {"monthly": 7, "yearly": 4}  # prefix of saved_at that names the period
+
+COMPACTION_RUNS = metrics.counter("compaction_runs_total", "Compaction runs, by outcome.", ["outcome"])
+COMPACTION_SECONDS = metrics.histogram("compaction_seconds", "Time taken by a compaction run.")
+COMPACTED_RECORDS = metrics.counter("compaction_records_rolled_up_total", "Raw records replaced by roll-ups.")
+
+
+class RetentionPolicy:
+    """
+    raw_days:    keep individual records saved within this many days
+    rollup:      'monthly' or 'yearly' roll-ups for older records
+    rollup_days: drop roll-ups older than this many days (None keeps them forever)
+    """
+
+    def __init__(self, raw_days=90, rollup="monthly", rollup_days=None):
+        if rollup not in PERIOD_LENGTHS:
+            raise ValueError(f"rollup must be one of: {', '.join(PERIOD_LENGTHS)}")
+        if raw_days < 0:
+            raise ValueError("raw_days must not be negative.")
+        self.raw_days = raw_days
+        self.rollup = rollup
+        self.rollup_days = rollup_days
+
+
+class _Aggregate:
+    """Running totals for one (user, period) roll-up."""
+
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+        self.count = 0
+        self.bmi_sum = 0.0
+        self.bmi_count = 0
+        self.bmi_min = None
+        self.bmi_max = None
+        self.weight_sum = self.weight_count = 0
+        self.height_sum = self.height_count = 0
+        self.first_saved_at = None
+        self.last_saved_at = ""
+        self.age = None
+        self.sex = None
+
+    def add(self, record):
+        """Fold in a raw record or an existing roll-up."""
+        if record.get("record_type") == ROLLUP:
+            count = record.get("count", 1)
+        else:
+            count = record.get("repeat_count", 1)  # folded repeats count as saves
+        self.count += count
+        bmi = record.get("bmi")
+        if isinstance(bmi, (int, float)):
+            self.bmi_sum += bmi * count
+            self.bmi_count += count
+            low = record.get("bmi_min", bmi)
+            high = record.get("bmi_max", bmi)
+            self.bmi_min = low if self.bmi_min is None else min(self.bmi_min, low)
+            self.bmi_max = high if self.bmi_max is None else max(self.bmi_max, high)
+        if isinstance(record.get("weight_kg"), (int, float)):
+            self.weight_sum += record["weight_kg"] * count
+            self.weight_count += count
+        if isinstance(record.get("height_m"), (int, float)):
+            self.height_sum += record["height_m"] * count
+            self.height_count += count
+        first = record.get("first_saved_at", record.get("saved_at"))
+        if first and (self.first_saved_at is None or first < self.first_saved_at):
+            self.first_saved_at = first
+        saved_at = record.get("last_saved_at", record.get("saved_at", ""))
+        if saved_at >= self.last_saved_at:
+            # Latest age/sex win
+            self.last_saved_at = saved_at
+            self.age = record.get("age", self.age)
+            self.sex = record.get("sex", self.sex)
+
+    def to_record(self):
+        record = {
+            "record_type": ROLLUP,
+            "period": self.period,
+            "name": self.name,
+            "age": self.age,
+            "sex": self.sex,
+            "count": self.count,
+        }
+        if self.bmi_count:
+            bmi = round(self.bmi_sum / self.bmi_count, 2)
+            record.update({
+                "bmi": bmi,
+                "bmi_min": self.bmi_min,
+                "bmi_max": self.bmi_max,
+                "category": get_classifier("who").classify(bmi)[0],
+            })
+        if self.weight_count:
+            record["weight_kg"] = round(self.weight_sum / self.weight_count, 4)
+        if self.height_count:
+            record["height_m"] = round(self.height_sum / self.height_count, 4)
+        record["first_saved_at"] = self.first_saved_at
+        record["saved_at"] = self.last_saved_at
+        record["schema_version"] = SCHEMA_VERSION
+        return record
+
+
+def _pushed_until(path):
+    """
+    The oldest push cursor in the store's sync state (profile_sync.SyncState), or None
+    if the store has never been pushed anywhere.
+    """
+    cursors = [tuple(state["push"]) for state in SyncState(path).data.values() if state.get("push")]
+    return min(cursors) if cursors else None
+
+
+def compact(path=None, policy=None, now=None):
+    """
+    Roll up records older than the policy's raw window and rewrite the store.
+    Old records that have not been pushed to every sync remote yet (their change key is
+    past the oldest push cursor) are kept as they are until a later run, because roll-ups
+    are never synced.
+    Returns a dict of counts: kept, rolled_up, rollups, dropped, unpushed.
+    """
+    path = path or PROFILE_FILE
+    policy = policy or RetentionPolicy()
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=policy.raw_days)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    expiry = None
+    if policy.rollup_days is not None:
+        expiry = (now - timedelta(days=policy.rollup_days)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    period_length = PERIOD_LENGTHS[policy.rollup]
+    stats = {"kept": 0, "rolled_up": 0, "rollups": 0, "dropped": 0, "unpushed": 0}
+
+    def is_expired(record):
+        # Records without a timestamp are kept as they are
+        saved_at = record.get("saved_at")
+        return bool(saved_at) and saved_at < cutoff
+
+    def is_unpushed(record):
+        return (pushed_until is not None and record.get("record_type") != ROLLUP
+                and change_key(record) > pushed_until)
+
+    def is_old(record):
+        return is_expired(record) and not is_unpushed(record)
+
+    start = time.perf_counter()
+    with store_lock(path):
+        # Push cursors only move forward, so a push finishing after this read just means
+        # some pushed records wait for the next run
+        pushed_until = _pushed_until(path)
+        # Pass 1: aggregate everything outside the raw window
+        aggregates = {}
+        for record in iter_profiles(path):
+            if not is_old(record):
+                if is_expired(record):
+                    stats["unpushed"] += 1
+                continue
+            period = record.get("period") or record["saved_at"][:period_length]
+            key = (record.get("name", "User"), period[:period_length])
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregate = aggregates[key] = _Aggregate(*key)
+            aggregate.add(record)
+            if record.get("record_type") != ROLLUP:
+                stats["rolled_up"] += 1
+
+        rollups = sorted((a.to_record() for a in aggregates.values()), key=lambda r: r["saved_at"])
+        if expiry is not None:
+            kept_rollups = [r for r in rollups if r["saved_at"] >= expiry]
+            stats["dropped"] = len(rollups) - len(kept_rollups)
+            rollups = kept_rollups
+        stats["rollups"] = len(rollups)
+
+        # Pass 2: roll-ups first (they are older), then the raw window in stored order
+        def compacted():
+            yield from rollups
+            for record in iter_profiles(path):
+                if not is_old(record):
+                    stats["kept"] += 1
+                    yield record
+
+        write_profiles(compacted(), path)
+
+    COMPACTION_SECONDS.observe(time.perf_counter() - start)
+    COMPACTED_RECORDS.inc(stats["rolled_up"])
+    return stats
+
+
+class CompactionJob:
+    """Runs compact() on a background thread every interval_seconds."""
+
+    def __init__(self, path=None, policy=None, interval_seconds=24 * 3600):
+        self.path = path
+        self.policy = policy or RetentionPolicy()
+        self.interval_seconds = interval_seconds
+        self.last_stats = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="profile-compaction", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        try:
+            self.last_stats = compact(self.path, self.policy)
+        except Exception as e:
+            COMPACTION_RUNS.labels(outcome="error").inc()
+            print(f"[!] Profile compaction failed: {e}")
+            return None
+        COMPACTION_RUNS.labels(outcome="ok").inc()
+        return self.last_stats
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll up old profile records.")
+    parser.add_argument("--store", help="profile store (default: data_utils.PROFILE_FILE)")
+    parser.add_argument("--raw-days", type=int, default=90, help="keep individual records this many days")
+    parser.add_argument("--rollup", choices=sorted(PERIOD_LENGTHS), default="monthly")
+    parser.add_argument("--rollup-days", type=int, help="drop roll-ups older than this many days")
+    args = parser.parse_args(argv)
+
+    stats = compact(args.store, RetentionPolicy(args.raw_days, args.rollup, args.rollup_days))
+    print(f"Kept {stats['kept']} record(s); rolled {stats['rolled_up']} into {stats['rollups']} roll-up(s); "
+          f"dropped {stats['dropped']} expired roll-up(s).")
+    if stats["unpushed"]:
+        print(f"[!] {stats['unpushed']} old record(s) not pushed to every sync remote yet were left as they are.")
+
+
+# Example usage:
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,869 @@
 '''
 This module provides utility functions for loading and saving user profile data.
+
+Profiles are stored with schema version 2: besides the raw "weight"/"height" as typed,
+each record keeps canonical "weight_kg"/"height_m" and the original "weight_unit"/"height_unit".
+Older records can be upgraded in place with migrate_profiles().
+
+Saving the same person with the same inputs again within DEDUPE_WINDOW_SECONDS does not
+add a record: the earlier one gets "repeat_count" and "last_saved_at" instead.
+
+Saves go through a write-ahead log (see wal.py) and every rewrite of the JSON file is
+atomic, so a crash mid-save loses at most that save; recover() replays a save that was
+logged but not yet applied, and runs automatically before the next save.
+
+A path ending in ".blk" selects the compressed block store (see block_store.py)
+instead of the JSON array file; every function here works with either.
+
+For fleets, a sharded layout keeps one store per site and month under a root directory:
+    <root>/<site>/<YYYY-MM>.json   (or .blk)
+shard_path() routes a write to its shard, iter_shards() picks only the shards a query
+can touch, and map_shards() runs a function over shards in parallel processes.
 '''
 
 
+import hashlib
 import json
 import os
+import re
+import textwrap
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import metrics
+from block_store import is_block_store, get_block_store
+from units import to_si, UnitError
+from wal import WriteAheadLog, wal_path
+
 PROFILE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "user_profiles.json")
 
+SHARD_ROOT = os.environ.get("BMI_SHARD_ROOT") or os.path.join(os.path.dirname(PROFILE_FILE), "shards")
+SITE_ID = os.environ.get("BMI_SITE_ID", "default")
+SHARD_SUFFIXES = (".json", ".blk")
+_SHARD_NAME = re.compile(r"^(\d{4}-\d{2})(\.json|\.blk)$")
+
+SCHEMA_VERSION = 2
+
+# Repeated saves of identical inputs within this many seconds are folded together (0 disables)
+DEDUPE_WINDOW_SECONDS = 10 * 60
+
+# Candidate units tried when inferring units for legacy records, most common first
+_LEGACY_UNIT_CANDIDATES = [
+    ('kg', 'm'), ('kg', 'cm'), ('kg', 'in'),
+    ('lb', 'm'), ('lb', 'cm'), ('lb', 'in'),
+]
+_SKIP_SEPARATORS = re.compile(r'[\s,]*')
+
+LOAD_SECONDS = metrics.histogram("profile_load_seconds", "Time to load the whole profile file.")
+SAVE_SECONDS = metrics.histogram("profile_save_seconds", "Time to save one profile (read + rewrite).")
+STORED_PROFILES = metrics.gauge("profile_records", "Records in the profile file after the last load or save.")
+LISTENER_ERRORS = metrics.counter("profile_listener_errors_total", "Save listeners that raised.")
+RECOVERED = metrics.counter("profile_wal_records_replayed_total", "Logged saves replayed by recover().")
+DEDUPED = metrics.counter("profile_saves_deduplicated_total",
+                          "Records folded into an existing one instead of stored again.", ["source"])
+_DEDUPED_SAVE = DEDUPED.labels(source="save")
+_DEDUPED_IMPORT = DEDUPED.labels(source="import")
 
-def load_profiles():
+# Callbacks notified after every save_profile in this process
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+# Recent saves in this process per store: (store signature before, after, record, records
+# in the store after, whether it replaced a record), so a ProfileWatcher can take them
+# without reading the store
+_WRITE_JOURNAL_SIZE = 64
+_write_journals = {}
+_write_journals_lock = threading.Lock()
+
+# One lock per store path, serializing writers (saves, imports, rewrites) in this process
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def store_lock(path=None):
+    """
+    Return the lock that serializes writes to a store within this process.
+    Readers never need it: rewrites swap in a new file, so open readers keep their snapshot.
+    """
+    key = os.path.abspath(path or PROFILE_FILE)
+    with _store_locks_lock:
+        lock = _store_locks.get(key)
+        if lock is None:
+            lock = _store_locks[key] = threading.RLock()
+        return lock
+
+
+def load_profiles(path=None):
     """Load all saved user profiles."""
-    if not os.path.exists(PROFILE_FILE):
+    path = path or PROFILE_FILE
+    if not os.path.exists(path):
+        return []
+    with LOAD_SECONDS.time():
+        if is_block_store(path):
+            profiles = list(get_block_store(path).iter_records())
+        else:
+            with open(path, "r") as f:
+                profiles = json.load(f)
+    STORED_PROFILES.set(len(profiles))
+    return profiles
+
+
+def iter_profiles(path=None, chunk_size=1 << 16):
+    """
+    Yield saved profiles one at a time without loading the whole file.
+    Reads the JSON array in chunks of chunk_size characters.
+    """
+    path = path or PROFILE_FILE
+    if not os.path.exists(path):
+        return
+    if is_block_store(path):
+        yield from get_block_store(path).iter_records()
+        return
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer:
+            return
+        if buffer[0] != "[":
+            raise ValueError(f"{path} does not contain a JSON array.")
+        pos = 1
+        while True:
+            pos = _SKIP_SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError(f"{path} ends in the middle of a record.")
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield record
+
+
+def write_profiles(profiles, path=None):
+    """
+    Write an iterable of profiles as a JSON array, streaming record by record.
+    The file is written to a temporary path first and then swapped in atomically.
+    """
+    path = path or PROFILE_FILE
+    with store_lock(path):
+        if is_block_store(path):
+            return get_block_store(path).rewrite(profiles)
+        tmp_path = f"{path}.tmp"
+        count = 0
+        with open(tmp_path, "w") as f:
+            f.write("[")
+            for profile in profiles:
+                f.write(",\n" if count else "\n")
+                f.write(textwrap.indent(json.dumps(profile, indent=4), "    "))
+                count += 1
+            f.write("\n]" if count else "]")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return count
+
+
+def _replace_json(profiles, path):
+    """Write a list of profiles to a temporary file and swap it in atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profiles, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def count_profiles(path=None):
+    """Return the number of stored profiles (read from the block index for block stores)."""
+    path = path or PROFILE_FILE
+    if is_block_store(path):
+        return len(get_block_store(path)) if os.path.exists(path) else 0
+    return sum(1 for _ in iter_profiles(path))
+
+
+def recent_profiles(n, path=None):
+    """Return the newest n profiles, oldest first."""
+    path = path or PROFILE_FILE
+    if n <= 0 or not os.path.exists(path):
         return []
-    with open(PROFILE_FILE, "r") as f:
-        return json.load(f)
+    if is_block_store(path):
+        return get_block_store(path).last(n)
+    return list(deque(iter_profiles(path), maxlen=n))
+
+
+def profiles_between(start=None, end=None, path=None):
+    """
+    Yield profiles saved between start and end (datetimes or ISO strings; None = open-ended).
+    Block stores skip the blocks outside the range without decompressing them.
+    """
+    path = path or PROFILE_FILE
+    if not os.path.exists(path):
+        return
+    if is_block_store(path):
+        yield from get_block_store(path).between(start, end)
+        return
+    start_text = _saved_at_text(start)
+    end_text = _saved_at_text(end)
+    for profile in iter_profiles(path):
+        saved_at = profile.get("saved_at", "")
+        if (start_text is None or saved_at >= start_text) and (end_text is None or saved_at <= end_text):
+            yield profile
+
 
+def _saved_at_text(value):
+    # saved_at strings sort chronologically, so ranges can be compared as text
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
 
-def save_profile(profile):
+
+def infer_units(profile):
+    """
+    Guess (weight_unit, height_unit) for a legacy record without unit metadata.
+    Picks the units whose BMI matches the stored "bmi"; falls back to the height's magnitude.
+    Numbers stored as strings (e.g. "70") are accepted; raises ValueError if weight or
+    height is not a number at all.
+    """
+    weight, height = _as_number(profile["weight"]), profile["height"]
+    if isinstance(height, (list, tuple)):
+        height = [_as_number(part) for part in height]
+    else:
+        height = _as_number(height)
+    if isinstance(height, list):
+        candidates = [('kg', 'ft_in'), ('lb', 'ft_in')]
+    else:
+        candidates = _LEGACY_UNIT_CANDIDATES
+
+    stored_bmi = profile.get("bmi")
+    if isinstance(stored_bmi, (int, float)):
+        for weight_unit, height_unit in candidates:
+            weight_kg, height_m = to_si(weight, height, weight_unit, height_unit)
+            if height_m > 0 and abs(weight_kg / height_m ** 2 - stored_bmi) < 0.05:
+                return weight_unit, height_unit
+
+    if isinstance(height, (list, tuple)):
+        return 'kg', 'ft_in'
+    if height < 3:
+        return 'kg', 'm'
+    return ('kg', 'in') if height < 100 else ('kg', 'cm')
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        raise ValueError(f"Not a number: {value!r}")
+    try:
+        return float(value)
+    except TypeError:
+        raise ValueError(f"Not a number: {value!r}")
+
+
+def canonicalize_profile(profile):
+    """
+    Add schema-2 fields (weight_kg, height_m, weight_unit, height_unit) to a profile dict.
+    Units already present on the record are trusted; otherwise they are inferred.
+    Records without a weight or height, or whose weight or height is not a number,
+    are returned unchanged (the latter with a warning).
+    """
+    if "weight" not in profile or "height" not in profile:
+        return profile
+    try:
+        # Inferred units are only stored once the conversion succeeded, so a record that
+        # fails is left exactly as it was
+        if "weight_unit" not in profile or "height_unit" not in profile:
+            weight_unit, height_unit = infer_units(profile)
+        else:
+            weight_unit, height_unit = profile["weight_unit"], profile["height_unit"]
+        if "weight_kg" not in profile or "height_m" not in profile:
+            weight_kg, height_m = to_si(profile["weight"], profile["height"], weight_unit, height_unit)
+        else:
+            weight_kg = height_m = None
+    except (UnitError, TypeError, ValueError) as e:
+        print(f"[!] Could not convert the record of {profile.get('name', 'unknown')!r} "
+              f"saved at {profile.get('saved_at', 'unknown')}: {e}")
+        return profile
+    profile["weight_unit"], profile["height_unit"] = weight_unit, height_unit
+    if weight_kg is not None:
+        profile["weight_kg"] = round(weight_kg, 4)
+        profile["height_m"] = round(height_m, 4)
+    profile["schema_version"] = SCHEMA_VERSION
+    return profile
+
+
+def migrate_profiles(path=None):
+    """
+    Upgrade every stored record to the current schema, streaming through the file.
+    Returns the number of records that were changed.
+    """
+    path = path or PROFILE_FILE
+    if not os.path.exists(path):
+        return 0
+    migrated = 0
+
+    def upgraded():
+        nonlocal migrated
+        for profile in iter_profiles(path):
+            if profile.get("schema_version") != SCHEMA_VERSION:
+                canonicalize_profile(profile)
+                # Records canonicalize_profile() had to leave alone are not counted
+                if profile.get("schema_version") == SCHEMA_VERSION:
+                    migrated += 1
+            yield profile
+
+    # write_profiles only swaps the file in after the generator has read all of it
+    write_profiles(upgraded(), path)
+    return migrated
+
+
+def profile_fingerprint(profile):
+    """Hash of the inputs that make two saves the same: name, age, sex, weight and height."""
+    key = [
+        profile.get("name"),
+        profile.get("age"),
+        str(profile.get("sex", "")).lower(),
+        profile.get("weight_kg", profile.get("weight")),
+        profile.get("height_m", profile.get("height")),
+    ]
+    return hashlib.blake2b(json.dumps(key).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def legacy_record_id(record):
+    """Stable id for a record saved before record ids existed, derived from its name and saved_at."""
+    key = json.dumps([record.get("name"), record.get("saved_at")])
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def record_id(record):
+    """The record's id: its "record_id", or legacy_record_id() for older records."""
+    return record.get("record_id") or legacy_record_id(record)
+
+
+def _seconds_between(earlier, later):
+    """Seconds from one saved_at string to another (None if either is missing or malformed)."""
+    try:
+        return (datetime.fromisoformat(later) - datetime.fromisoformat(earlier)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _last_saved_at(record):
+    return record.get("last_saved_at", record.get("saved_at"))
+
+
+def _fold_repeat(record, repeat):
+    """Return a copy of record counting repeat (a later identical save) as well."""
+    folded = dict(record)
+    folded["record_id"] = record_id(record)
+    folded["repeat_count"] = record.get("repeat_count", 1) + repeat.get("repeat_count", 1)
+    folded["last_saved_at"] = max(_last_saved_at(record) or "", _last_saved_at(repeat) or "")
+    return folded
+
+
+def _find_repeat(records, profile, window):
+    """
+    Index of the record that profile repeats, or None.
+    Only the user's latest record is considered, and only if it was last saved within window seconds.
+    """
+    name = profile.get("name")
+    for index in range(len(records) - 1, -1, -1):
+        record = records[index]
+        if record.get("name") == name and record.get("record_type") != "rollup":
+            age = _seconds_between(_last_saved_at(record), profile["saved_at"])
+            if age is None or age > window:
+                return None
+            return index if profile_fingerprint(record) == profile_fingerprint(profile) else None
+        age = _seconds_between(record.get("saved_at"), profile["saved_at"])
+        if age is None or age > window:
+            return None  # Records are in save order, so nothing older can be in the window
+    return None
+
+
+def save_profile(profile, path=None, dedupe_window=None):
     """
     Save a single user profile to the JSON file.
-    profile should be a dict with any fields you decide.
+    profile should be a dict with at least name, weight, height and the units they were entered in.
+    If the user's latest record has the same inputs and was saved within dedupe_window seconds
+    (default DEDUPE_WINDOW_SECONDS, 0 disables), that record's repeat_count is bumped instead.
+    The save is written to the store's write-ahead log before the store is touched.
+    Returns the stored record: profile itself, or the earlier record it was folded into.
+    """
+    path = path or PROFILE_FILE
+    window = DEDUPE_WINDOW_SECONDS if dedupe_window is None else dedupe_window
+    stored = profile
+    with SAVE_SECONDS.time(), store_lock(path):
+        log = WriteAheadLog(wal_path(path))
+        if log.size():
+            _replay(log, path)
+        canonicalize_profile(profile)
+        profile["saved_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        profile.setdefault("record_id", uuid.uuid4().hex)
+        signature_before = store_signature(path)
+        if is_block_store(path):
+            store = get_block_store(path)
+
+            def fold(tail):
+                # Only the uncompressed tail can be changed; older repeats are appended
+                nonlocal stored
+                index = _find_repeat(tail, profile, window) if window else None
+                if index is None:
+                    return False
+                tail[index] = stored = _fold_repeat(tail[index], profile)
+                log.append(stored)
+                return True
+
+            if not store.update_tail(fold):
+                # Appends to the uncompressed tail; no rewrite of the history
+                log.append(profile)
+                store.append(profile)
+            total = len(store)
+        else:
+            profiles = load_profiles(path)
+            index = _find_repeat(profiles, profile, window) if window else None
+            if index is None:
+                profiles.append(profile)
+            else:
+                profiles[index] = stored = _fold_repeat(profiles[index], profile)
+            total = len(profiles)
+            log.append(stored)
+            _replace_json(profiles, path)
+        # Both paths fsync the store (block tails included) before returning, so the log can go
+        log.checkpoint()
+        _journal_write(path, signature_before, store_signature(path), stored, total, stored is not profile)
+    STORED_PROFILES.set(total)
+    if stored is not profile:
+        _DEDUPED_SAVE.inc()
+    _publish(stored, path, stored is not profile)
+    return stored
+
+
+class _SeenRecords:
+    """Hash set of stored saves: (fingerprint, saved_at), plus the spans covered by folded repeats."""
+
+    def __init__(self):
+        self.keys = set()
+        self.spans = {}
+
+    def add(self, record, fingerprint=None):
+        fingerprint = fingerprint or profile_fingerprint(record)
+        self.keys.add((fingerprint, record.get("saved_at")))
+        if "last_saved_at" in record:
+            self.spans.setdefault(fingerprint, []).append((record.get("saved_at"), record["last_saved_at"]))
+
+    def contains(self, record, fingerprint):
+        saved_at = record.get("saved_at")
+        if (fingerprint, saved_at) in self.keys:
+            return True
+        return saved_at is not None and any(
+            start <= saved_at <= end for start, end in self.spans.get(fingerprint, ()))
+
+
+def _same_record(a, b):
+    if record_id(a) == record_id(b):
+        return True
+    # A legacy record that has since been given its id
+    return (a.get("name"), a.get("saved_at")) == (b.get("name"), b.get("saved_at"))
+
+
+def _replace_logged(records, profiles):
+    """Replace stored profiles (in place) by their logged versions; returns whether any changed."""
+    changed = False
+    for record in records:
+        for index in range(len(profiles) - 1, -1, -1):
+            if _same_record(profiles[index], record):
+                if profiles[index] != record:
+                    profiles[index] = record
+                    changed = True
+                break
+    return changed
+
+
+def _missing_logged(records, profiles):
+    """Logged records that are not in profiles at all."""
+    return [r for r in records if not any(_same_record(p, r) for p in reversed(profiles))]
+
+
+def _replay(log, path):
+    """Apply the records left in a write-ahead log to the store, then empty the log."""
+    records = log.read()
+    if log.torn:
+        print(f"[!] Ignoring a torn write at the end of {log.path}.")
+    if records:
+        if is_block_store(path):
+            store = get_block_store(path)
+            # A logged save only changed the tail or appended to it, so checking the
+            # tail plus one block's worth of newly sealed records is enough
+            missing = _missing_logged(records, store.last(len(records) + store.block_size))
+            store.update_tail(lambda tail: _replace_logged(records, tail))
+            store.extend(missing)
+        else:
+            profiles = load_profiles(path)
+            _replace_logged(records, profiles)
+            profiles.extend(_missing_logged(records, profiles))
+            _replace_json(profiles, path)
+        RECOVERED.inc(len(records))
+        print(f"[!] Recovered {len(records)} unfinished save(s) from {log.path}.")
+    log.checkpoint()
+    return len(records)
+
+
+def recover(path=None):
+    """
+    Replay saves that were logged but not applied to the store (e.g. after a crash).
+    Only reads the log, and returns at once when it is empty (the normal case).
+    Returns the number of log records replayed.
+    """
+    path = path or PROFILE_FILE
+    with store_lock(path):
+        log = WriteAheadLog(wal_path(path))
+        if not log.size():
+            return 0
+        return _replay(log, path)
+
+
+def _dedupe_stream(profiles, seen, window):
+    """
+    Drop records already in seen (a _SeenRecords), and fold runs of identical records
+    saved within window seconds of each other into one with a repeat_count.
+    Holds back one record at a time, so the stream is never buffered.
+    """
+    pending = pending_fingerprint = None
+    for profile in profiles:
+        fingerprint = profile_fingerprint(profile)
+        if seen.contains(profile, fingerprint):
+            _DEDUPED_IMPORT.inc()
+            continue
+        seen.add(profile, fingerprint)
+        if pending is not None and window and fingerprint == pending_fingerprint:
+            gap = _seconds_between(_last_saved_at(pending), profile.get("saved_at"))
+            if gap is not None and 0 <= gap <= window:
+                pending = _fold_repeat(pending, profile)
+                _DEDUPED_IMPORT.inc()
+                continue
+        if pending is not None:
+            yield pending
+        pending, pending_fingerprint = profile, fingerprint
+    if pending is not None:
+        yield pending
+
+
+def append_profiles(profiles, path=None, dedupe=True):
     """
-    profiles = load_profiles()
-    profile["saved_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    profiles.append(profile)
+    Append many profiles in one streamed rewrite of the file (used by bulk imports).
+    Records are canonicalized; an existing "saved_at" and "record_id" are kept, and records
+    that bring their own saved_at get "imported_at" so delta sync sees them as new.
+    With dedupe, records already in the store (same fingerprint and saved_at) are skipped,
+    and runs of identical saves within DEDUPE_WINDOW_SECONDS are folded together.
+    Save listeners are not notified; ProfileWatcher picks the new records up.
+    Returns the number of records appended.
+    """
+    path = path or PROFILE_FILE
+    appended = 0
+    seen = _SeenRecords()
+
+    def canonicalized():
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        for profile in profiles:
+            canonicalize_profile(profile)
+            if "saved_at" in profile:
+                profile["imported_at"] = now
+            else:
+                profile["saved_at"] = now
+            profile.setdefault("record_id", uuid.uuid4().hex)
+            yield profile
+
+    def prepared():
+        nonlocal appended
+        records = canonicalized()
+        if dedupe:
+            records = _dedupe_stream(records, seen, DEDUPE_WINDOW_SECONDS)
+        for profile in records:
+            appended += 1
+            yield profile
+
+    def existing():
+        # The hash set is filled while the existing records stream past
+        for profile in iter_profiles(path):
+            if dedupe:
+                seen.add(profile)
+            yield profile
+
+    def combined():
+        yield from existing()
+        yield from prepared()
+
+    with store_lock(path):
+        recover(path)
+        if is_block_store(path):
+            # Block stores append without touching the existing blocks
+            store = get_block_store(path)
+            if dedupe:
+                for _ in existing():
+                    pass
+            store.extend(prepared())
+            total = len(store)
+        else:
+            total = write_profiles(combined(), path)
+    STORED_PROFILES.set(total)
+    return appended
+
+
+def _check_site(site):
+    """Return site if it is a usable shard directory name (no path tricks); raise ValueError otherwise."""
+    if not site or site in (".", "..") or os.sep in site or (os.altsep and os.altsep in site):
+        raise ValueError(f"Invalid site id: {site!r}")
+    return site
+
+
+def shard_path(site=None, saved_at=None, root=None, suffix=".json"):
+    """
+    Return the shard that holds records of a site saved at saved_at (default: now).
+    saved_at may be a datetime or a saved_at string; suffix ".blk" selects block stores.
+    """
+    site = _check_site(str(site or SITE_ID))
+    if suffix not in SHARD_SUFFIXES:
+        raise ValueError(f"suffix must be one of: {', '.join(SHARD_SUFFIXES)}")
+    month = (_saved_at_text(saved_at or datetime.now()))[:7]
+    return os.path.join(root or SHARD_ROOT, site, month + suffix)
+
+
+def save_to_shard(profile, site=None, root=None, suffix=".json"):
+    """Save a profile to the current month's shard of its site (see save_profile)."""
+    path = shard_path(site, datetime.now(), root, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return save_profile(profile, path)
+
+
+def append_to_shards(profiles, site=None, root=None, suffix=".json", chunk_size=10000):
+    """
+    Route many profiles to their site's month shards by saved_at (see append_profiles).
+    Records are grouped chunk_size at a time, so each shard is rewritten once per chunk.
+    Returns the number of records appended.
+    """
+    appended = 0
+    now = datetime.now()
+    chunk = {}
+
+    def flush():
+        nonlocal appended
+        for path, records in chunk.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            appended += append_profiles(records, path)
+        chunk.clear()
+
+    pending = 0
+    for profile in profiles:
+        path = shard_path(site, profile.get("saved_at") or now, root, suffix)
+        chunk.setdefault(path, []).append(profile)
+        pending += 1
+        if pending >= chunk_size:
+            flush()
+            pending = 0
+    flush()
+    return appended
+
+
+def iter_shards(root=None, sites=None, start=None, end=None):
+    """
+    Yield the shard paths that can hold records of the given sites (None = all) saved
+    between start and end (None = open-ended), in site then month order.
+    Other sites' directories and months outside the range are never opened.
+    Raises ValueError for an invalid site id (see shard_path).
+    """
+    root = root or SHARD_ROOT
+    if not os.path.isdir(root):
+        return
+    first_month = _saved_at_text(start)[:7] if start is not None else None
+    last_month = _saved_at_text(end)[:7] if end is not None else None
+    # Caller-given site ids are checked like shard_path does, so they cannot reach outside root
+    site_names = sorted(os.listdir(root)) if sites is None else sorted(_check_site(str(s)) for s in sites)
+    for site in site_names:
+        site_dir = os.path.join(root, site)
+        if not os.path.isdir(site_dir):
+            continue
+        for name in sorted(os.listdir(site_dir)):
+            match = _SHARD_NAME.match(name)
+            if not match:
+                continue
+            month = match.group(1)
+            if (first_month is None or month >= first_month) and (last_month is None or month <= last_month):
+                yield os.path.join(site_dir, name)
+
+
+def iter_sharded_profiles(root=None, sites=None, start=None, end=None):
+    """Yield the profiles of the given sites saved between start and end, reading only the shards that overlap."""
+    for path in iter_shards(root, sites, start, end):
+        if start is None and end is None:
+            yield from iter_profiles(path)
+        else:
+            yield from profiles_between(start, end, path)
+
+
+def map_shards(func, shards, max_workers=None):
+    """
+    Return [func(path) for path in shards], computed in parallel worker processes.
+    func must be a module-level function (it is pickled); for aggregate jobs it should
+    return a small summary rather than the records themselves.
+    """
+    shards = list(shards)
+    if len(shards) <= 1 or max_workers == 1:
+        return [func(path) for path in shards]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(func, shards))
+
+
+def load_shards(root=None, sites=None, start=None, end=None, max_workers=None):
+    """Load the selected shards in parallel; returns {shard path: list of profiles}."""
+    shards = list(iter_shards(root, sites, start, end))
+    return dict(zip(shards, map_shards(load_profiles, shards, max_workers)))
+
+
+def subscribe(callback):
+    """
+    Register callback(profile, path, replaced) to be called after each save in this process.
+    replaced is True when the save was folded into an earlier record: profile is then that
+    record's new version (same record_id, higher repeat_count) and should replace it in place.
+    Callbacks run on the saving thread, so GUI code should hop to its own thread.
+    """
+    with _subscribers_lock:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    """Stop notifying a callback registered with subscribe()."""
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def _publish(profile, path, replaced=False):
+    with _subscribers_lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(profile, path, replaced)
+        except Exception as e:
+            LISTENER_ERRORS.inc()
+            print(f"[!] Profile save listener failed: {e}")
+
+
+def store_signature(path=None):
+    """
+    The (inode, mtime, size) of a store's files (None for a missing file), for cheap
+    change checks: any save, import or rewrite changes it.
+    """
+    path = path or PROFILE_FILE
+    paths = [path]
+    if is_block_store(path):
+        paths.append(get_block_store(path).tail_path)
+    signature = []
+    for file_path in paths:
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            signature.append(None)
+            continue
+        signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def _journal_write(path, before, after, record, total, replaced):
+    with _write_journals_lock:
+        journal = _write_journals.setdefault(os.path.abspath(path), deque(maxlen=_WRITE_JOURNAL_SIZE))
+        journal.append((before, after, record, total, replaced))
+
+
+def _journaled_records(path, since, now, known_count):
+    """
+    The records appended by this process that take the store from signature since (with
+    known_count records) to now, or None if anything else (another process, an import,
+    a rewrite) changed it in between. Folded repeats change no count and are left out;
+    they reach listeners through subscribe().
+    """
+    with _write_journals_lock:
+        journal = list(_write_journals.get(os.path.abspath(path), ()))
+    records = []
+    matched = False
+    for before, after, record, total, replaced in journal:
+        if matched and before != since:
+            return None  # a write not in the journal came between two saves
+        if before == since:
+            matched = True
+            if not replaced:
+                records.append(record)
+            since = after
+            if since == now:
+                return records if total == known_count + len(records) else None
+    return None
+
+
+class ProfileWatcher:
+    """
+    Picks up records appended to the profile file, in store order.
+    Polls the file's modification time and size, and only reads the file when they change.
+    Saves made by this process since the last poll are taken from a journal instead of
+    the file, as long as nothing else wrote in between; for block stores only the new
+    records are read, via the block index.
+    """
+
+    def __init__(self, path=None, known_count=0):
+        self.path = path or PROFILE_FILE
+        self.known_count = known_count
+        self._signature = self._stat()
+
+    def _stat(self):
+        return store_signature(self.path)
+
+    def poll(self):
+        """
+        Return the records appended since the last poll ([] if nothing changed).
+        Returns None if the file now holds fewer records than were seen, i.e. it was
+        rewritten and the caller should reload it.
+        """
+        signature = self._stat()
+        if signature == self._signature:
+            return []
+        journaled = _journaled_records(self.path, self._signature, signature, self.known_count)
+        if journaled is not None:
+            self._signature = signature
+            self.known_count += len(journaled)
+            return journaled
+        new_records = self._read_new()
+        # Only trust the signature if the store did not change while it was read
+        self._signature = signature if self._stat() == signature else None
+        return new_records
+
+    def _read_new(self):
+        if is_block_store(self.path):
+            total = count_profiles(self.path)
+            if total < self.known_count:
+                self.known_count = total
+                return None
+            new_records = recent_profiles(total - self.known_count, self.path)
+            self.known_count = total
+            return new_records
+        new_records = []
+        total = 0
+        for total, profile in enumerate(iter_profiles(self.path), start=1):
+            if total > self.known_count:
+                new_records.append(profile)
+        if total < self.known_count:
+            self.known_count = total
+            return None
+        self.known_count = total
+        return new_records
+
 
-    with open(PROFILE_FILE, "w") as f:
-        json.dump(profiles, f, indent=4)
\ No newline at end of file
+# Example usage:
+if __name__ == "__main__":
+    print(f"Migrating {PROFILE_FILE} to schema version {SCHEMA_VERSION}...")
+    print(f"{migrate_profiles()} record(s) migrated.")
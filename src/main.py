@@ -1,7 +1,10 @@
 # Give choice to run either CLI or GUI
 
+import argparse
 import sys
 
+import profiling
+
 def main():
     """Main entry point - allows user to choose between CLI and GUI."""
     print("\n" + "=" * 50)
@@ -36,6 +39,9 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BMI Health Analyzer")
+    profiling.add_profile_arguments(parser)
+    profiling.start_from_args(parser.parse_args())
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,288 @@
+'''
+This module keeps in-process metrics: counters, gauges and histograms.
+
+Modules create their metrics once at import time and update them on the hot path:
+    SAVES = metrics.counter("profile_saves_total", "Profiles saved.")
+    SAVES.inc()
+
+Metrics can carry labels; bind the label values once with labels() and keep the child:
+    FALLBACKS = metrics.counter("ai_fallbacks_total", "AI fallbacks.", ["function", "reason"])
+    FALLBACKS.labels(function="faq", reason="breaker_open").inc()
+
+The registry can be rendered in Prometheus text exposition format (render_text) or
+dumped as JSON (dump_json). Set BMI_METRICS_FILE to write a JSON dump when the process exits.
+'''
+
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; suits calls from microseconds (calculations) up to tens of seconds (AI requests)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS_FILE_ENV = "BMI_METRICS_FILE"
+
+
+class _Metric:
+    """A metric family: the unlabelled value, or one child per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """Return the child for these label values (created on first use)."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _new_child(self):
+        return type(self)(self.name, self.documentation)
+
+    def samples(self):
+        """Yield (label_dict, child) for every series in this family."""
+        if self.labelnames:
+            for key, child in sorted(self._children.items()):
+                yield dict(zip(self.labelnames, key)), child
+        else:
+            yield {}, self
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets and tracks their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus +Inf; cumulated only when rendering
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def cumulative_counts(self):
+        """Return [(upper_bound, cumulative_count), ...] ending with +Inf."""
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """A named collection of metric families."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render_text(self):
+        """Render every metric in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, child in metric.samples():
+                if metric.kind == "histogram":
+                    for bound, count in child.cumulative_counts():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{metric.name}_bucket{_format_labels(labels, le=le)} {count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {child.sum}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {child.value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """Return a JSON-friendly snapshot of every metric."""
+        snapshot = {}
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            series = []
+            for labels, child in metric.samples():
+                if metric.kind == "histogram":
+                    series.append({
+                        "labels": labels,
+                        "count": child.count,
+                        "sum": child.sum,
+                        "buckets": [["+Inf" if b == float("inf") else b, c] for b, c in child.cumulative_counts()],
+                    })
+                else:
+                    series.append({"labels": labels, "value": child.value})
+            snapshot[metric.name] = {"type": metric.kind, "help": metric.documentation, "series": series}
+        return snapshot
+
+    def dump_json(self, path):
+        """Write to_dict() to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"created_at": time.time(), "metrics": self.to_dict()}, f, indent=2)
+
+
+def _format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    """Get or create a counter in the default registry."""
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    """Get or create a gauge in the default registry."""
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create a histogram in the default registry."""
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+
+def render_text():
+    """Render the default registry in Prometheus text exposition format."""
+    return REGISTRY.render_text()
+
+
+def dump_json(path=None):
+    """Dump the default registry to path (or $BMI_METRICS_FILE)."""
+    path = path or os.environ.get(METRICS_FILE_ENV)
+    if path:
+        REGISTRY.dump_json(path)
+
+
+def _dump_at_exit():
+    try:
+        dump_json()
+    except OSError as e:
+        print(f"[!] Could not write metrics to {os.environ.get(METRICS_FILE_ENV)}: {e}")
+
+
+if os.environ.get(METRICS_FILE_ENV):
+    atexit.register(_dump_at_exit)
+
+
+# Example usage:
+if __name__ == "__main__":
+    requests = counter("example_requests_total", "Example requests.", ["outcome"])
+    latency = histogram("example_seconds", "Example latency.")
+    for i in range(10):
+        with latency.time():
+            requests.labels(outcome="ok" if i % 3 else "error").inc()
+    print(render_text())
@@ -0,0 +1,255 @@
+'''
+This module indexes profile history by name for fast prefix and fuzzy search.
+
+The index keeps:
+    - the distinct names (case-folded) in a sorted list, searched with bisect for prefixes
+    - a trigram -> names map for fuzzy matching (scored by trigram overlap)
+    - for every name, the positions of its records in store order
+Searches only touch the names that can match, never the records, so they stay fast
+however long the history is.
+
+get_name_index() builds an index for a store once and keeps it up to date: before
+each search a ProfileWatcher picks up the records saved since, by this process or
+others, in store order. That index also keeps a short row per record (saved_at, BMI,
+category, repeats), so search results can be listed without reading the store; repeats
+folded into a record by this process update its row as they are saved.
+'''
+
+
+import math
+import sys
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from data_utils import PROFILE_FILE, iter_profiles, subscribe, ProfileWatcher
+
+DEFAULT_LIMIT = 20
+MIN_FUZZY_SCORE = 0.3
+
+# Trigrams shared by more than this fraction of names (and by more than
+# COMMON_TRIGRAM_MIN names), e.g. those of a common first name, are not used to find
+# fuzzy candidates, only to score them
+COMMON_TRIGRAM_FRACTION = 0.005
+COMMON_TRIGRAM_MIN = 1000
+
+_EMPTY = frozenset()
+
+
+def normalize_name(name):
+    """Case-fold and collapse whitespace so 'Alice  Smith' and 'alice smith' match."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def trigrams(text):
+    """The trigrams of a normalized name, padded so short names and word starts count."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Prefix and fuzzy name search over a list of profile records."""
+
+    def __init__(self, keep_rows=False):
+        self.names = []          # distinct normalized names, sorted
+        self.positions = {}      # normalized name -> record positions, ascending
+        self.display = {}        # normalized name -> name as last saved
+        self._trigrams = {}      # trigram -> set of normalized names
+        self._gram_counts = {}   # normalized name -> number of distinct trigrams
+        self.size = 0            # records indexed
+        # With keep_rows, position -> (name, saved_at, bmi, category, repeat_count)
+        self.rows = [] if keep_rows else None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_profiles(cls, profiles, keep_rows=False):
+        """Build an index over an iterable of profiles (positions count from 0)."""
+        index = cls(keep_rows)
+        for position, profile in enumerate(profiles):
+            index._add_position(profile, position, sort=False)
+            index.size = position + 1
+        index.names.sort()
+        return index
+
+    def add(self, profile):
+        """Index one record appended after the ones already indexed; returns its position."""
+        with self._lock:
+            position = self.size
+            self._add_position(profile, position)
+            self.size += 1
+            return position
+
+    @staticmethod
+    def _row(key, profile):
+        category = profile.get("category")
+        return (key, profile.get("saved_at"), profile.get("bmi"),
+                sys.intern(category) if isinstance(category, str) else category,
+                profile.get("repeat_count", 1))
+
+    def _add_position(self, profile, position, sort=True):
+        name = profile.get("name")
+        key = normalize_name(name)
+        if self.rows is not None:
+            self.rows.append(self._row(key, profile))
+        positions = self.positions.get(key)
+        if positions is None:
+            self.positions[key] = [position]
+            if sort:
+                insort(self.names, key)
+            else:
+                self.names.append(key)
+            grams = trigrams(key)
+            self._gram_counts[key] = len(grams)
+            for trigram in grams:
+                self._trigrams.setdefault(trigram, set()).add(key)
+        else:
+            positions.append(position)
+        self.display[key] = str(name or "")
+
+    def prefix(self, query, limit=DEFAULT_LIMIT):
+        """Names starting with query, in alphabetical order."""
+        key = normalize_name(query)
+        with self._lock:
+            start = bisect_left(self.names, key)
+            matches = []
+            for name in self.names[start:start + limit]:
+                if not name.startswith(key):
+                    break
+                matches.append(name)
+            return matches
+
+    def fuzzy(self, query, limit=DEFAULT_LIMIT, min_score=MIN_FUZZY_SCORE):
+        """Names sharing enough trigrams with query, best first, as (name, score) pairs."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        query_grams = trigrams(key)
+        # A name scoring >= min_score shares at least this many trigrams with the query,
+        # so it must appear in one of the (len - needed + 1) rarest query trigrams
+        needed = max(1, math.ceil(min_score * len(query_grams)))
+        with self._lock:
+            postings = sorted((self._trigrams.get(g, _EMPTY) for g in query_grams), key=len)
+            rarest = next((len(names) for names in postings if names), 0)
+            common = max(rarest, COMMON_TRIGRAM_MIN, COMMON_TRIGRAM_FRACTION * len(self.names))
+            candidates = set().union(*(names for names in postings[:len(postings) - needed + 1]
+                                       if len(names) <= common))
+            shared = Counter()
+            for names in postings:
+                shared.update(candidates & names if len(names) > len(candidates) else names & candidates)
+            scored = []
+            for name, count in shared.items():
+                # Jaccard similarity of the two trigram sets
+                score = count / (len(query_grams) + self._gram_counts[name] - count)
+                if score >= min_score:
+                    scored.append((score, name))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(name, round(score, 3)) for score, name in scored[:limit]]
+
+    def search(self, query, limit=DEFAULT_LIMIT, fuzzy=True):
+        """Prefix matches first, then fuzzy matches; returns normalized names."""
+        matches = self.prefix(query, limit)
+        if fuzzy and len(matches) < limit:
+            seen = set(matches)
+            for name, _ in self.fuzzy(query, limit):
+                if name not in seen:
+                    matches.append(name)
+                    seen.add(name)
+                    if len(matches) >= limit:
+                        break
+        return matches
+
+    def replace(self, profile):
+        """Update the row of a record that a later repeat was folded into (matched by name and saved_at)."""
+        if self.rows is None:
+            return False
+        key = normalize_name(profile.get("name"))
+        with self._lock:
+            for position in reversed(self.positions.get(key, ())):
+                if self.rows[position][1] == profile.get("saved_at"):
+                    self.rows[position] = self._row(key, profile)
+                    return True
+        return False
+
+    def records_for(self, names):
+        """Positions of all records of the given (normalized) names, in store order."""
+        with self._lock:
+            positions = []
+            for name in names:
+                positions.extend(self.positions.get(name, ()))
+        positions.sort()
+        return positions
+
+    def rows_for(self, positions):
+        """The kept rows of records at positions, as dicts (needs keep_rows)."""
+        with self._lock:
+            rows = []
+            for position in positions:
+                key, saved_at, bmi, category, repeat_count = self.rows[position]
+                rows.append({"name": self.display[key], "saved_at": saved_at, "bmi": bmi,
+                             "category": category, "repeat_count": repeat_count})
+            return rows
+
+
+class StoreNameIndex:
+    """A NameIndex (with rows) over a profile store, brought up to date before each search."""
+
+    def __init__(self, path=None):
+        self.path = path or PROFILE_FILE
+        self._lock = threading.Lock()
+        self.rebuild()
+        subscribe(self._on_saved)
+
+    def _on_saved(self, profile, path, replaced):
+        # New records are picked up in store order by refresh(); folds change no position
+        if replaced and path == self.path:
+            with self._lock:
+                self.index.replace(profile)
+
+    def rebuild(self):
+        with self._lock:
+            # The watcher is created first, so records saved while the index is built are polled again
+            watcher = ProfileWatcher(self.path)
+            self.index = NameIndex.from_profiles(iter_profiles(self.path), keep_rows=True)
+            watcher.known_count = self.index.size
+            self.watcher = watcher
+
+    def refresh(self):
+        """Pick up records saved since the last search, in store order (cheap when nothing changed)."""
+        with self._lock:
+            new_records = self.watcher.poll()
+            if new_records is not None:
+                for profile in new_records:
+                    self.index.add(profile)
+                return
+        self.rebuild()  # the store was rewritten
+
+    def search(self, query, limit=DEFAULT_LIMIT, fuzzy=True):
+        self.refresh()
+        return self.index.search(query, limit, fuzzy)
+
+    def recent_rows(self, names, n):
+        """Rows of the newest n records of the given names, oldest first."""
+        return self.index.rows_for(self.index.records_for(names)[-n:] if n > 0 else [])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_name_index(path=None):
+    """Return the shared StoreNameIndex for a store (built on first use)."""
+    path = path or PROFILE_FILE
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = StoreNameIndex(path)
+        return index
+
+
+# Example usage:
+if __name__ == "__main__":
+    import sys
+    store_index = get_name_index()
+    query = " ".join(sys.argv[1:]) or "a"
+    for name in store_index.search(query):
+        print(f"{store_index.index.display[name]:<20} {len(store_index.index.positions[name])} record(s)")
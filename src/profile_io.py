@@ -0,0 +1,239 @@
+'''
+This module moves profile history in and out of the store in bulk.
+
+Supported formats (picked from the file extension unless given explicitly):
+    csv      one row per profile, fixed columns
+    jsonl    one JSON object per line
+    parquet  columnar, only when pyarrow is installed
+
+Both directions stream in chunks, so histories larger than memory can be moved.
+In CSV and Parquet, "height" is stored as JSON text (a number, or [feet, inches]),
+and any fields without their own column are kept as a JSON object in "extra" (as are
+values of the wrong type for their column, such as a weight saved as text).
+Exports go to a temporary file that replaces the destination only when complete.
+'''
+
+
+import argparse
+import csv
+import json
+import os
+from itertools import islice
+
+from data_utils import iter_profiles, append_profiles
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; Parquet is then unavailable
+    pa = None
+    pq = None
+
+
+FORMATS = ("csv", "jsonl", "parquet")
+DEFAULT_CHUNK_SIZE = 10000
+
+# Column name -> kind: "str", "int", "float" or "json" (JSON text)
+COLUMNS = {
+    "name": "str",
+    "age": "int",
+    "sex": "str",
+    "weight": "float",
+    "height": "json",
+    "weight_unit": "str",
+    "height_unit": "str",
+    "bmi": "float",
+    "category": "str",
+    "bmr": "float",
+    "weight_kg": "float",
+    "height_m": "float",
+    "schema_version": "int",
+    "saved_at": "str",
+    "extra": "json",
+}
+
+
+def detect_format(filename):
+    """Return the format for a file name from its extension."""
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    fmt = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl", "parquet": "parquet", "pq": "parquet"}.get(ext)
+    if fmt is None:
+        raise ValueError(f"Cannot tell the format of {filename}; pass one of: {', '.join(FORMATS)}.")
+    return fmt
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet support needs pyarrow (pip install pyarrow).")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _fits(value, kind):
+    """Whether value can be stored as is in a column of this kind."""
+    if kind == "json":
+        return True
+    if kind == "str":
+        return isinstance(value, str)
+    if isinstance(value, bool):
+        return False
+    if kind == "int":
+        return isinstance(value, int) and -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, (int, float))
+
+
+def to_row(profile):
+    """
+    Flatten a profile dict into the fixed columns (values as Python objects).
+    A value that does not fit its column's type (e.g. a weight saved as "70") goes to
+    "extra" instead, so it neither breaks the typed Parquet schema nor changes on import.
+    """
+    row = {}
+    extra = {key: value for key, value in profile.items() if key not in COLUMNS}
+    for column, kind in COLUMNS.items():
+        if column == "extra":
+            continue
+        value = profile.get(column)
+        if value is not None and not _fits(value, kind):
+            extra[column] = value
+            value = None
+        row[column] = value
+    if row["height"] is not None:
+        row["height"] = json.dumps(row["height"])
+    row["extra"] = json.dumps(extra) if extra else None
+    return row
+
+
+def from_row(row, parse_text=False):
+    """
+    Rebuild a profile dict from a row of the fixed columns.
+    parse_text=True converts CSV strings back to numbers.
+    """
+    profile = {}
+    for column, kind in COLUMNS.items():
+        value = row.get(column)
+        if value is None or value == "":
+            continue
+        # Numbers are parsed as JSON so CSV round trips keep ints as ints
+        if kind == "json" or (parse_text and kind != "str"):
+            value = json.loads(value)
+        if column == "extra":
+            profile.update(value)
+        else:
+            profile[column] = value
+    return profile
+
+
+def export_profiles(dest, fmt=None, path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write every stored profile to dest, streaming chunk_size records at a time.
+    Returns the number of records written.
+    """
+    fmt = fmt or detect_format(dest)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if fmt == "parquet":
+        _require_pyarrow()
+    profiles = iter_profiles(path)
+    count = 0
+    # Written next to dest and renamed into place, so a failed export never leaves a partial file
+    tmp_path = dest + ".tmp"
+    try:
+        if fmt == "jsonl":
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for chunk in _chunks(profiles, chunk_size):
+                    f.write("".join(json.dumps(p, separators=(",", ":")) + "\n" for p in chunk))
+                    count += len(chunk)
+
+        elif fmt == "csv":
+            with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(COLUMNS))
+                writer.writeheader()
+                for chunk in _chunks(profiles, chunk_size):
+                    writer.writerows(to_row(p) for p in chunk)
+                    count += len(chunk)
+
+        else:  # parquet
+            schema = parquet_schema()
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for chunk in _chunks(profiles, chunk_size):
+                    writer.write_batch(pa.RecordBatch.from_pylist([to_row(p) for p in chunk], schema=schema))
+                    count += len(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dest)
+    return count
+
+
+def read_profiles(src, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield profiles from an exported file without loading all of it."""
+    fmt = fmt or detect_format(src)
+
+    if fmt == "jsonl":
+        with open(src, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    elif fmt == "csv":
+        with open(src, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield from_row(row, parse_text=True)
+
+    elif fmt == "parquet":
+        _require_pyarrow()
+        for batch in pq.ParquetFile(src).iter_batches(batch_size=chunk_size):
+            for row in batch.to_pylist():
+                yield from_row(row)
+
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def import_profiles(src, fmt=None, path=None, chunk_size=DEFAULT_CHUNK_SIZE, dedupe=True):
+    """
+    Append every profile in src to the store in a single streamed rewrite.
+    With dedupe, records already in the store are skipped and repeated saves are folded
+    (see data_utils.append_profiles), so importing the same file twice adds nothing.
+    Returns the number of records imported.
+    """
+    return append_profiles(read_profiles(src, fmt, chunk_size), path, dedupe)
+
+
+def parquet_schema():
+    """Arrow schema matching COLUMNS."""
+    _require_pyarrow()
+    types = {"int": pa.int64(), "float": pa.float64()}
+    return pa.schema([(column, types.get(kind, pa.string())) for column, kind in COLUMNS.items()])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of the profile history.")
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("file", help="file to write (export) or read (import)")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--store", help="profile store (default: data_utils.PROFILE_FILE)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--no-dedupe", action="store_true", help="import every record, even repeats")
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        count = export_profiles(args.file, args.format, args.store, args.chunk_size)
+        print(f"Exported {count} profile(s) to {args.file}")
+    else:
+        count = import_profiles(args.file, args.format, args.store, args.chunk_size, not args.no_dedupe)
+        print(f"Imported {count} profile(s) from {args.file}")
+
+
+# Example usage:
+if __name__ == "__main__":
+    main()
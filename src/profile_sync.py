@@ -0,0 +1,315 @@
+'''
+This module syncs profile history between a kiosk's store and a central store,
+moving only the records that changed since the last sync.
+
+Every record has an id (data_utils.record_id) and a change time: the latest of its
+saved_at, last_saved_at (a folded repeat) and imported_at. merge_records() stamps the
+records it adds or replaces with "received_at" (this store's clock), so a record that
+arrives late, e.g. from a kiosk that was offline, still counts as a new change here.
+Records are ordered by (latest of change time and received_at, id), and a sync cursor
+is the position of the last record sent or received. Cursors are kept per remote in
+<store>.sync.json, so an interrupted sync resumes from its last completed batch.
+
+The change order of a store is built once and kept in memory until the store changes,
+so the batches of a long pull are bisected out of it instead of re-reading the store.
+
+Merging is idempotent: a record already present with the same contents (received_at
+aside) is skipped, and when both sides hold different versions of a record, the one that
+changed last wins (ties go to the higher repeat count). Roll-ups made by compaction are
+local summaries and are not synced, and neither are deletions.
+
+Remotes:
+    DirectoryRemote("/mnt/central")        a store file in a (shared) directory
+    HTTPRemote("http://central:8080")       a bmi_server.py instance (/sync endpoints)
+
+Run:  python profile_sync.py http://central:8080 --direction push
+'''
+
+
+import argparse
+import gzip
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+from datetime import datetime
+from itertools import chain
+
+import metrics
+from block_store import is_block_store, get_block_store
+from data_utils import (PROFILE_FILE, iter_profiles, write_profiles, store_lock, recover,
+                        record_id, store_signature, _publish)
+
+DEFAULT_BATCH_SIZE = 500
+STATE_SUFFIX = ".sync.json"
+
+SYNC_RECORDS = metrics.counter("sync_records_total", "Records moved by profile sync.", ["direction"])
+SYNC_CONFLICTS = metrics.counter("sync_conflicts_total", "Records held in different versions on both sides.")
+
+
+def changed_at(record):
+    """The time the record itself last changed: the latest of saved_at, last_saved_at and imported_at."""
+    return max(record.get("saved_at") or "", record.get("last_saved_at") or "",
+               record.get("imported_at") or "")
+
+
+def change_key(record):
+    """Sort key of a record in the change order: (change or arrival time, id)."""
+    return (max(changed_at(record), record.get("received_at") or ""), record_id(record))
+
+
+def _syncable(record):
+    return record.get("record_type") != "rollup"
+
+
+def _contents(record):
+    """The record without this store's arrival stamp, for comparing versions across stores."""
+    if "received_at" not in record:
+        return record
+    return {key: value for key, value in record.items() if key != "received_at"}
+
+
+_change_orders = {}
+_change_orders_lock = threading.Lock()
+
+
+def _change_order(path):
+    """
+    Return (keys, records): the store's syncable records sorted by change_key, and their keys.
+    Cached per store until its files change (see data_utils.store_signature).
+    """
+    path = os.path.abspath(path or PROFILE_FILE)
+    signature = store_signature(path)
+    with _change_orders_lock:
+        cached = _change_orders.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+    changed = sorted(((change_key(r), r) for r in iter_profiles(path) if _syncable(r)),
+                     key=lambda item: item[0])
+    keys = [key for key, _ in changed]
+    records = [r for _, r in changed]
+    with _change_orders_lock:
+        _change_orders[path] = (signature, keys, records)
+    return keys, records
+
+
+def changes_since(cursor=None, limit=DEFAULT_BATCH_SIZE, path=None):
+    """
+    Return (records, next_cursor, more): up to limit records changed after cursor,
+    in change order. limit=None returns every change.
+    """
+    keys, records = _change_order(path)
+    start = bisect_right(keys, tuple(cursor)) if cursor else 0
+    end = len(keys) if limit is None else min(start + limit, len(keys))
+    next_cursor = list(keys[end - 1]) if end > start else (list(cursor) if cursor else None)
+    return records[start:end], next_cursor, end < len(keys)
+
+
+def _winner(local, incoming):
+    """The version of a record to keep when both sides changed it."""
+    if changed_at(incoming) != changed_at(local):
+        return incoming if changed_at(incoming) > changed_at(local) else local
+    if incoming.get("repeat_count", 1) != local.get("repeat_count", 1):
+        return incoming if incoming.get("repeat_count", 1) > local.get("repeat_count", 1) else local
+    # Same change time and count: pick deterministically so both sides agree
+    return max(local, incoming, key=lambda r: json.dumps(_contents(r), sort_keys=True))
+
+
+def merge_records(records, path=None):
+    """
+    Merge records received from another store into this one.
+    Records updated in place are reported to subscribe() listeners as replaced.
+    Returns {"added": n, "updated": n, "unchanged": n, "conflicts": n}.
+    """
+    path = path or PROFILE_FILE
+    result = {"added": 0, "updated": 0, "unchanged": 0, "conflicts": 0}
+    incoming = {}
+    for record in records:
+        if _syncable(record):
+            incoming[record_id(record)] = _contents(record)
+
+    with store_lock(path):
+        recover(path)
+        received_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        replacements = {}
+        for local in iter_profiles(path):
+            rid = record_id(local)
+            record = incoming.pop(rid, None)
+            if record is None:
+                continue
+            if record == _contents(local):
+                result["unchanged"] += 1
+                continue
+            result["conflicts"] += 1
+            winner = _winner(local, record)
+            if winner is local:
+                result["unchanged"] += 1
+            else:
+                replacements[rid] = dict(winner, received_at=received_at)
+                result["updated"] += 1
+        added = [dict(record, received_at=received_at) for record in incoming.values()]
+        result["added"] = len(added)
+
+        if replacements:
+            # An update can touch any record, so the store is rewritten (atomically)
+            updated = (replacements.get(record_id(r), r) for r in iter_profiles(path))
+            write_profiles(chain(updated, added), path)
+        elif added:
+            if is_block_store(path):
+                get_block_store(path).extend(added)
+            else:
+                write_profiles(chain(iter_profiles(path), added), path)
+
+    SYNC_CONFLICTS.inc(result["conflicts"])
+    # Watchers only pick up appended records, so tell listeners about the rows that were
+    # replaced in place, the same way a folded repeat is reported
+    for record in replacements.values():
+        _publish(record, path, True)
+    return result
+
+
+class SyncState:
+    """Per-remote push/pull cursors, stored next to the profile store."""
+
+    def __init__(self, path=None):
+        self.path = (path or PROFILE_FILE) + STATE_SUFFIX
+        try:
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.data = {}
+
+    def get(self, remote, direction):
+        return self.data.get(remote, {}).get(direction)
+
+    def set(self, remote, direction, cursor):
+        self.data.setdefault(remote, {})[direction] = cursor
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class DirectoryRemote:
+    """A profile store file in a directory (e.g. a network share) used as the remote."""
+
+    def __init__(self, directory, filename=os.path.basename(PROFILE_FILE)):
+        self.path = os.path.join(directory, filename)
+        self.name = os.path.abspath(self.path)
+
+    def changes(self, cursor, limit):
+        records, next_cursor, more = changes_since(cursor, limit, self.path)
+        return {"records": records, "next": next_cursor, "more": more}
+
+    def apply(self, records):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return merge_records(records, self.path)
+
+
+class HTTPRemote:
+    """A bmi_server.py instance, reached through its /sync endpoints (gzip-compressed JSON)."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.name = self.base_url
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        data = None
+        headers = {"Accept-Encoding": "gzip"}
+        if payload is not None:
+            data = gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+            headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+        return json.loads(body)
+
+    def changes(self, cursor, limit):
+        query = {"limit": limit}
+        if cursor:
+            query["since"], query["after"] = cursor
+        return self._request("GET", "/sync/changes?" + urllib.parse.urlencode(query))
+
+    def apply(self, records):
+        return self._request("POST", "/sync/apply", {"records": records})
+
+
+def push(remote, path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Send local changes since the last push; returns the number of records sent."""
+    path = path or PROFILE_FILE
+    state = SyncState(path)
+    cursor = state.get(remote.name, "push")
+    records, _, _ = changes_since(cursor, None, path)
+    sent = 0
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        remote.apply(batch)
+        sent += len(batch)
+        # Advance after every batch so an interrupted push resumes where it stopped
+        state.set(remote.name, "push", list(change_key(batch[-1])))
+    SYNC_RECORDS.labels(direction="push").inc(sent)
+    return sent
+
+
+def pull(remote, path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Fetch remote changes since the last pull and merge them; returns the number received."""
+    path = path or PROFILE_FILE
+    state = SyncState(path)
+    cursor = state.get(remote.name, "pull")
+    received = 0
+    while True:
+        response = remote.changes(cursor, batch_size)
+        if response["records"]:
+            merge_records(response["records"], path)
+            received += len(response["records"])
+            cursor = response["next"]
+            state.set(remote.name, "pull", cursor)
+        if not response["more"]:
+            break
+    SYNC_RECORDS.labels(direction="pull").inc(received)
+    return received
+
+
+def sync(remote, path=None, direction="both", batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Push and/or pull ("push", "pull" or "both"). Returns {"pushed": n, "pulled": n}.
+    With "both", records just pulled are sent back once on the next push; the remote
+    recognises them as unchanged.
+    """
+    if direction not in ("push", "pull", "both"):
+        raise ValueError("direction must be 'push', 'pull' or 'both'.")
+    result = {"pushed": 0, "pulled": 0}
+    if direction in ("push", "both"):
+        result["pushed"] = push(remote, path, batch_size)
+    if direction in ("pull", "both"):
+        result["pulled"] = pull(remote, path, batch_size)
+    return result
+
+
+def remote_for(target):
+    """An HTTPRemote for an http(s) URL, otherwise a DirectoryRemote."""
+    if target.startswith(("http://", "https://")):
+        return HTTPRemote(target)
+    return DirectoryRemote(target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync profile history with a central store.")
+    parser.add_argument("remote", help="http(s) URL of a bmi_server, or a directory")
+    parser.add_argument("--direction", choices=("push", "pull", "both"), default="push")
+    parser.add_argument("--store", help="local profile store (default: data_utils.PROFILE_FILE)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    result = sync(remote_for(args.remote), args.store, args.direction, args.batch_size)
+    print(f"Pushed {result['pushed']} record(s), pulled {result['pulled']} record(s).")
+
+
+# Example usage:
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+'''
+This module adds a --profile mode and named spans to the CLI and GUI.
+
+Spans mark the major operations so slowness can be attributed to them:
+    with profiling.span("save"):
+        save_profile(profile)
+Every span's duration is recorded in the span_seconds histogram (see metrics.py),
+whether or not a profiling session is running.
+
+A profiling session (started by --profile) writes two files when the process exits:
+    <prefix>.pstats   cProfile statistics for the main thread (open with pstats or snakeviz)
+    <prefix>.folded   sampled stacks of every thread in collapsed format, one
+                      "frame;frame;frame count" line per stack, ready for flamegraph.pl
+                      or speedscope; stacks taken inside a span start with "span:<name>"
+'''
+
+
+import argparse
+import atexit
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import metrics
+
+DEFAULT_INTERVAL = 0.005  # seconds between stack samples
+
+SPAN_SECONDS = metrics.histogram("span_seconds", "Duration of named operations.", ["span"])
+
+# Open spans per thread, read by the sampler to tag stacks
+_active_spans = {}
+
+_session = None
+
+
+class Span:
+    """Times a named operation; use as a context manager."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = None
+        self._histogram = SPAN_SECONDS.labels(span=name)
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        _active_spans.setdefault(self._thread, []).append(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+        return False
+
+    def finish(self):
+        """End the span (only the first call counts) and return its duration in seconds."""
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self._start
+            self._histogram.observe(self.seconds)
+            stack = _active_spans.get(self._thread)
+            if stack:
+                stack.pop()
+        return self.seconds
+
+
+def span(name):
+    """Return a context manager that times the named operation."""
+    return Span(name)
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.stacks[self._collapse(thread_id, frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    @staticmethod
+    def _collapse(thread_id, frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.reverse()
+        spans = [f"span:{name}" for name in _active_spans.get(thread_id, ())]
+        return ";".join(part.replace(";", ",") for part in spans + frames)
+
+    def write_folded(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """A cProfile run and/or stack sampler whose results are written on stop()."""
+
+    def __init__(self, prefix, mode="both", interval=DEFAULT_INTERVAL):
+        if mode not in ("cprofile", "sampling", "both"):
+            raise ValueError("mode must be 'cprofile', 'sampling' or 'both'.")
+        self.prefix = prefix
+        self.profiler = cProfile.Profile() if mode in ("cprofile", "both") else None
+        self.sampler = StackSampler(interval) if mode in ("sampling", "both") else None
+        self.running = False
+
+    def start(self):
+        if self.sampler:
+            self.sampler.start()
+        if self.profiler:
+            self.profiler.enable()
+        self.running = True
+
+    def stop(self):
+        """Stop profiling and write the output files; returns their paths."""
+        if not self.running:
+            return []
+        self.running = False
+        paths = []
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(f"{self.prefix}.pstats")
+            paths.append(f"{self.prefix}.pstats")
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler.write_folded(f"{self.prefix}.folded")
+            paths.append(f"{self.prefix}.folded")
+        return paths
+
+
+def default_prefix():
+    return os.path.join(os.getcwd(), f"bmi-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+
+def start_profiling(prefix=None, mode="both", interval=DEFAULT_INTERVAL):
+    """Start the process-wide session; files are written by stop_profiling() or at exit."""
+    global _session
+    if _session is not None and _session.running:
+        return _session
+    _session = ProfileSession(prefix or default_prefix(), mode, interval)
+    _session.start()
+    print(f"[PROFILE] Profiling enabled ({mode}); results go to {_session.prefix}.*")
+    return _session
+
+
+def stop_profiling():
+    """Stop the process-wide session and write its files."""
+    if _session is None:
+        return []
+    paths = _session.stop()
+    for path in paths:
+        print(f"[PROFILE] Wrote {path}")
+    return paths
+
+
+atexit.register(stop_profiling)
+
+
+def add_profile_arguments(parser):
+    """Add --profile, --profile-mode and --profile-interval to an argparse parser."""
+    parser.add_argument("--profile", nargs="?", const="", metavar="PREFIX",
+                        help="profile this session; output files start with PREFIX (default: ./bmi-profile-<time>)")
+    parser.add_argument("--profile-mode", choices=("cprofile", "sampling", "both"), default="both",
+                        help="cProfile, the stack sampler, or both (default)")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between stack samples")
+
+
+def start_from_args(args):
+    """Start profiling if --profile was given; returns the session or None."""
+    if args.profile is None:
+        return None
+    return start_profiling(args.profile or None, args.profile_mode, args.profile_interval)
+
+
+def start_from_argv(argv=None, description=None):
+    """Parse only the profiling options from argv and start a session if asked."""
+    parser = argparse.ArgumentParser(description=description)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    return start_from_args(args)
+
+
+# Example usage:
+if __name__ == "__main__":
+    start_profiling(mode="both")
+    with span("calculate"):
+        total = sum(i * i for i in range(2_000_000))
+    with span("save"):
+        time.sleep(0.1)
+    stop_profiling()
+    print(metrics.render_text())
@@ -4,252 +4,273 @@ And this runs only when AI services are not available or the user prefers static
 '''
 
 
-import random
+import zlib
+from datetime import date
 
-def health_facts_of_the_day():
-    li= [
-        "Drinking water can help improve your metabolism.",
-        "Regular exercise can boost your mood and energy levels.",
-        "Getting enough sleep is crucial for overall health.",
-        "Eating a balanced diet can help maintain a healthy weight.",
-        "Taking breaks during work can improve productivity and reduce stress.",
-        "Include more fruits and vegetables for vitamins and fiber.",
-        "Choose whole grains over refined grains to increase fiber intake.",
-        "Limit added sugars and sugary drinks to reduce empty calories.",
-        "Prefer lean proteins like fish, poultry, beans, and legumes.",
-        "Watch portion sizes to avoid overeating.",
-        "Include healthy fats such as avocados, nuts, and olive oil in moderation.",
-        "Plan meals and prep healthy snacks to avoid processed food choices.",
-        "Read nutrition labels to make informed food choices.",
-        "Practice mindful eating: slow down and savor your food.",
-        "Stay consistent with regular meal times to help regulate appetite.",
-        "Favor whole-food snacks like nuts, seeds, and fresh fruit over packaged bars.",
-        "Add legumes (lentils, chickpeas, black beans) to meals to boost protein and fiber.",
-        "Try meatless meals a few times a week to diversify nutrients and reduce saturated fat.",
-        "Choose healthy cooking oils (olive, avocado) and avoid trans fats.",
-        "Include a variety of colorful vegetables to maximize vitamins and antioxidants.",
-        "Consume fermented foods (yogurt, kefir, sauerkraut) to support gut health.",
-        "Prioritize lean cuts of meat and remove visible fat when possible.",
-        "Swap sugary dressings for vinegar-based or citrusy vinaigrettes.",
-        "Replace sugary desserts with fresh fruit or yogurt parfaits.",
-        "Limit high-sodium condiments and rinse canned foods to reduce salt intake.",
-        "Use herbs and spices to enhance flavor instead of extra salt or sugar.",
-        "Cook large batches and freeze portions to help maintain healthy choices on busy days."
-    ]
-    return random.choice(li)
+import metrics
 
 
-def health_facts(bmi: float, category: str) -> list[str]:
+HEALTH_FACTS_OF_THE_DAY = (
+    "Drinking water can help improve your metabolism.",
+    "Regular exercise can boost your mood and energy levels.",
+    "Getting enough sleep is crucial for overall health.",
+    "Eating a balanced diet can help maintain a healthy weight.",
+    "Taking breaks during work can improve productivity and reduce stress.",
+    "Include more fruits and vegetables for vitamins and fiber.",
+    "Choose whole grains over refined grains to increase fiber intake.",
+    "Limit added sugars and sugary drinks to reduce empty calories.",
+    "Prefer lean proteins like fish, poultry, beans, and legumes.",
+    "Watch portion sizes to avoid overeating.",
+    "Include healthy fats such as avocados, nuts, and olive oil in moderation.",
+    "Plan meals and prep healthy snacks to avoid processed food choices.",
+    "Read nutrition labels to make informed food choices.",
+    "Practice mindful eating: slow down and savor your food.",
+    "Stay consistent with regular meal times to help regulate appetite.",
+    "Favor whole-food snacks like nuts, seeds, and fresh fruit over packaged bars.",
+    "Add legumes (lentils, chickpeas, black beans) to meals to boost protein and fiber.",
+    "Try meatless meals a few times a week to diversify nutrients and reduce saturated fat.",
+    "Choose healthy cooking oils (olive, avocado) and avoid trans fats.",
+    "Include a variety of colorful vegetables to maximize vitamins and antioxidants.",
+    "Consume fermented foods (yogurt, kefir, sauerkraut) to support gut health.",
+    "Prioritize lean cuts of meat and remove visible fat when possible.",
+    "Swap sugary dressings for vinegar-based or citrusy vinaigrettes.",
+    "Replace sugary desserts with fresh fruit or yogurt parfaits.",
+    "Limit high-sodium condiments and rinse canned foods to reduce salt intake.",
+    "Use herbs and spices to enhance flavor instead of extra salt or sugar.",
+    "Cook large batches and freeze portions to help maintain healthy choices on busy days."
+)
+
+
+def health_facts_of_the_day(day: date = None, user_id=None, seed: int = None) -> str:
+    """
+    Return the health fact for a given day.
+    The fact rotates once per day and stays the same for the whole day.
+    user_id gives each user their own rotation, and seed can be passed
+    for reproducible tests and batch reports.
+    """
+    if day is None:
+        day = date.today()
+    index = day.toordinal()
+    if user_id is not None:
+        # crc32 is stable across runs, unlike the salted built-in hash()
+        index += zlib.crc32(str(user_id).encode("utf-8"))
+    if seed is not None:
+        index += seed * 2654435761
+    return HEALTH_FACTS_OF_THE_DAY[index % len(HEALTH_FACTS_OF_THE_DAY)]
+
+
+HEALTH_FACTS = {
+    "Underweight": (
+        "Low BMI is linked with lower muscle mass and potential nutrient deficiencies.",
+        "Being underweight can weaken the immune system and reduce energy levels.",
+        "Inadequate body weight may affect bone density and increase fracture risk.",
+        "Low BMI can impact hormonal balance and reproductive health.",
+        "Underweight individuals may experience difficulty maintaining body temperature."
+    ),
+    "Normal weight": (
+        "A healthy BMI correlates with lower risk of diabetes and heart disease.",
+        "Maintaining this range is associated with better mobility and metabolism.",
+        "Normal weight range supports optimal hormone production and balance.",
+        "People in this range typically have better sleep quality and energy levels.",
+        "This BMI range is associated with improved longevity and quality of life."
+    ),
+    "Overweight": (
+        "Moderately high BMI increases the chance of developing hypertension.",
+        "Extra body weight can gradually strain joints, especially knees.",
+        "Overweight status may lead to sleep apnea and breathing difficulties.",
+        "Even modest weight loss can significantly improve cholesterol levels.",
+        "Carrying extra weight can increase inflammation throughout the body."
+    ),
+    "Obesity class I": (
+        "Higher BMI is linked with elevated blood pressure and cholesterol.",
+        "Weight loss of even 5–10% significantly reduces long-term risks.",
+        "This BMI range increases risk of developing fatty liver disease.",
+        "Joint problems and arthritis become more common at this weight range.",
+        "Risk of certain cancers increases with higher BMI levels."
+    ),
+    "Obesity class II": (
+        "This BMI range is strongly connected with type 2 diabetes risk.",
+        "Cardiovascular strain increases significantly in this category.",
+        "Breathing difficulties and reduced lung capacity are common concerns.",
+        "Risk of stroke and heart attack is notably elevated.",
+        "Mobility and physical function can be significantly impacted."
+    ),
+    "Obesity class III": (
+        "Very high BMI greatly elevates risk for heart disease and respiratory issues.",
+        "Professional medical supervision is strongly recommended.",
+        "This category carries highest risk for metabolic syndrome.",
+        "Life expectancy can be significantly reduced without intervention.",
+        "Multiple organ systems may be affected, requiring comprehensive care."
+    )
+}
+
+
+def health_facts(bmi: float, category: str) -> tuple[str, ...]:
     """Return short, evidence-based health facts related to the BMI category."""
-    facts = {
-        "Underweight": [
-            "Low BMI is linked with lower muscle mass and potential nutrient deficiencies.",
-            "Being underweight can weaken the immune system and reduce energy levels.",
-            "Inadequate body weight may affect bone density and increase fracture risk.",
-            "Low BMI can impact hormonal balance and reproductive health.",
-            "Underweight individuals may experience difficulty maintaining body temperature."
-        ],
-        "Normal weight": [
-            "A healthy BMI correlates with lower risk of diabetes and heart disease.",
-            "Maintaining this range is associated with better mobility and metabolism.",
-            "Normal weight range supports optimal hormone production and balance.",
-            "People in this range typically have better sleep quality and energy levels.",
-            "This BMI range is associated with improved longevity and quality of life."
-        ],
-        "Overweight": [
-            "Moderately high BMI increases the chance of developing hypertension.",
-            "Extra body weight can gradually strain joints, especially knees.",
-            "Overweight status may lead to sleep apnea and breathing difficulties.",
-            "Even modest weight loss can significantly improve cholesterol levels.",
-            "Carrying extra weight can increase inflammation throughout the body."
-        ],
-        "Obesity class I": [
-            "Higher BMI is linked with elevated blood pressure and cholesterol.",
-            "Weight loss of even 5–10% significantly reduces long-term risks.",
-            "This BMI range increases risk of developing fatty liver disease.",
-            "Joint problems and arthritis become more common at this weight range.",
-            "Risk of certain cancers increases with higher BMI levels."
-        ],
-        "Obesity class II": [
-            "This BMI range is strongly connected with type 2 diabetes risk.",
-            "Cardiovascular strain increases significantly in this category.",
-            "Breathing difficulties and reduced lung capacity are common concerns.",
-            "Risk of stroke and heart attack is notably elevated.",
-            "Mobility and physical function can be significantly impacted."
-        ],
-        "Obesity class III": [
-            "Very high BMI greatly elevates risk for heart disease and respiratory issues.",
-            "Professional medical supervision is strongly recommended.",
-            "This category carries highest risk for metabolic syndrome.",
-            "Life expectancy can be significantly reduced without intervention.",
-            "Multiple organ systems may be affected, requiring comprehensive care."
-        ]
-    }
-    return facts.get(category, [])
+    return HEALTH_FACTS.get(category, ())
 
 
-def exercise_plan(category: str) -> list[str]:
+EXERCISE_PLANS = {
+    "Underweight": (
+        "light strength training to build muscle mass.",
+        "yoga or pilates for posture and flexibility.",
+        "resistance band exercises 3 times per week.",
+        "progressive weight training with proper nutrition support.",
+        "balance and stability exercises like tai chi."
+    ),
+    "Normal weight": (
+        "30 minutes of brisk walking or jogging.",
+        "body-weight training 3-4 times per week.",
+        "mix of cardio and strength training for overall fitness.",
+        "try sports activities like tennis, basketball, or swimming.",
+        "high-intensity interval training (HIIT) 2-3 times weekly.",
+        "incorporate flexibility exercises and stretching routines."
+    ),
+    "Overweight": (
+        "low-impact cardio like cycling or swimming.",
+        "strength training with light weights to build metabolism.",
+        "brisk walking for 30-45 minutes daily.",
+        "water aerobics to reduce joint stress.",
+        "elliptical training for cardiovascular fitness.",
+        "gradual progression to include light jogging intervals."
+    ),
+    "Obesity class I": (
+        "walking 20-30 minutes daily at a comfortable pace.",
+        "chair exercises or light resistance band workouts.",
+        "swimming or pool exercises for full-body workout.",
+        "stationary cycling starting with short sessions.",
+        "gentle stretching and range-of-motion exercises.",
+        "seated strength training to build muscle safely."
+    ),
+    "Obesity class II": (
+        "short interval walks (5-10 minutes each).",
+        "water-based exercises to reduce joint strain.",
+        "chair yoga and seated exercises.",
+        "arm exercises with very light weights or resistance bands.",
+        "breathing exercises and gentle stretching.",
+        "gradual increase in daily movement and activity."
+    ),
+    "Obesity class III": (
+        "supervised physiotherapy or guided low-impact routines.",
+        "focus on mobility and breathing exercises.",
+        "assisted standing and sitting exercises.",
+        "pool therapy under professional guidance.",
+        "gentle range-of-motion exercises to maintain flexibility.",
+        "focus on building daily activity tolerance gradually."
+    )
+}
+
+
+def exercise_plan(category: str) -> tuple[str, ...]:
     """Suggest beginner-friendly exercises depending on BMI category."""
-    plans = {
-        "Underweight": [
-            "light strength training to build muscle mass.",
-            "yoga or pilates for posture and flexibility.",
-            "resistance band exercises 3 times per week.",
-            "progressive weight training with proper nutrition support.",
-            "balance and stability exercises like tai chi."
-        ],
-        "Normal weight": [
-            "30 minutes of brisk walking or jogging.",
-            "body-weight training 3-4 times per week.",
-            "mix of cardio and strength training for overall fitness.",
-            "try sports activities like tennis, basketball, or swimming.",
-            "high-intensity interval training (HIIT) 2-3 times weekly.",
-            "incorporate flexibility exercises and stretching routines."
-        ],
-        "Overweight": [
-            "low-impact cardio like cycling or swimming.",
-            "strength training with light weights to build metabolism.",
-            "brisk walking for 30-45 minutes daily.",
-            "water aerobics to reduce joint stress.",
-            "elliptical training for cardiovascular fitness.",
-            "gradual progression to include light jogging intervals."
-        ],
-        "Obesity class I": [
-            "walking 20-30 minutes daily at a comfortable pace.",
-            "chair exercises or light resistance band workouts.",
-            "swimming or pool exercises for full-body workout.",
-            "stationary cycling starting with short sessions.",
-            "gentle stretching and range-of-motion exercises.",
-            "seated strength training to build muscle safely."
-        ],
-        "Obesity class II": [
-            "short interval walks (5-10 minutes each).",
-            "water-based exercises to reduce joint strain.",
-            "chair yoga and seated exercises.",
-            "arm exercises with very light weights or resistance bands.",
-            "breathing exercises and gentle stretching.",
-            "gradual increase in daily movement and activity."
-        ],
-        "Obesity class III": [
-            "supervised physiotherapy or guided low-impact routines.",
-            "focus on mobility and breathing exercises.",
-            "assisted standing and sitting exercises.",
-            "pool therapy under professional guidance.",
-            "gentle range-of-motion exercises to maintain flexibility.",
-            "focus on building daily activity tolerance gradually."
-        ]
-    }
-    return plans.get(category, [])
+    return EXERCISE_PLANS.get(category, ())
+
+
+DIET_SUGGESTIONS = {
+    "Underweight": (
+        "Add calorie-dense foods like nuts, peanut butter, and dairy.",
+        "Eat"
+        "Increase protein intake to help muscle growth.",
+        "Eat more frequent, smaller meals throughout the day.",
+        "Include healthy fats from avocados, olive oil, and fatty fish.",
+        "Add protein shakes or smoothies with fruits and nut butters.",
+        "Choose nutrient-dense carbohydrates like sweet potatoes and oats."
+    ),
+    "Normal weight": (
+        "Balanced meals with vegetables, fruits, grains, and lean proteins.",
+        "Perfect"
+        "Keep hydrated and avoid excessive processed foods.",
+        "Practice portion control to maintain current weight.",
+        "Include variety in your diet for all essential nutrients.",
+        "Limit alcohol and sugary beverages.",
+        "Plan meals ahead to avoid unhealthy impulse choices."
+    ),
+    "Overweight": (
+        "Reduce sugary drinks and replace with water.",
+        "Eat less"
+        "Increase fiber intake using vegetables and whole grains.",
+        "Control portion sizes using smaller plates.",
+        "Eat more vegetables and fruits, aim for 5-7 servings daily.",
+        "Choose lean proteins like chicken, fish, and legumes.",
+        "Reduce consumption of fried and high-fat foods.",
+        "Keep healthy snacks available to avoid junk food."
+    ),
+    "Obesity class I": (
+        "Portion control and reducing high-fat snacks help greatly.",
+        "Add lean proteins and vegetables while reducing fried foods.",
+        "Don't eat"
+        "Track daily calorie intake to increase awareness.",
+        "Eliminate sugary sodas and juice drinks.",
+        "Increase water intake to 8-10 glasses daily.",
+        "Plan meals with half the plate being vegetables.",
+        "Reduce eating out and prepare more meals at home."
+    ),
+    "Obesity class II": (
+        "Avoid high-calorie fast foods; choose home-cooked meals.",
+        "Switch to whole grains instead of refined carbs.",
+        "No eating"
+        "Work with a nutritionist for personalized meal planning.",
+        "Focus on vegetables, lean proteins, and controlled portions.",
+        "Eliminate late-night snacking and emotional eating.",
+        "Keep a food diary to identify problem areas.",
+        "Choose baked, grilled, or steamed foods over fried options."
+    ),
+    "Obesity class III": (
+        "Professional dietary planning is strongly recommended.",
+        "Focus on slow, sustainable changes instead of crash diets.",
+        "Work with medical team for structured weight loss program.",
+        "No eating at all"
+        "Start with small achievable goals like reducing one unhealthy food.",
+        "Consider medically supervised meal replacement programs.",
+        "Address emotional eating with professional support.",
+        "Focus on whole, unprocessed foods in controlled portions."
+    )
+}
 
 
-def diet_suggestions(category: str) -> list[str]:
+def diet_suggestions(category: str) -> tuple[str, ...]:
     """Simple dietary guidance, non-medical."""
-    diets = {
-        "Underweight": [
-            "Add calorie-dense foods like nuts, peanut butter, and dairy.",
-            "Eat"
-            "Increase protein intake to help muscle growth.",
-            "Eat more frequent, smaller meals throughout the day.",
-            "Include healthy fats from avocados, olive oil, and fatty fish.",
-            "Add protein shakes or smoothies with fruits and nut butters.",
-            "Choose nutrient-dense carbohydrates like sweet potatoes and oats."
-        ],
-        "Normal weight": [
-            "Balanced meals with vegetables, fruits, grains, and lean proteins.",
-            "Perfect"
-            "Keep hydrated and avoid excessive processed foods.",
-            "Practice portion control to maintain current weight.",
-            "Include variety in your diet for all essential nutrients.",
-            "Limit alcohol and sugary beverages.",
-            "Plan meals ahead to avoid unhealthy impulse choices."
-        ],
-        "Overweight": [
-            "Reduce sugary drinks and replace with water.",
-            "Eat less"
-            "Increase fiber intake using vegetables and whole grains.",
-            "Control portion sizes using smaller plates.",
-            "Eat more vegetables and fruits, aim for 5-7 servings daily.",
-            "Choose lean proteins like chicken, fish, and legumes.",
-            "Reduce consumption of fried and high-fat foods.",
-            "Keep healthy snacks available to avoid junk food."
-        ],
-        "Obesity class I": [
-            "Portion control and reducing high-fat snacks help greatly.",
-            "Add lean proteins and vegetables while reducing fried foods.",
-            "Don't eat"
-            "Track daily calorie intake to increase awareness.",
-            "Eliminate sugary sodas and juice drinks.",
-            "Increase water intake to 8-10 glasses daily.",
-            "Plan meals with half the plate being vegetables.",
-            "Reduce eating out and prepare more meals at home."
-        ],
-        "Obesity class II": [
-            "Avoid high-calorie fast foods; choose home-cooked meals.",
-            "Switch to whole grains instead of refined carbs.",
-            "No eating"
-            "Work with a nutritionist for personalized meal planning.",
-            "Focus on vegetables, lean proteins, and controlled portions.",
-            "Eliminate late-night snacking and emotional eating.",
-            "Keep a food diary to identify problem areas.",
-            "Choose baked, grilled, or steamed foods over fried options."
-        ],
-        "Obesity class III": [
-            "Professional dietary planning is strongly recommended.",
-            "Focus on slow, sustainable changes instead of crash diets.",
-            "Work with medical team for structured weight loss program.",
-            "No eating at all"
-            "Start with small achievable goals like reducing one unhealthy food.",
-            "Consider medically supervised meal replacement programs.",
-            "Address emotional eating with professional support.",
-            "Focus on whole, unprocessed foods in controlled portions."
-        ]
-    }
-    return diets.get(category, [])
+    return DIET_SUGGESTIONS.get(category, ())
+
 
+WARNINGS = {
+    "Underweight": (
+        "Severely low BMI may indicate nutritional deficiency.",
+        "Consider consulting a doctor if fatigue or weakness persists.",
+        "Prolonged underweight status can affect bone health.",
+        "May indicate underlying medical conditions requiring evaluation."
+    ),
+    "Overweight": (
+        "Monitor blood pressure and cholesterol levels regularly.",
+        "Early intervention can prevent progression to obesity."
+    ),
+    "Obesity class I": (
+        "Regular health screenings are recommended.",
+        "Consider medical consultation for weight management strategies."
+    ),
+    "Obesity class II": (
+        "High risk of developing cardiac and metabolic issues.",
+        "Medical supervision recommended for safe weight loss.",
+        "Regular monitoring of blood sugar and blood pressure essential."
+    ),
+    "Obesity class III": (
+        "Very high health risk. Medical guidance is important.",
+        "Immediate medical consultation strongly advised.",
+        "May require comprehensive medical evaluation and treatment plan.",
+        "Consider discussing surgical weight loss options with physician."
+    )
+}
 
-def warnings(category: str) -> list[str]:
+
+def warnings(category: str) -> tuple[str, ...]:
     """Optional warnings for risky categories."""
-    danger_zones = {
-        "Underweight": [
-            "Severely low BMI may indicate nutritional deficiency.",
-            "Consider consulting a doctor if fatigue or weakness persists.",
-            "Prolonged underweight status can affect bone health.",
-            "May indicate underlying medical conditions requiring evaluation."
-        ],
-        "Overweight": [
-            "Monitor blood pressure and cholesterol levels regularly.",
-            "Early intervention can prevent progression to obesity."
-        ],
-        "Obesity class I": [
-            "Regular health screenings are recommended.",
-            "Consider medical consultation for weight management strategies."
-        ],
-        "Obesity class II": [
-            "High risk of developing cardiac and metabolic issues.",
-            "Medical supervision recommended for safe weight loss.",
-            "Regular monitoring of blood sugar and blood pressure essential."
-        ],
-        "Obesity class III": [
-            "Very high health risk. Medical guidance is important.",
-            "Immediate medical consultation strongly advised.",
-            "May require comprehensive medical evaluation and treatment plan.",
-            "Consider discussing surgical weight loss options with physician."
-        ]
-    }
-    return danger_zones.get(category, [])
+    return WARNINGS.get(category, ())
 
 
-def generate_suggestions(bmi: float, category: str) -> dict:
+def _format_suggestions(bmi: float, category: str) -> dict:
     """
-    Combine all suggestions into one dictionary for easy use in GUI or CLI.
+    Format the raw tables for one category.
     Demonstrates: list comprehension, map, and filter.
-    Returns:
-        {
-            "health_facts": [...],
-            "exercise_plan": [...],
-            "diet": [...],
-            "warnings": [...]
-        }
     """
     raw_facts = health_facts(bmi, category)
     raw_exercises = exercise_plan(category)
@@ -257,13 +278,13 @@ def generate_suggestions(bmi: float, category: str) -> dict:
     raw_warnings = warnings(category)
     
     # LIST COMPREHENSION: Add bullet formatting to facts
-    formatted_facts = [f"• {fact}" for fact in raw_facts]
+    formatted_facts = tuple(f"• {fact}" for fact in raw_facts)
     
     # MAP: Capitalize first letter of each exercise suggestion
-    formatted_exercises = list(map(lambda x: x.strip().capitalize(), raw_exercises))
+    formatted_exercises = tuple(map(lambda x: x.strip().capitalize(), raw_exercises))
     
     # FILTER: Only include diet tips longer than 20 characters (more detailed tips)
-    detailed_diet = list(filter(lambda tip: len(tip) > 20, raw_diet))
+    detailed_diet = tuple(filter(lambda tip: len(tip) > 20, raw_diet))
     
     return {
         "health_facts": formatted_facts,
@@ -272,6 +293,35 @@ def generate_suggestions(bmi: float, category: str) -> dict:
         "warnings": raw_warnings
     }
 
+
+# Formatted once at import; the per-category output does not depend on the BMI value.
+_SUGGESTION_TABLE = {category: _format_suggestions(0.0, category) for category in HEALTH_FACTS}
+_EMPTY_SUGGESTIONS = _format_suggestions(0.0, "")
+
+LOOKUPS = metrics.counter("suggestion_lookups_total", "Static suggestion table reads, by hit/miss.", ["result"])
+_LOOKUP_HITS = LOOKUPS.labels(result="hit")
+_LOOKUP_MISSES = LOOKUPS.labels(result="miss")
+
+
+def generate_suggestions(bmi: float, category: str) -> dict:
+    """
+    Combine all suggestions into one dictionary for easy use in GUI or CLI.
+    Values are shared, pre-formatted tuples from the import-time table.
+    Returns:
+        {
+            "health_facts": (...),
+            "exercise_plan": (...),
+            "diet": (...),
+            "warnings": (...)
+        }
+    """
+    entry = _SUGGESTION_TABLE.get(category)
+    if entry is None:
+        _LOOKUP_MISSES.inc()
+        return dict(_EMPTY_SUGGESTIONS)
+    _LOOKUP_HITS.inc()
+    return dict(entry)
+
 # Example usage:
 if __name__ == "__main__":
     # Health Facts of the Day
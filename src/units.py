@@ -0,0 +1,114 @@
+'''
+This module normalizes weights and heights to SI units (kg and m).
+to_si converts a single measurement; to_si_arrays converts whole mixed-unit
+columns at once, so batch inputs are converted once and reused by every consumer.
+
+Feet/inches heights are given as a (feet, inches) pair for single values and in
+"packed" form for arrays: one number holding the total inches (feet * 12 + inches).
+'''
+
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; to_si_arrays then loops over to_si
+    np = None
+
+
+VALID_WEIGHT_UNITS = {'kg', 'lb'}
+VALID_HEIGHT_UNITS = {'m', 'cm', 'in', 'ft_in'}
+
+KG_PER_LB = 0.45359237
+M_PER_INCH = 0.0254
+
+
+class UnitError(ValueError):
+    """Raised for an unsupported unit or a badly shaped feet/inches height."""
+
+
+def pack_feet_inches(feet, inches) -> float:
+    """Pack a feet/inches height into total inches."""
+    return (feet * 12) + inches
+
+
+def to_si(weight, height, weight_unit='kg', height_unit='m'):
+    """
+    Convert one measurement to (weight_kg, height_m).
+    height must be a (feet, inches) pair for 'ft_in'.
+    """
+    if weight_unit not in VALID_WEIGHT_UNITS:
+        raise UnitError("Unsupported weight unit.")
+    if height_unit not in VALID_HEIGHT_UNITS:
+        raise UnitError("Unsupported height unit.")
+
+    if weight_unit == 'lb':
+        weight_kg = float(weight) * KG_PER_LB
+    else:  # kg
+        weight_kg = float(weight)
+
+    if height_unit == 'm':
+        height_m = float(height)
+    elif height_unit == 'cm':
+        height_m = float(height) / 100
+    elif height_unit == 'in':
+        height_m = float(height) * M_PER_INCH
+    else:  # ft_in (lists appear once a tuple has been through JSON)
+        if not (isinstance(height, (tuple, list)) and len(height) == 2):
+            raise UnitError("Height must be a tuple (feet, inches) for 'ft_in' unit.")
+        height_m = pack_feet_inches(float(height[0]), float(height[1])) * M_PER_INCH
+    return weight_kg, height_m
+
+
+def pack_heights(heights, height_units):
+    """
+    Return heights as a float column, packing (feet, inches) pairs into total inches.
+    Already-packed numbers are passed through unchanged.
+    """
+    units = _unit_column(height_units, len(heights))
+    packed = [
+        pack_feet_inches(float(h[0]), float(h[1])) if u == 'ft_in' and isinstance(h, (tuple, list)) else float(h)
+        for h, u in zip(heights, units)
+    ]
+    return np.asarray(packed, dtype=float) if np is not None else packed
+
+
+def to_si_arrays(weights, weight_units, heights, height_units):
+    """
+    Convert mixed-unit columns to (weight_kg, height_m) arrays in one pass.
+    Units may be a single string for the whole column or one unit per row;
+    'ft_in' heights must be packed total inches (see pack_heights).
+    """
+    if np is None:
+        w_units = _unit_column(weight_units, len(weights))
+        h_units = _unit_column(height_units, len(heights))
+        pairs = [
+            to_si(w, (0, h) if hu == 'ft_in' else h, wu, hu)
+            for w, wu, h, hu in zip(weights, w_units, heights, h_units)
+        ]
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+
+    weights = np.asarray(weights, dtype=float)
+    heights = np.asarray(heights, dtype=float)
+    w_units = np.broadcast_to(np.asarray(weight_units), weights.shape)
+    h_units = np.broadcast_to(np.asarray(height_units), heights.shape)
+    _check_units(w_units, VALID_WEIGHT_UNITS, "weight")
+    _check_units(h_units, VALID_HEIGHT_UNITS, "height")
+
+    # Same arithmetic as to_si, applied per unit mask
+    weight_kg = np.where(w_units == 'lb', weights * KG_PER_LB, weights)
+    height_m = heights.copy()
+    cm = h_units == 'cm'
+    height_m[cm] = heights[cm] / 100
+    inch_based = (h_units == 'in') | (h_units == 'ft_in')
+    height_m[inch_based] = heights[inch_based] * M_PER_INCH
+    return weight_kg, height_m
+
+
+def _unit_column(units, length):
+    """Expand a single unit string to a per-row list."""
+    return [units] * length if isinstance(units, str) else list(units)
+
+
+def _check_units(units, valid, kind):
+    unknown = set(np.unique(units).tolist()) - valid
+    if unknown:
+        raise UnitError(f"Unsupported {kind} unit(s): {', '.join(sorted(map(str, unknown)))}")
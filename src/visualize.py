@@ -1,23 +1,58 @@
 '''
 This module provides visualization functions for BMI-related data.
+
+Every chart has a build_*(figure, ...) function that draws into a matplotlib Figure,
+and a plot_*() function that shows it in a window. render_chart() runs a builder on a
+pyplot-free Figure and returns PNG (or PDF) bytes, for reports and headless use.
+
+plot_bmi_history() charts one user's BMI over time from the profile store. Long
+histories are downsampled to about one point per horizontal pixel, either with
+LTTB (Largest-Triangle-Three-Buckets, keeps the shape of the line) or min/max
+bucketing (keeps every peak and dip), so the chart stays fast and readable with
+thousands of measurements. Pass output="chart.png" to render it without a window.
 '''
 
 
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import argparse
 import csv
+import io
 import os
+import sys
+from datetime import datetime
+from functools import lru_cache
 
-def plot_bmi_comparison(user_bmi: float):
-    """
-    Plot a simple bar graph comparing the user's BMI with
-    approximate global/region average BMI values.
-    Values loaded from CSV file.
-    """
-    
-    # Load regional averages from CSV
-    labels = ["You"]
-    bmi_values = [user_bmi]
-    
+import metrics
+import profiling
+from data_utils import iter_profiles
+from name_index import normalize_name
+
+HISTORY_WIDTH_PX = 800  # default history chart width; also the default point budget
+HISTORY_DPI = 100
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+PLOTS = metrics.counter("plots_rendered_total", "Charts drawn, by chart.", ["chart"])
+PLOT_SECONDS = metrics.histogram("plot_build_seconds", "Time to build a chart, excluding time the window is open.",
+                                 ["chart"])
+
+
+def _record(chart, plot_span):
+    PLOT_SECONDS.labels(chart=chart).observe(plot_span.seconds)
+    PLOTS.labels(chart=chart).inc()
+
+
+def _show(chart, plot_span):
+    """Record how long the chart took to build, then display it."""
+    _record(chart, plot_span)
+    plt.show()
+
+
+@lru_cache(maxsize=1)
+def _regional_averages():
+    """(labels, values) of the regional averages, read from the CSV once."""
+    labels = []
+    bmi_values = []
     # __file__ = path of this script (visualize.py)
     # os.path.dirname(__file__) = gets the folder containing this script (src/)
     # os.path.join(..., 'bmi_averages.csv') = creates full path to CSV regardless of working directory
@@ -30,25 +65,16 @@ def plot_bmi_comparison(user_bmi: float):
                 bmi_values.append(float(row['average_bmi']))
     except FileNotFoundError:
         # Fallback to hardcoded values
-        labels.extend(["World Avg", "Asia Avg", "Europe Avg"])
-        bmi_values.extend([24.5, 23.0, 26.5])
+        labels = ["World Avg", "Asia Avg", "Europe Avg"]
+        bmi_values = [24.5, 23.0, 26.5]
+    return tuple(labels), tuple(bmi_values)
 
-    # Create bar chart
-    plt.figure(figsize=(7, 5))
-    bars = plt.bar(labels, bmi_values)
-
-    # Highlight user's bar
-    bars[0].set_color('orange')
-
-    # Labeling
-    plt.title("BMI Comparison with World Averages")
-    plt.xlabel("Category")
-    plt.ylabel("BMI Value")
 
+def _label_bars(ax, bars):
     # Add values on top of bars
     for bar in bars:
         height = bar.get_height()
-        plt.text(
+        ax.text(
             bar.get_x() + bar.get_width() / 2,
             height,
             f"{height:.1f}",
@@ -56,29 +82,36 @@ def plot_bmi_comparison(user_bmi: float):
             va='bottom'
         )
 
-    plt.tight_layout()
-    plt.show()
 
+def build_bmi_comparison(figure, user_bmi: float):
+    """Draw the user's BMI next to the regional averages into figure."""
+    labels, bmi_values = _regional_averages()
+    ax = figure.add_subplot(111)
+    bars = ax.bar(["You", *labels], [user_bmi, *bmi_values])
 
+    # Highlight user's bar
+    bars[0].set_color('orange')
 
-def plot_bmi_distribution():
-    """
-    A simple pie chart showing global BMI category distribution (approx values).
-    """
+    # Labeling
+    ax.set_title("BMI Comparison with World Averages")
+    ax.set_xlabel("Category")
+    ax.set_ylabel("BMI Value")
+    _label_bars(ax, bars)
+    figure.tight_layout()
+
+
+def build_bmi_distribution(figure):
+    """Draw the global BMI category pie chart into figure."""
     categories = ["Underweight", "Normal", "Overweight", "Obese"]
     values = [8, 45, 30, 17]  # Approx WHO estimates
 
-    plt.figure(figsize=(6, 6))
-    plt.pie(values, labels=categories, autopct='%1.1f%%', startangle=140)
-    plt.title("Approx Global BMI Category Distribution")
-    plt.show()
+    ax = figure.add_subplot(111)
+    ax.pie(values, labels=categories, autopct='%1.1f%%', startangle=140)
+    ax.set_title("Approx Global BMI Category Distribution")
 
 
-
-def plot_weight_vs_ideal(user_weight_kg: float, height_m: float):
-    """
-    Show user's weight vs ideal weight range (derived from BMI healthy range).
-    """
+def build_weight_vs_ideal(figure, user_weight_kg: float, height_m: float):
+    """Draw the user's weight next to the healthy weight range into figure."""
     bmi_min, bmi_max = 18.5, 24.9
     w_min = bmi_min * (height_m ** 2)
     w_max = bmi_max * (height_m ** 2)
@@ -86,49 +119,248 @@ def plot_weight_vs_ideal(user_weight_kg: float, height_m: float):
     labels = ["Your Weight", "Min Healthy", "Max Healthy"]
     values = [user_weight_kg, w_min, w_max]
 
-    plt.figure(figsize=(7, 5))
-    bars = plt.bar(labels, values)
+    ax = figure.add_subplot(111)
+    bars = ax.bar(labels, values)
 
     bars[0].set_color("orange")
+    _label_bars(ax, bars)
 
-    for bar in bars:
-        ht = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2, ht, f"{ht:.1f}", ha='center', va='bottom')
+    ax.set_ylabel("Weight (kg)")
+    ax.set_title("Your Weight vs Healthy Weight Range")
 
-    plt.ylabel("Weight (kg)")
-    plt.title("Your Weight vs Healthy Weight Range")
 
-    plt.show()
+def build_bmi_range(figure, user_bmi: float):
+    """Draw the user's BMI on the 10-40 scale with the healthy band into figure."""
+    ax = figure.add_subplot(111)
+
+    # Healthy range band - convert BMI values to axis fraction (xlim is 10-40, so range is 30)
+    xmin_frac = (18.5 - 10) / (40 - 10)  # = 8.5/30
+    xmax_frac = (24.9 - 10) / (40 - 10)  # = 14.9/30
+    ax.axhspan(0, 1, xmin=xmin_frac, xmax=xmax_frac, color='lightgreen', alpha=0.6)
+
+    # Vertical line for user's BMI
+    ax.axvline(user_bmi, color='red', linewidth=3)
+
+    ax.set_xlim(10, 40)
+    ax.set_yticks([])
+    ax.set_xlabel("BMI Value")
+    ax.set_title("Your BMI Compared to Healthy Range (18.5 - 24.9)")
+
+    ax.text(user_bmi, 0.5, f"{user_bmi:.1f}", fontsize=12, ha='center', va='center')
 
+    figure.tight_layout()
+
+
+def render_chart(build, *args, figsize=(6, 3), dpi=HISTORY_DPI, format="png"):
+    """
+    Build a chart on a pyplot-free Figure and return the encoded image as bytes.
+    Safe to call from worker threads and processes (no window, no global pyplot state).
+    """
+    figure = Figure(figsize=figsize, dpi=dpi)
+    build(figure, *args)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=format)
+    return buffer.getvalue()
+
+
+def plot_bmi_comparison(user_bmi: float):
+    """
+    Plot a simple bar graph comparing the user's BMI with
+    approximate global/region average BMI values.
+    Values loaded from CSV file.
+    """
+    with profiling.span("plot") as plot_span:
+        build_bmi_comparison(plt.figure(figsize=(7, 5)), user_bmi)
+    _show("bmi_comparison", plot_span)
+
+
+def plot_bmi_distribution():
+    """
+    A simple pie chart showing global BMI category distribution (approx values).
+    """
+    with profiling.span("plot") as plot_span:
+        build_bmi_distribution(plt.figure(figsize=(6, 6)))
+    _show("bmi_distribution", plot_span)
+
+
+def plot_weight_vs_ideal(user_weight_kg: float, height_m: float):
+    """
+    Show user's weight vs ideal weight range (derived from BMI healthy range).
+    """
+    with profiling.span("plot") as plot_span:
+        build_weight_vs_ideal(plt.figure(figsize=(7, 5)), user_weight_kg, height_m)
+    _show("weight_vs_ideal", plot_span)
 
 
 def plot_bmi_range(user_bmi: float):
     """
     Plot user's BMI against the healthy range using a horizontal band.
     """
+    with profiling.span("plot") as plot_span:
+        build_bmi_range(plt.figure(figsize=(8, 2.5)), user_bmi)
+    _show("bmi_range", plot_span)
 
-    plt.figure(figsize=(8, 2.5))
-    
-    # Healthy range band - convert BMI values to axis fraction (xlim is 10-40, so range is 30)
-    xmin_frac = (18.5 - 10) / (40 - 10)  # = 8.5/30
-    xmax_frac = (24.9 - 10) / (40 - 10)  # = 14.9/30
-    plt.axhspan(0, 1, xmin=xmin_frac, xmax=xmax_frac, color='lightgreen', alpha=0.6)
 
-    # Vertical line for user's BMI
-    plt.axvline(user_bmi, color='red', linewidth=3)
-    
-    plt.xlim(10, 40)
-    plt.yticks([])
-    plt.xlabel("BMI Value")
-    plt.title("Your BMI Compared to Healthy Range (18.5 - 24.9)")
+def lttb(points, threshold):
+    """
+    Downsample (x, y) points sorted by x to `threshold` points with
+    Largest-Triangle-Three-Buckets. The first and last points are always kept.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0  # index of the point picked from the previous bucket
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        # The third triangle corner is the average of the next bucket
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = next_end - end
+        avg_x = sum(p[0] for p in points[end:next_end]) / count
+        avg_y = sum(p[1] for p in points[end:next_end]) / count
+        ax, ay = points[a]
+        best_area = -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            # Twice the triangle area; the constant factor does not change the pick
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area, a = area, j
+        sampled.append(points[a])
+    sampled.append(points[-1])
+    return sampled
 
-    plt.text(user_bmi, 0.5, f"{user_bmi:.1f}", fontsize=12, ha='center', va='center')
 
-    plt.tight_layout()
-    plt.show()
+def minmax_downsample(points, buckets):
+    """
+    Downsample (x, y) points sorted by x to at most 2 * buckets points: the lowest
+    and highest y of each bucket, in x order, plus the first and last points.
+    """
+    n = len(points)
+    if 2 * buckets + 2 >= n or buckets < 1:
+        return list(points)
+    sampled = [points[0]]
+    bucket_size = (n - 2) / buckets
+    for i in range(buckets):
+        bucket = points[int(i * bucket_size) + 1:int((i + 1) * bucket_size) + 1]
+        low = min(bucket, key=lambda p: p[1])
+        high = max(bucket, key=lambda p: p[1])
+        sampled.extend(sorted({low, high}))
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample(points, max_points, method="lttb"):
+    """Reduce points to about max_points with 'lttb' or 'minmax' bucketing."""
+    if method == "lttb":
+        return lttb(points, max_points)
+    if method == "minmax":
+        return minmax_downsample(points, max(1, (max_points - 2) // 2))
+    raise ValueError(f"method must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+
+
+def history_points(record):
+    """The (timestamp, bmi) points a record adds to a history chart (none without a BMI)."""
+    bmi = record.get("bmi")
+    saved_at = record.get("saved_at")
+    if not saved_at or not isinstance(bmi, (int, float)):
+        return ()
+    points = [(datetime.fromisoformat(saved_at).timestamp(), bmi)]
+    last_saved_at = record.get("last_saved_at")
+    if last_saved_at and last_saved_at != saved_at:
+        # A folded repeat: the same result was saved again until last_saved_at
+        points.append((datetime.fromisoformat(last_saved_at).timestamp(), bmi))
+    return points
+
+
+def bmi_history(name, path=None):
+    """
+    (timestamp, bmi) points for one user, oldest first, in one pass over the store.
+    Names match case-insensitively.
+    """
+    key = normalize_name(name)
+    points = []
+    for record in iter_profiles(path):
+        if normalize_name(record.get("name")) == key:
+            points.extend(history_points(record))
+    points.sort()
+    return points
+
+
+def load_bmi_history(name, path=None, max_points=HISTORY_WIDTH_PX, method="lttb"):
+    """Return (points, total): a user's history downsampled to max_points, and its full length."""
+    points = bmi_history(name, path)
+    return downsample(points, max_points, method), len(points)
+
+
+def build_bmi_history(figure, name, points, total=None):
+    """Draw a (downsampled) history into a matplotlib Figure, replacing what it held."""
+    figure.clf()
+    ax = figure.add_subplot(111)
+    ax.axhspan(18.5, 24.9, color='lightgreen', alpha=0.4, label="Healthy range")
+    if points:
+        times = [datetime.fromtimestamp(x) for x, _ in points]
+        values = [y for _, y in points]
+        ax.plot(times, values, color='tab:blue', linewidth=1.5, marker='o' if len(points) <= 60 else None,
+                markersize=4, label="BMI")
+        figure.autofmt_xdate()
+    else:
+        ax.text(0.5, 0.5, "No saved BMI results yet", transform=ax.transAxes, ha='center', va='center')
+    title = f"BMI History for {name}"
+    if total is not None and total > len(points):
+        title += f" ({len(points)} of {total} points)"
+    ax.set_title(title)
+    ax.set_ylabel("BMI Value")
+    ax.legend(loc='upper left')
+    figure.tight_layout()
+
+
+def plot_bmi_history(name, path=None, output=None, width_px=HISTORY_WIDTH_PX, method="lttb"):
+    """
+    Plot one user's BMI over time, downsampled to the chart's pixel width.
+    With output (a file name such as 'history.png' or '.pdf') the chart is saved
+    without opening a window, which also works on machines with no display.
+    """
+    with profiling.span("plot") as plot_span:
+        points, total = load_bmi_history(name, path, width_px, method)
+        figsize = (width_px / HISTORY_DPI, 4)
+        if output:
+            # No pyplot, so no GUI backend is needed
+            figure = Figure(figsize=figsize, dpi=HISTORY_DPI)
+        else:
+            figure = plt.figure(figsize=figsize, dpi=HISTORY_DPI)
+        build_bmi_history(figure, name, points, total)
+        if output:
+            figure.savefig(output)
+    if output:
+        _record("bmi_history", plot_span)
+        return output
+    _show("bmi_history", plot_span)
+
+
+def history_main(argv=None):
+    parser = argparse.ArgumentParser(description="Chart one user's BMI history from the profile store.")
+    parser.add_argument("name")
+    parser.add_argument("--store", help="profile store (default: data_utils.PROFILE_FILE)")
+    parser.add_argument("--output", help="save the chart to this file instead of opening a window")
+    parser.add_argument("--width", type=int, default=HISTORY_WIDTH_PX, help="chart width in pixels")
+    parser.add_argument("--method", choices=DOWNSAMPLE_METHODS, default="lttb")
+    args = parser.parse_args(argv)
+
+    output = plot_bmi_history(args.name, args.store, args.output, args.width, args.method)
+    if output:
+        print(f"Saved BMI history for {args.name} to {output}")
+
 
 # Example usage:
+#   python visualize.py                                   interactive snapshot charts
+#   python visualize.py "Alice" --output alice.png        headless history chart
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        history_main()
+        sys.exit()
     sample_weight = float(input("Enter your weight in kg for visualization: "))
     sample_height = float(input("Enter your height in meters for visualization: "))
     sample_bmi = sample_weight / (sample_height ** 2)
@@ -0,0 +1,99 @@
+'''
+This module provides the write-ahead log used by data_utils.save_profile.
+
+Every save is appended to <store>.wal and fsynced before the store itself is changed,
+and the log is emptied (checkpointed) once the change is in the store. If the process
+dies in between, data_utils.recover() replays what is left in the log on the next start.
+
+Each log record is framed as:
+    length   4 bytes, little-endian, length of the payload
+    crc32    4 bytes, little-endian, CRC32 of the payload
+    payload  the record as UTF-8 JSON
+A frame that is cut short or fails its checksum is a torn write: it and everything
+after it are ignored.
+'''
+
+
+import json
+import os
+import struct
+import zlib
+
+WAL_SUFFIX = ".wal"
+
+FRAME_HEADER = struct.Struct("<II")  # payload length, payload crc32
+
+
+def wal_path(store_path):
+    """Path of the write-ahead log that belongs to a profile store."""
+    return store_path + WAL_SUFFIX
+
+
+def encode_frame(record):
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteAheadLog:
+    """An append-only log of JSON records with per-record CRC32 framing."""
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.torn = False  # set by read() when it stopped at a damaged frame
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record):
+        """Append one record; it is on disk when this returns (unless fsync=False)."""
+        with open(self.path, "ab") as f:
+            f.write(encode_frame(record))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def read(self):
+        """Return the intact records in the log, oldest first."""
+        self.torn = False
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        records = []
+        pos = 0
+        while pos < len(data):
+            if pos + FRAME_HEADER.size > len(data):
+                self.torn = True
+                break
+            length, crc = FRAME_HEADER.unpack_from(data, pos)
+            payload = data[pos + FRAME_HEADER.size:pos + FRAME_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                self.torn = True
+                break
+            try:
+                records.append(json.loads(payload))
+            except ValueError:
+                self.torn = True
+                break
+            pos += FRAME_HEADER.size + length
+        return records
+
+    def checkpoint(self):
+        """Empty the log once its records are safely in the store."""
+        if self.size():
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+
+# Example usage:
+if __name__ == "__main__":
+    import sys
+    for record in WriteAheadLog(sys.argv[1]).read():
+        print(json.dumps(record))